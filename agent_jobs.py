@@ -0,0 +1,224 @@
+import os
+import time
+import uuid
+import asyncio
+import itertools
+import threading
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Callable, Dict, List, Optional
+
+from agent_module import stream_agent, agent_event, agent_response
+from async_runtime import get_loop, submit
+
+
+# Agent runs executing at the same time, the rest wait in the queue
+AGENT_WORKERS = int(os.getenv("AGENT_WORKERS", "4"))
+# Submissions beyond this many waiting jobs are rejected
+AGENT_QUEUE_MAX = int(os.getenv("AGENT_QUEUE_MAX", "50"))
+# Seconds finished jobs are kept for their sessions to pick up
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", "3600"))
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at AGENT_QUEUE_MAX."""
+
+
+@dataclass
+class AgentJob:
+    id: str
+    query: str
+    priority: int
+    submitted_at: float
+    status: JobStatus = JobStatus.QUEUED
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    # Latest tool progress line and the report streamed so far
+    progress: List[str] = field(default_factory=list)
+    report: str = ''
+    response: Optional[agent_response] = None
+    error: str = ''
+    # Blocking callable producing the response, None streams the agent directly
+    runner: Optional[Callable[["AgentJob"], agent_response]] = None
+
+    def record(self, event: agent_event) -> None:
+        if event.kind == "progress":
+            self.progress.append(event.text)
+        elif event.kind == "report":
+            self.report = event.text
+        else:
+            self.response = event.response
+
+    @property
+    def done(self) -> bool:
+        return self.status in (JobStatus.DONE, JobStatus.FAILED, JobStatus.CANCELLED)
+
+    @property
+    def wait_time(self) -> float:
+        return (self.started_at or time.time()) - self.submitted_at
+
+    @property
+    def run_time(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+
+class JobQueue:
+    """
+    Bounded pool of agent workers on the shared event loop. Jobs are run in
+    priority order (lower first, then submission order), at most `workers`
+    at a time, and can be cancelled while queued or running.
+
+    Args:
+        workers (int): Number of agent runs executing at once
+        max_queued (int): Number of waiting jobs before submissions are rejected
+    """
+
+    def __init__(self, workers: int = AGENT_WORKERS, max_queued: int = AGENT_QUEUE_MAX):
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.jobs: Dict[str, AgentJob] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> None:
+        if self._queue is not None:
+            return
+
+        async def start():
+            self._queue = asyncio.PriorityQueue()
+            for i in range(self.workers):
+                asyncio.ensure_future(self._worker())
+
+        with self._lock:
+            if self._queue is None:
+                submit(start()).result()
+
+    def submit(self, query: str, priority: int = 0, runner: Optional[Callable[[AgentJob], agent_response]] = None) -> str:
+        """
+        Queues an agent run and returns its job id.
+
+        Args:
+            query (str): The user query
+            priority (int): Lower runs first
+            runner (Callable): Blocking callable returning the response of the job, run in a
+                thread while holding one of the worker slots. It can report progress with
+                job.record. None runs stream_agent on the event loop.
+
+        Raises:
+            QueueFullError: When max_queued jobs are already waiting
+        """
+        self._ensure_started()
+        with self._lock:
+            self._prune()
+            if self.queued_count() >= self.max_queued:
+                raise QueueFullError(f"{self.max_queued} queries are already waiting, please retry in a minute")
+            job = AgentJob(id=uuid.uuid4().hex, query=query, priority=priority, submitted_at=time.time(), runner=runner)
+            self.jobs[job.id] = job
+        get_loop().call_soon_threadsafe(self._queue.put_nowait, (priority, next(self._sequence), job.id))
+        return job.id
+
+    def get(self, job_id: str) -> Optional[AgentJob]:
+        return self.jobs.get(job_id)
+
+    def queued_count(self) -> int:
+        return sum(1 for job in self.jobs.values() if job.status == JobStatus.QUEUED)
+
+    def position(self, job_id: str) -> int:
+        """
+        Returns how many queued jobs run before this one, 0 once it is running.
+        """
+        job = self.jobs.get(job_id)
+        if job is None or job.status != JobStatus.QUEUED:
+            return 0
+        key = (job.priority, job.submitted_at)
+        return sum(
+            1 for other in list(self.jobs.values())
+            if other.status == JobStatus.QUEUED and (other.priority, other.submitted_at) < key
+        )
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancels a queued or running job, returns False when it already finished.
+        A running blocking runner can not be interrupted, it finishes in its thread and the result is dropped.
+        """
+        job = self.jobs.get(job_id)
+        if job is None or job.done:
+            return False
+        job.status = JobStatus.CANCELLED
+        job.finished_at = time.time()
+        task = self._tasks.get(job_id)
+        if task is not None:
+            get_loop().call_soon_threadsafe(task.cancel)
+        return True
+
+    async def _run(self, job: AgentJob) -> None:
+        if job.runner is not None:
+            thread = asyncio.ensure_future(asyncio.to_thread(job.runner, job))
+            try:
+                response = await asyncio.shield(thread)
+            except asyncio.CancelledError:
+                # The thread can not be stopped, its worker slot stays taken until it returns
+                await asyncio.wait([thread])
+                raise
+            if job.status == JobStatus.RUNNING:
+                job.response = response
+            return
+        async for event in stream_agent(job.query):
+            job.record(event)
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, job_id = await self._queue.get()
+            job = self.jobs.get(job_id)
+            # Cancelled while waiting
+            if job is None or job.status != JobStatus.QUEUED:
+                continue
+
+            job.status = JobStatus.RUNNING
+            job.started_at = time.time()
+            task = asyncio.ensure_future(self._run(job))
+            self._tasks[job_id] = task
+            try:
+                await task
+                if job.status == JobStatus.RUNNING:
+                    job.status = JobStatus.DONE
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    raise
+                job.status = JobStatus.CANCELLED
+            except Exception as e:
+                job.status = JobStatus.FAILED
+                job.error = str(e)
+            finally:
+                self._tasks.pop(job_id, None)
+                job.finished_at = job.finished_at or time.time()
+            print(f"job {job_id} {job.status.value}: waited {job.wait_time:.1f}s, ran {job.run_time:.1f}s")
+
+    def _prune(self) -> None:
+        now = time.time()
+        for job_id in [
+            job_id for job_id, job in self.jobs.items()
+            if job.done and now - job.finished_at > JOB_RETENTION
+        ]:
+            del self.jobs[job_id]
+
+    def report(self) -> str:
+        counts = {status: 0 for status in JobStatus}
+        for job in list(self.jobs.values()):
+            counts[job.status] += 1
+        return ", ".join(f"{status.value}: {count}" for status, count in counts.items())
+
+
+agent_jobs = JobQueue()
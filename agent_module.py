@@ -1,5 +1,3 @@
-import requests
-from langchain_experimental.utilities import PythonREPL
 from typing import Annotated, List, Optional, Tuple, Union, Dict, Any
 from pydantic import BaseModel, Field
 import re
@@ -22,19 +20,38 @@ from io import StringIO
 from pathlib import Path
 from datetime import datetime
 import logfire
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
+from schema_pruning import select_schema
+from dataset_store import read_columns, load_dataset
+from liquidity_data import afetch_dataset, fetch_datasets
+from enso_client import fetch_route, fetch_routes, route_table, EnsoError
+from entity_mirror import entity_mirror
+from token_resolver import token_resolver
+from local_router import ROUTE_SOURCE, find_route, get_pool_graph
+from async_runtime import run_coroutine
+from code_sandbox import sandbox_pool
+from liquidity_metrics import compute_metrics, format_metrics
+from tick_depth import get_depth_profile, quotes_frame
+from chart_render import chart_pool, schedule_images
+from run_workspace import Workspace, WorkspaceError, create_workspace, release_workspace
+from answer_cache import answer_cache
+from instrumentation import instrument_tool, metrics, setup_instrumentation, timed, timed_model
 import pandas as pd
+import numpy as np
 from datetime import datetime
 from pydantic_ai.providers.openai import OpenAIProvider
 import json
+import time
+import asyncio
+import aiohttp
+from typing import AsyncIterator, Callable
+from pydantic_ai.messages import FunctionToolCallEvent
 
 dotenv.load_dotenv()
 
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-if os.getenv("LOGFIRE_TOKEN"):
-    logfire.configure(token=os.getenv("LOGFIRE_TOKEN"), scrubbing=False)
+# logfire and the metrics endpoint are set up once per process, not per run
+setup_instrumentation()
 
 
 def read_json_file(filepath: str) -> Union[str, Dict[str, Any]]:
@@ -80,557 +97,91 @@ def read_json_file(filepath: str) -> Union[str, Dict[str, Any]]:
         return f"Error reading file: {str(e)}"
     
 
-schema = """
-type Factory @entity {
-  # factory address
-  id: ID!
-  # amount of pools created
-  poolCount: BigInt!
-  # amoutn of transactions all time
-  txCount: BigInt!
-  # total volume all time in derived USD
-  totalVolumeUSD: BigDecimal!
-  # total volume all time in derived ETH
-  totalVolumeETH: BigDecimal!
-  # total swap fees all time in USD
-  totalFeesUSD: BigDecimal!
-  # total swap fees all time in USD
-  totalFeesETH: BigDecimal!
-  # all volume even through less reliable USD values
-  untrackedVolumeUSD: BigDecimal!
-  # TVL derived in USD
-  totalValueLockedUSD: BigDecimal!
-  # TVL derived in ETH
-  totalValueLockedETH: BigDecimal!
-  # TVL derived in USD untracked
-  totalValueLockedUSDUntracked: BigDecimal!
-  # TVL derived in ETH untracked
-  totalValueLockedETHUntracked: BigDecimal!
-
-  # current owner of the factory
-  owner: ID!
-}
-
-# stores for USD calculations
-type Bundle @entity {
-  id: ID!
-  # price of ETH in usd
-  ethPriceUSD: BigDecimal!
-}
-
-type Token @entity {
-  # token address
-  id: Bytes!
-  # token symbol
-  symbol: String!
-  # token name
-  name: String!
-  # token decimals
-  decimals: BigInt!
-  # token total supply
-  totalSupply: BigInt!
-  # volume in token units
-  volume: BigDecimal!
-  # volume in derived USD
-  volumeUSD: BigDecimal!
-  # volume in USD even on pools with less reliable USD values
-  untrackedVolumeUSD: BigDecimal!
-  # fees in USD
-  feesUSD: BigDecimal!
-  # transactions across all pools that include this token
-  txCount: BigInt!
-  # number of pools containing this token
-  poolCount: BigInt!
-  # liquidity across all pools in token units
-  totalValueLocked: BigDecimal!
-  # liquidity across all pools in derived USD
-  totalValueLockedUSD: BigDecimal!
-  # TVL derived in USD untracked
-  totalValueLockedUSDUntracked: BigDecimal!
-  # Note: for chains where ETH is not the native token, this will be the derived
-  # price of that chain's native token, effectively, this should be renamed
-  # derivedNative
-  derivedETH: BigDecimal!
-  # pools token is in that are white listed for USD pricing
-  whitelistPools: [Pool!]!
-  # derived fields
-  tokenDayData: [TokenDayData!]! @derivedFrom(field: "token")
-}
-
-type Pool @entity {
-  # pool address
-  id: Bytes!
-  # creation
-  createdAtTimestamp: BigInt!
-  # block pool was created at
-  createdAtBlockNumber: BigInt!
-  # token0
-  token0: Token!
-  # token1
-  token1: Token!
-  # fee amount
-  feeTier: BigInt!
-  # in range liquidity
-  liquidity: BigInt!
-  # current price tracker
-  sqrtPrice: BigInt!
-  # token0 per token1
-  token0Price: BigDecimal!
-  # token1 per token0
-  token1Price: BigDecimal!
-  # current tick
-  tick: BigInt
-  # current observation index
-  observationIndex: BigInt!
-  # all time token0 swapped
-  volumeToken0: BigDecimal!
-  # all time token1 swapped
-  volumeToken1: BigDecimal!
-  # all time USD swapped
-  volumeUSD: BigDecimal!
-  # all time USD swapped, unfiltered for unreliable USD pools
-  untrackedVolumeUSD: BigDecimal!
-  # fees in USD
-  feesUSD: BigDecimal!
-  # all time number of transactions
-  txCount: BigInt!
-  # all time fees collected token0
-  collectedFeesToken0: BigDecimal!
-  # all time fees collected token1
-  collectedFeesToken1: BigDecimal!
-  # all time fees collected derived USD
-  collectedFeesUSD: BigDecimal!
-  # total token 0 across all ticks
-  totalValueLockedToken0: BigDecimal!
-  # total token 1 across all ticks
-  totalValueLockedToken1: BigDecimal!
-  # tvl derived ETH
-  totalValueLockedETH: BigDecimal!
-  # tvl USD
-  totalValueLockedUSD: BigDecimal!
-  # TVL derived in USD untracked
-  totalValueLockedUSDUntracked: BigDecimal!
-  # Fields used to help derived relationship
-  liquidityProviderCount: BigInt! # used to detect new exchanges
-  # hourly snapshots of pool data
-  poolHourData: [PoolHourData!]! @derivedFrom(field: "pool")
-  # daily snapshots of pool data
-  poolDayData: [PoolDayData!]! @derivedFrom(field: "pool")
-  # derived fields
-  mints: [Mint!]! @derivedFrom(field: "pool")
-  burns: [Burn!]! @derivedFrom(field: "pool")
-  swaps: [Swap!]! @derivedFrom(field: "pool")
-  collects: [Collect!]! @derivedFrom(field: "pool")
-  ticks: [Tick!]! @derivedFrom(field: "pool")
-}
-
-type Tick @entity {
-  # format: <pool address>#<tick index>
-  id: ID!
-  # pool address
-  poolAddress: Bytes!
-  # tick index
-  tickIdx: BigInt!
-  # pointer to pool
-  pool: Pool!
-  # total liquidity pool has as tick lower or upper
-  liquidityGross: BigInt!
-  # how much liquidity changes when tick crossed
-  liquidityNet: BigInt!
-  # calculated price of token0 of tick within this pool - constant
-  price0: BigDecimal!
-  # calculated price of token1 of tick within this pool - constant
-  price1: BigDecimal!
-  # created time
-  createdAtTimestamp: BigInt!
-  # created block
-  createdAtBlockNumber: BigInt!
-}
-
-type Transaction @entity {
-  # txn hash
-  id: ID!
-  # block txn was included in
-  blockNumber: BigInt!
-  # timestamp txn was confirmed
-  timestamp: BigInt!
-  # gas used during txn execution
-  gasUsed: BigInt!
-  gasPrice: BigInt!
-  # derived values
-  mints: [Mint]! @derivedFrom(field: "transaction")
-  burns: [Burn]! @derivedFrom(field: "transaction")
-  swaps: [Swap]! @derivedFrom(field: "transaction")
-  flashed: [Flash]! @derivedFrom(field: "transaction")
-  collects: [Collect]! @derivedFrom(field: "transaction")
-}
-
-type Mint @entity {
-  # transaction hash + "#" + index in mints Transaction array
-  id: ID!
-  # which txn the mint was included in
-  transaction: Transaction!
-  # time of txn
-  timestamp: BigInt!
-  # pool position is within
-  pool: Pool!
-  # allow indexing by tokens
-  token0: Token!
-  # allow indexing by tokens
-  token1: Token!
-  # owner of position where liquidity minted to
-  owner: Bytes!
-  # the address that minted the liquidity
-  sender: Bytes
-  # txn origin
-  origin: Bytes! # the EOA that initiated the txn
-  # amount of liquidity minted
-  amount: BigInt!
-  # amount of token 0 minted
-  amount0: BigDecimal!
-  # amount of token 1 minted
-  amount1: BigDecimal!
-  # derived amount based on available prices of tokens
-  amountUSD: BigDecimal
-  # lower tick of the position
-  tickLower: BigInt!
-  # upper tick of the position
-  tickUpper: BigInt!
-  # order within the txn
-  logIndex: BigInt
-}
-
-type Burn @entity {
-  # transaction hash + "#" + index in mints Transaction array
-  id: ID!
-  # txn burn was included in
-  transaction: Transaction!
-  # pool position is within
-  pool: Pool!
-  # allow indexing by tokens
-  token0: Token!
-  # allow indexing by tokens
-  token1: Token!
-  # need this to pull recent txns for specific token or pool
-  timestamp: BigInt!
-  # owner of position where liquidity was burned
-  owner: Bytes
-  # txn origin
-  origin: Bytes! # the EOA that initiated the txn
-  # amouny of liquidity burned
-  amount: BigInt!
-  # amount of token 0 burned
-  amount0: BigDecimal!
-  # amount of token 1 burned
-  amount1: BigDecimal!
-  # derived amount based on available prices of tokens
-  amountUSD: BigDecimal
-  # lower tick of position
-  tickLower: BigInt!
-  # upper tick of position
-  tickUpper: BigInt!
-  # position within the transactions
-  logIndex: BigInt
-}
-
-type Swap @entity {
-  # transaction hash + "#" + index in swaps Transaction array
-  id: ID!
-  # pointer to transaction
-  transaction: Transaction!
-  # timestamp of transaction
-  timestamp: BigInt!
-  # pool swap occured within
-  pool: Pool!
-  # allow indexing by tokens
-  token0: Token!
-  # allow indexing by tokens
-  token1: Token!
-  # sender of the swap
-  sender: Bytes!
-  # recipient of the swap
-  recipient: Bytes!
-  # txn origin
-  origin: Bytes! # the EOA that initiated the txn
-  # delta of token0 swapped
-  amount0: BigDecimal!
-  # delta of token1 swapped
-  amount1: BigDecimal!
-  # derived info
-  amountUSD: BigDecimal!
-  # The sqrt(price) of the pool after the swap, as a Q64.96
-  sqrtPriceX96: BigInt!
-  # the tick after the swap
-  tick: BigInt!
-  # index within the txn
-  logIndex: BigInt
-}
-
-type Collect @entity {
-  # transaction hash + "#" + index in collect Transaction array
-  id: ID!
-  # pointer to txn
-  transaction: Transaction!
-  # timestamp of event
-  timestamp: BigInt!
-  # pool collect occured within
-  pool: Pool!
-  # owner of position collect was performed on
-  owner: Bytes
-  # amount of token0 collected
-  amount0: BigDecimal!
-  # amount of token1 collected
-  amount1: BigDecimal!
-  # derived amount based on available prices of tokens
-  amountUSD: BigDecimal
-  # lower tick of position
-  tickLower: BigInt!
-  # uppper tick of position
-  tickUpper: BigInt!
-  # index within the txn
-  logIndex: BigInt
-}
-
-type Flash @entity {
-  # transaction hash + "-" + index in collect Transaction array
-  id: ID!
-  # pointer to txn
-  transaction: Transaction!
-  # timestamp of event
-  timestamp: BigInt!
-  # pool collect occured within
-  pool: Pool!
-  # sender of the flash
-  sender: Bytes!
-  # recipient of the flash
-  recipient: Bytes!
-  # amount of token0 flashed
-  amount0: BigDecimal!
-  # amount of token1 flashed
-  amount1: BigDecimal!
-  # derived amount based on available prices of tokens
-  amountUSD: BigDecimal!
-  # amount token0 paid for flash
-  amount0Paid: BigDecimal!
-  # amount token1 paid for flash
-  amount1Paid: BigDecimal!
-  # index within the txn
-  logIndex: BigInt
-}
-
-# Data accumulated and condensed into day stats for all of Uniswap
-type UniswapDayData @entity {
-  # timestamp rounded to current day by dividing by 86400
-  id: ID!
-  # timestamp rounded to current day by dividing by 86400
-  date: Int!
-  # total daily volume in Uniswap derived in terms of ETH
-  volumeETH: BigDecimal!
-  # total daily volume in Uniswap derived in terms of USD
-  volumeUSD: BigDecimal!
-  # total daily volume in Uniswap derived in terms of USD untracked
-  volumeUSDUntracked: BigDecimal!
-  # fees in USD
-  feesUSD: BigDecimal!
-  # number of daily transactions
-  txCount: BigInt!
-  # tvl in terms of USD
-  tvlUSD: BigDecimal!
-}
-
-# Data accumulated and condensed into day stats for each pool
-type PoolDayData @entity {
-  # timestamp rounded to current day by dividing by 86400
-  id: ID!
-  # timestamp rounded to current day by dividing by 86400
-  date: Int!
-  # pointer to pool
-  pool: Pool!
-  # in range liquidity at end of period
-  liquidity: BigInt!
-  # current price tracker at end of period
-  sqrtPrice: BigInt!
-  # price of token0 - derived from sqrtPrice
-  token0Price: BigDecimal!
-  # price of token1 - derived from sqrtPrice
-  token1Price: BigDecimal!
-  # current tick at end of period
-  tick: BigInt
-  # tvl derived in USD at end of period
-  tvlUSD: BigDecimal!
-  # volume in token0
-  volumeToken0: BigDecimal!
-  # volume in token1
-  volumeToken1: BigDecimal!
-  # volume in USD
-  volumeUSD: BigDecimal!
-  # fees in USD
-  feesUSD: BigDecimal!
-  # numebr of transactions during period
-  txCount: BigInt!
-  # opening price of token0
-  open: BigDecimal!
-  # high price of token0
-  high: BigDecimal!
-  # low price of token0
-  low: BigDecimal!
-  # close price of token0
-  close: BigDecimal!
-}
-
-# hourly stats tracker for pool
-type PoolHourData @entity {
-  # format: <pool address>-<timestamp>
-  id: ID!
-  # unix timestamp for start of hour
-  periodStartUnix: Int!
-  # pointer to pool
-  pool: Pool!
-  # in range liquidity at end of period
-  liquidity: BigInt!
-  # current price tracker at end of period
-  sqrtPrice: BigInt!
-  # price of token0 - derived from sqrtPrice
-  token0Price: BigDecimal!
-  # price of token1 - derived from sqrtPrice
-  token1Price: BigDecimal!
-  # current tick at end of period
-  tick: BigInt
-  # tvl derived in USD at end of period
-  tvlUSD: BigDecimal!
-  # volume in token0
-  volumeToken0: BigDecimal!
-  # volume in token1
-  volumeToken1: BigDecimal!
-  # volume in USD
-  volumeUSD: BigDecimal!
-  # fees in USD
-  feesUSD: BigDecimal!
-  # numebr of transactions during period
-  txCount: BigInt!
-  # opening price of token0
-  open: BigDecimal!
-  # high price of token0
-  high: BigDecimal!
-  # low price of token0
-  low: BigDecimal!
-  # close price of token0
-  close: BigDecimal!
-}
-
-type TokenDayData @entity {
-  # token address concatendated with date
-  id: ID!
-  # timestamp rounded to current day by dividing by 86400
-  date: Int!
-  # pointer to token
-  token: Token!
-  # volume in token units
-  volume: BigDecimal!
-  # volume in derived USD
-  volumeUSD: BigDecimal!
-  # volume in USD even on pools with less reliable USD values
-  untrackedVolumeUSD: BigDecimal!
-  # liquidity across all pools in token units
-  totalValueLocked: BigDecimal!
-  # liquidity across all pools in derived USD
-  totalValueLockedUSD: BigDecimal!
-  # price at end of period in USD
-  priceUSD: BigDecimal!
-  # fees in USD
-  feesUSD: BigDecimal!
-  # opening price USD
-  open: BigDecimal!
-  # high price USD
-  high: BigDecimal!
-  # low price USD
-  low: BigDecimal!
-  # close price USD
-  close: BigDecimal!
-}
-
-type TokenHourData @entity {
-  # token address concatendated with date
-  id: ID!
-  # unix timestamp for start of hour
-  periodStartUnix: Int!
-  # pointer to token
-  token: Token!
-  # volume in token units
-  volume: BigDecimal!
-  # volume in derived USD
-  volumeUSD: BigDecimal!
-  # volume in USD even on pools with less reliable USD values
-  untrackedVolumeUSD: BigDecimal!
-  # liquidity across all pools in token units
-  totalValueLocked: BigDecimal!
-  # liquidity across all pools in derived USD
-  totalValueLockedUSD: BigDecimal!
-  # price at end of period in USD
-  priceUSD: BigDecimal!
-  # fees in USD
-  feesUSD: BigDecimal!
-  # opening price USD
-  open: BigDecimal!
-  # high price USD
-  high: BigDecimal!
-  # low price USD
-  low: BigDecimal!
-  # close price USD
-  close: BigDecimal!
-}
-"""
-
-
 
 @dataclass
 class agent_state:
     user_query: str = Field(description="The user quer that needs to be answered")
+    workspace: Optional[Workspace] = None
 
 
 
 # Output structure
 class agent_response(BaseModel):
     markdown_report: str = Field(description="The markdown report of the user query")
-    csv_path: str = Field(description="The path where the reference csv file is stored as retreived by the tool")
-    metrics_dict: str = Field(description = "A string of metrics calculated from the data in tabular format using tabulate library as returned by the metric_calculator tool")
+    csv_path: str = Field(description="The path where the reference dataset file (parquet) is stored as retreived by the tool")
+    metrics_dict: str = Field(description = "A string of metrics calculated from the data in tabular format using tabulate library as returned by the liquidity_metrics or metric_calculator tool")
     html_path: list[str] = Field(description = "The list of paths where the html of visualizations is stored")
     png_path: list[str] = Field(description = "The list of paths where the png of visualizations is stored")
     pdf_path: str = Field(description = "The path where the pdf of the report can be stored")
     enso_route: str = Field(description = "The routing information from Enso Finance API", default='')
     enso_route_file: str = Field(description = "The path where the routing information from Enso Finance API is stored", default='')
+    served_from_cache: str = Field(description = "Set by the answer cache, always leave empty", default='')
 
-model = openai.OpenAIModel('gpt-4o',provider=OpenAIProvider(api_key=os.getenv('OPENAI_API_KEY')))
+# Latency and token counts of every LLM turn are recorded
+model = timed_model(openai.OpenAIModel('gpt-4o',provider=OpenAIProvider(api_key=os.getenv('OPENAI_API_KEY'))))
 agent = Agent(model=model, deps_type=agent_state, result_type=agent_response)
 
 current_date = datetime.now().strftime("%Y-%m-%d")
 
 @agent.system_prompt
 def get_agent_system_prompt(ctx: RunContext[agent_state]):
-    
+
+    # Only the entities relevant to the query, with the types they reference
+    selection = select_schema(ctx.deps.user_query)
+    metrics.log({
+        "event": "schema_selection", "entities": selection.entities,
+        "prompt_schema_tokens": selection.pruned_tokens, "full_schema_tokens": selection.full_tokens,
+    })
+
+    # Tokens named in the query are resolved from the local token index, no lookup turn needed.
+    # The index is rebuilt on the mirror refresher thread, the prompt only reads it
+    resolved_tokens = ""
+    try:
+        token_resolver.start()
+        if token_resolver.by_address:
+            resolved_tokens = token_resolver.describe(ctx.deps.user_query)
+    except Exception as e:
+        print(f"Could not resolve the tokens of the query: {e}")
+    if resolved_tokens:
+        resolved_tokens = f"Tokens mentioned in the query, resolved by TVL (use these addresses, no lookup needed):\n{resolved_tokens}\n"
+
     prompt = f"""
     You are an analyst for a a crypto trading company. Your goal is to analyse liquidity of a crypto token and provide users important information relevant to the user query with a detailed report.
     The user will provide you a query and schema of the liquidity information of the crypto token. You will access the relevant to the tools help you to retreive the liquidity information of the crypto token.
     The user query is:\n {ctx.deps.user_query} and the current date is {current_date}\n
-    The graphql schema of the liquidity information of the crypto token is:
-    {schema}
+    All files of this run live in the workspace directory {ctx.deps.workspace.path}. Pass plain file names to the tools,
+    python code runs with this directory as working directory and can only read and write files in it, use plain file names.
+    os, sys and subprocess are not available in the code, pandas, numpy, math, datetime, json, re, tabulate and plotly are.
+    {resolved_tokens}
+    The graphql schema of the liquidity information of the crypto token is (limited to the entities relevant to the query):
+    {selection.sdl}
     
     You have access to the following tools to perform analysis:
+    - resolve_token : to find the address of a token by symbol or name from the local token index
+    - query_local_index : to look up pools and tokens (pools of a token, top pools, tokens by volume, token addresses) with SQL on a local mirror in milliseconds
     - query_liquidity_data : to retrieve the liquidity information of the crypto token
+    - query_liquidity_data_batch : to retrieve several independent datasets at once, e.g. pools, tokens and day data for a comparison
+    - liquidity_metrics : to calculate the standard metrics (TVL share, volume/TVL, fee APR, HHI concentration, fee tier breakdown, price change, volatility) of Pool, PoolDayData, PoolHourData and TokenDayData datasets
+    - price_impact : to calculate the exact price impact, output amount and depth of swaps of given sizes in a pool from its ticks
     - metric_calculator : to run the python code to calculate the metrics
-    - get_column_list : to retrieve the column list from the json file
+    - get_column_list : to retrieve the column names and types of a dataset file
     - graph_generator : to generate the graph
     - get_transaction_route : to get the token swap information if user asks for token swap.
+    - get_route_size_table : to quote the swap route for several amounts at once, e.g. 1, 10 and 100 ETH
     
     Follow the following steps:
     1. Understand the user query and identify what liquidity information the user is looking for
     2. Based on the schema, frame a graphql query to retrieve the liquidity information of the crypto token
     3. Use the query_liquidity_data tool to access the relevant liquidity information of the crypto token
-    4. Use the get_column_list tool to retrieve the column list from the csv file, use these columns for metric calculation and visualization
+    4. Use the get_column_list tool to retrieve the column list from the parquet dataset, use these columns for metric calculation and visualization.
+       In your python code load datasets with pd.read_parquet(<file_name>, columns=[<only the columns you need>]), never with pd.read_csv
+       In metric_calculator the datasets are already loaded as datasets['<file name without .parquet>'], reuse them instead of reading the files again
+       Columns are already typed: amounts and prices are float64, dates and timestamps are UTC datetimes, ids are categories and
+       very large integers (liquidity, sqrtPrice) are exact Decimal objects, use .astype(float) on those before arithmetic with floats
     5. List out the metrics that you can calculate from the liquidity information and data summary
-    6. Use the metric_calculator tool to run the python code using the tabulate library to calculate the metrics, use print statement to read the calculated metrics in tabular format
+    6. Use the liquidity_metrics tool first for the standard metrics of Pool, PoolDayData, PoolHourData and TokenDayData datasets, then use the metric_calculator tool to run the python code using the tabulate library to calculate the metrics, use print statement to read the calculated metrics in tabular format
     7. use the get_transaction_route tool to get the routing information from the user query is about the best route to swap the token
-    8. Plot charts for the metrics calculated in step 6 using plotly express library and save them in html and png format. Use the graph_generator tool to execute the code and save the output in html and png format
+    8. Plot charts for the metrics calculated in step 6 using plotly express library and save each chart with fig.write_html(<name>.html) and fig.write_image(<name>.png). Use the graph_generator tool to execute the code, the png is kept as a figure spec and rendered on demand, so list its path in png_path even though the file appears later
     9. Analyze the liquidity information thoroughly, focusing the information asked by the user in the query
     10. Create a comprehensive markdown report, use your best judgement to structure the report. Bold the key information asked by the user in the report.
     
@@ -649,65 +200,118 @@ def get_agent_system_prompt(ctx: RunContext[agent_state]):
     return prompt
 
 @agent.tool
+@instrument_tool
 async def get_column_list(
     ctx: RunContext[None],
-    file_name: Annotated[str, "The name of the csv file that has the data"]
+    file_name: Annotated[str, "The name of the parquet file that has the data"]
 ):
     """
-    Use this tool to get the column list from the CSV file.
+    Use this tool to get the column names and types of a dataset file.
     
     Parameters:
-    - file_name: The name of the CSV file that has the data
+    - file_name: The name of the parquet file that has the data
     """
-    df = pd.read_csv(file_name)
-    columns = df.columns.tolist()
+    # Only the file metadata is read, not the rows
+    try:
+        columns = read_columns(ctx.deps.workspace.resolve(file_name))
+    except (OSError, WorkspaceError) as e:
+        return f"Could not read columns of {file_name}: {e}"
     return str(columns)
 
 
 # Fetch paginated data
 @agent.tool
-def query_liquidity_data(ctx: RunContext[None], 
+@instrument_tool
+async def query_liquidity_data(ctx: RunContext[None], 
                          query: Annotated[str, "The GraphQL query to fetch the data"], 
-                         output_file: Annotated[str, "The name of the csv file that has the data"] = "query_results.csv"):
+                         output_file: Annotated[str, "The name of the parquet file that has the data"] = "query_results.parquet",
+                         export_csv: Annotated[bool, "Also export the data as a csv file next to the parquet file"] = False):
     """
-    Runs a GraphQL query on the given endpoint and saves the result to a CSV file.
+    Runs a GraphQL query on the given endpoint and saves the result to a Parquet file.
+    List queries are fetched page by page with a cursor, so results are not capped at the subgraph page size.
     """
-    # Set up transport and client
-    transport = RequestsHTTPTransport(url=os.getenv("GRAPHQL_ENDPOINT"), verify=True, retries=3)
-    client = Client(transport=transport, fetch_schema_from_transport=True)
+    try:
+        ctx.deps.workspace.ensure_quota()
+        return await afetch_dataset(query, ctx.deps.workspace.resolve(output_file), export_csv)
+    except Exception as e:
+        return f"GraphQL query failed: {e}"
 
+
+@agent.tool
+@instrument_tool
+async def resolve_token(ctx: RunContext[None],
+                        token: Annotated[str, "Token symbol, name, address or the start of a symbol or name, e.g. PEPE or 0x6982..."]):
+    """
+    Finds the address, decimals and TVL of a token from the local token index, ambiguous symbols are ranked by TVL.
+    Use this instead of a GraphQL query when you only need the address of a token.
+    """
     try:
-        response = client.execute(gql(query))
-
-        # Flatten the top-level field dynamically
-        top_level_key = list(response.keys())[0]
-        data = response[top_level_key]
-
-        # Attempt flattening token subfields if they exist
-        flat_data = []
-        if len(data) > 0:
-            for item in data:
-                flat_item = item.copy()
-                if "token" in item and isinstance(item["token"], dict):
-                    flat_item.update({
-                        "token_id": item["token"].get("id"),
-                        "symbol": item["token"].get("symbol"),
-                        "name": item["token"].get("name"),
-                    })
-                    del flat_item["token"]
-                flat_data.append(flat_item)
-
-            df = pd.DataFrame(flat_data)
-            df.to_csv(output_file, index=False)
-            print(f"Saved query results to {output_file}")
-            return f"Saved query results to {output_file} \n dataset summary:\n {df.describe()}"
-        
+        if not await asyncio.to_thread(token_resolver.refresh):
+            await asyncio.to_thread(entity_mirror.ensure_fresh)
+            await asyncio.to_thread(token_resolver.refresh)
+    except Exception as e:
+        return f"Token index unavailable: {e}"
+    matches = token_resolver.resolve(token)
+    if not matches:
+        return f"No token matches {token} in the local token index"
+    return "\n".join(
+        f"{m.symbol} ({m.name}) address {m.address}, decimals {m.decimals}, TVL ${m.tvl_usd:,.0f}, "
+        f"volume ${m.volume_usd:,.0f}, matched on {m.matched_on}"
+        for m in matches
+    )
+
 
+@agent.tool
+@instrument_tool
+async def query_local_index(ctx: RunContext[None],
+                            sql: Annotated[str, "A single SQLite SELECT statement on the pools and tokens tables"],
+                            output_file: Annotated[Optional[str], "Optional parquet file name to save the result to"] = None):
+    """
+    Looks up pools and tokens in the local mirror of the most liquid Pool and Token entities in milliseconds,
+    e.g. pools containing a token, top pools by TVL or fee tier, tokens by volume, token addresses by symbol.
+    Use this before query_liquidity_data for discovery, the mirror is refreshed every few minutes,
+    use query_liquidity_data for history and data that has to be live. Tables:
+    pools(id, fee_tier, token0_id, token0_symbol, token0_name, token0_decimals, token1_id, token1_symbol, token1_name,
+          token1_decimals, liquidity, sqrt_price, tick, token0_price, token1_price, volume_usd, fees_usd, tx_count, tvl_usd, created_at)
+    tokens(id, symbol, name, decimals, volume_usd, fees_usd, tx_count, pool_count, tvl_usd, derived_eth)
+    """
+    try:
+        await asyncio.to_thread(entity_mirror.ensure_fresh)
+        df = await asyncio.to_thread(entity_mirror.query, sql)
+        if output_file:
+            await asyncio.to_thread(df.to_parquet, ctx.deps.workspace.resolve(output_file), index=False)
     except Exception as e:
-        return f"GraphQL query failed: {response}"
+        return f"Local index query failed: {e}"
+    saved = f"Saved to {output_file}\n" if output_file else ""
+    return f"{saved}{len(df)} rows\n{df.to_string(index=False)}"
+
+
+class named_query(BaseModel):
+    name: str = Field(description="Short name of the query, used as the parquet file name, e.g. top_weth_pools")
+    query: str = Field(description="The GraphQL query to fetch the data")
+
+
+@agent.tool
+@instrument_tool
+async def query_liquidity_data_batch(ctx: RunContext[None],
+                                     queries: Annotated[List[named_query], "The named GraphQL queries to run"],
+                                     concurrency: Annotated[int, "Maximum number of queries running at the same time"] = 4):
+    """
+    Runs several independent GraphQL queries concurrently and saves each result to <name>.parquet.
+    Use this instead of calling query_liquidity_data repeatedly when you need more than one dataset.
+    """
+    try:
+        ctx.deps.workspace.ensure_quota()
+    except WorkspaceError as e:
+        return str(e)
+    results = await fetch_datasets(
+        {q.name: q.query for q in queries}, concurrency=concurrency, output_dir=ctx.deps.workspace.path
+    )
+    return "\n\n".join(f"[{name}]\n{message}" for name, message in results.items())
 
 '''
 @agent.tool
+@instrument_tool
 def write_markdown_to_file(ctx: RunContext[None], content: Annotated[str, "The markdown content to write"], 
                         filename: Annotated[str, "The name of the file (with or without .md extension)"] = "blog.md") -> str:
     """
@@ -732,25 +336,100 @@ def write_markdown_to_file(ctx: RunContext[None], content: Annotated[str, "The m
 
 
 
+@agent.tool
+@instrument_tool
+async def liquidity_metrics(ctx: RunContext[None],
+                            file_names: Annotated[List[str], "The parquet files of Pool, PoolDayData, PoolHourData or TokenDayData queries"]):
+    """
+    Calculates the standard liquidity metrics of the datasets without writing code and returns them as tables.
+    - Pool datasets (totalValueLockedUSD, feeTier, volumeUSD, feesUSD, token0 { symbol }, token1 { symbol }):
+      TVL share, volume/TVL, fees/TVL per pool, HHI concentration of TVL and a fee tier breakdown
+    - PoolDayData datasets (date, pool { id }, tvlUSD, volumeUSD, feesUSD): average TVL and volume, daily volume/TVL and fee APR per pool
+    - PoolHourData datasets (periodStartUnix, pool { id }, tvlUSD, volumeUSD, feesUSD): the same per hour, fee APR annualized over 8760 hours
+    - TokenDayData datasets (date, token { symbol }, totalValueLockedUSD, volumeUSD, priceUSD): average TVL and volume,
+      volume/TVL, price change and annualized volatility per token
+    """
+    def calculate(file_name):
+        try:
+            df = load_dataset(ctx.deps.workspace.resolve(file_name))
+            return f"[{file_name}]\n{format_metrics(compute_metrics(df))}"
+        except Exception as e:
+            return f"[{file_name}]\nCould not calculate metrics: {e}"
+
+    blocks = await asyncio.gather(*(asyncio.to_thread(calculate, f) for f in file_names))
+    return "\n\n".join(blocks)
+
+
+@agent.tool
+@instrument_tool
+async def price_impact(ctx: RunContext[None],
+                       pool_id: Annotated[str, "The pool address"],
+                       token_in: Annotated[str, "Symbol or address of the token sold, one of the two pool tokens"],
+                       amounts: Annotated[List[float], "Trade sizes in units of token_in, e.g. [1, 10, 100, 1000]"],
+                       output_file: Annotated[Optional[str], "Parquet file name for a 200 point price impact curve up to the largest size, e.g. price_impact_<pool>.parquet"] = None):
+    """
+    Calculates the exact output amount, execution price, price impact and ticks crossed of swaps of the given sizes
+    in one Uniswap v3 pool from its tick level liquidity, plus the liquidity depth within 1%, 2% and 5% of the price.
+    Use this for slippage, price impact and market depth questions instead of estimating them from TVL.
+    """
+    try:
+        profile = await get_depth_profile(pool_id)
+        sizes = list(amounts)
+        if output_file:
+            output_path = ctx.deps.workspace.resolve(output_file)
+            sizes += list(np.geomspace(max(amounts) / 1000, max(amounts), 200))
+        quotes = await asyncio.to_thread(profile.quote, sizes, token_in)
+    except (ValueError, WorkspaceError) as e:
+        return f"Error: {e}"
+    except Exception as e:
+        return f"Could not fetch the ticks of pool {pool_id}: {e}"
+
+    table = quotes_frame(quotes[:len(amounts)])
+    lines = [profile.report(), table.to_string(index=False)]
+    for percent in (1, 2, 5):
+        token0, token1 = profile.depth(percent)
+        lines.append(
+            f"depth {percent}%: {token0:,.4f} {profile.token0['symbol']} to move the price down, "
+            f"{token1:,.4f} {profile.token1['symbol']} to move it up"
+        )
+    if output_file:
+        curve = quotes_frame(quotes[len(amounts):])
+        await asyncio.to_thread(curve.to_parquet, output_path, index=False)
+        lines.append(f"Price impact curve saved to {output_file}")
+    return "\n".join(lines)
+
+
 @agent.tool()
-def metric_calculator(ctx: RunContext[None], code: Annotated[str, "The python code to execute to run calculations"]):
+@instrument_tool
+async def metric_calculator(ctx: RunContext[None], code: Annotated[str, "The python code to execute to run calculations"]):
     """
     Use this tool to run analysis code only in case you want to run calculations to get the final answer or a metric. Always use print statement to print the result in format 'The calculated value for <variable_name> is <calculated_value>'.
+    The datasets of the run are already loaded as datasets['<file name without .parquet>'], or use load_dataset(file_name, columns=[...]).
+    pd, np and tabulate are imported and the working directory is the run workspace, files can only be read and written there.
     Parameters:
     - code: The python code to execute to run calculations.
     """
-    catcher = StringIO()
-    try:    
-        with redirect_stdout(catcher):
-            exec(code)
-        return catcher.getvalue()
-    except Exception as e:
-        return f"Failed to run code. Error: {repr(e)}"
+    workspace = ctx.deps.workspace
+    try:
+        workspace.ensure_quota()
+    except WorkspaceError as e:
+        return f"Failed to run code. Error: {e}"
+    # Runs in a warm sandboxed worker process with CPU, memory, time and file size limits
+    output = await asyncio.to_thread(
+        sandbox_pool.run, code, str(workspace.path), max_file_bytes=workspace.remaining_bytes()
+    )
+    # Files written by the code count against the quota of the run
+    try:
+        workspace.ensure_quota()
+    except WorkspaceError as e:
+        output += f"\n{e}"
+    return output
     
 
 
 @agent.tool()
-def graph_generator(
+@instrument_tool
+async def graph_generator(
     ctx: RunContext[None], 
     code: Annotated[str, "The python code to execute to generate your chart."]
 ) -> str:
@@ -762,93 +441,260 @@ def graph_generator(
     
     NOTE: While plotting graph always sort the data in descending order 
     and take top 10 values and do not use show() function.
+    px, go and pio (plotly) are imported, datasets of the run are loaded as datasets['<name>'].
     """
-    repl = PythonREPL()
-    
+    workspace = ctx.deps.workspace
     try:
-        print('EXECUTING CODE')
-        # Execute the code and capture output
-        output = repl.run(code)
-        print('CODE EXECUTED SUCCESSFULLY, MOVE ON TO NEXT STEP')
-        
-        # Check for errors in output
-        if 'Error' in str(output):
-            return (
-                f"Failed to execute code. Error:\n"
-                f"{output}\n\n"
-                "Please review the code and try again"
-            )
-        
-        # Return success message
+        workspace.ensure_quota()
+    except WorkspaceError as e:
+        return f"Failed to execute code. Error:\n{e}"
+    # Runs on a resident chart worker, the images of the call are exported in one batch
+    output = await asyncio.to_thread(
+        chart_pool.run, code, str(workspace.path), max_file_bytes=workspace.remaining_bytes()
+    )
+    # The html, json and spec files of the charts count against the quota of the run
+    try:
+        workspace.ensure_quota()
+    except WorkspaceError as e:
+        output += f"\n{e}"
+
+    if output.startswith("Failed to run code"):
         return (
-            "Successfully executed the python code\n\n"
-            "If you have completed all tasks, generate the final report and end the execution."
+            f"Failed to execute code. Error:\n"
+            f"{output}\n\n"
+            "Please review the code and try again"
         )
-        
-    except Exception as e:
-        return f"Failed to execute code. Error: {repr(e)}"
+
+    # Return success message
+    return (
+        "Successfully executed the python code\n\n"
+        f"{output}\n"
+        "If you have completed all tasks, generate the final report and end the execution."
+    )
       
 @agent.tool
-def get_transaction_route(ctx: RunContext[None], token_in: Annotated[str, "The input token address"], 
+@instrument_tool
+async def get_transaction_route(ctx: RunContext[None], token_in: Annotated[str, "The input token address"], 
                    token_out: Annotated[str, "The output token address"],
                    output_file: Annotated[str, "The name of the file that has the routing information in format transaction_route_<date>.json"], 
                    amount_in: Annotated[str, "The input amount in wei"] = "1000000000000000000",
                    ):
     """
     get routing information for transaction and swaps between two tokens, use this tool if the user query is about the best route to swap the token.
-
+    When the Enso API is unavailable the route comes from the local Uniswap v3 router over the most liquid pools ("source": "local").
     """
-    enso_api_key = os.getenv("ENSO_API_KEY")
-    enso_api_url = os.getenv("ENSO_API_URL")
-    headers = {
-        "Authorization": f"Bearer {enso_api_key}",
-        "Content-Type": "application/json"
-    }
-
-    payload = {
-        "chainId": 1,
-        "fromAddress": "0xc500557bFbB3D30B3d40BB36ae93b30F896c2ED6",
-        "routingStrategy": "router",
-        "toEoa": True,
-        "receiver": "0xc500557bFbB3D30B3d40BB36ae93b30F896c2ED6",
-        "spender": "0xc500557bFbB3D30B3d40BB36ae93b30F896c2ED6",
-        "amountIn": [amount_in],
-        "minAmountOut": None,
-        "slippage": "300",
-        "fee": ["100"],
-        "feeReceiver": "0x220866B1A2219f40e72f5c628B65D54268cA3A9D",
-        "ignoreAggregators": ["false"],
-        "ignoreStandards": ["<false>"],
-        "tokenIn": [token_in],
-        "tokenOut": [token_out],
-        "variableEstimates": None
-    }
-    
+    try:
+        output_file = ctx.deps.workspace.resolve(output_file)
+    except WorkspaceError as e:
+        return f"Error: {e}"
+    token_in, token_out = token_resolver.resolve_address(token_in), token_resolver.resolve_address(token_out)
+
+    route, note = None, ""
+    if ROUTE_SOURCE != "local":
+        try:
+            route = await fetch_route(token_in, token_out, amount_in)
+        except (EnsoError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            note = f"Enso route API failed ({e}), using the local Uniswap v3 route instead.\n"
+    # The local router answers from cached pools, it only runs when the API is slow, down or disabled
+    if route is None:
+        try:
+            route = await find_route(token_in, token_out, amount_in)
+        except Exception as e:
+            return f"Error: {note}local router failed: {e}"
+
+    # File writes are small, the request above is what used to block
+    with open(output_file, 'w') as f:
+        json.dump(route, f)
+
+    return f"{note}Routing information saved to {output_file}, \n the route is: {route['route']}"
     
 
-    response = requests.post(
-        enso_api_url,
-        headers=headers,
-        json=payload
+@agent.tool
+@instrument_tool
+async def get_route_size_table(ctx: RunContext[None], token_in: Annotated[str, "The input token address"],
+                               token_out: Annotated[str, "The output token address"],
+                               amounts_in: Annotated[List[str], "The input amounts in wei, e.g. 1, 10 and 100 ETH"],
+                               output_file: Annotated[str, "The name of the parquet file for the size vs output table"] = "route_sizes.parquet"):
+    """
+    Quotes the best swap route for several input amounts at once and returns a size vs output table
+    (amount out, rate, price impact, hops). Use this instead of calling get_transaction_route once per amount.
+    """
+    try:
+        output_file = ctx.deps.workspace.resolve(output_file)
+    except WorkspaceError as e:
+        return f"Error: {e}"
+    token_in, token_out = token_resolver.resolve_address(token_in), token_resolver.resolve_address(token_out)
+
+    if ROUTE_SOURCE == "local":
+        routes = [EnsoError(0, "skipped, ROUTE_SOURCE is local")] * len(amounts_in)
+    else:
+        routes = await fetch_routes(token_in, token_out, amounts_in)
+    # Amounts the API could not quote are routed locally
+    failed = [i for i, route in enumerate(routes) if isinstance(route, BaseException)]
+    fallbacks = await asyncio.gather(
+        *(find_route(token_in, token_out, amounts_in[i]) for i in failed), return_exceptions=True
     )
+    for i, route in zip(failed, fallbacks):
+        routes[i] = route if not isinstance(route, BaseException) else routes[i]
 
-    # Check response status
-    if response.status_code != 200:
-        return f"Error: API request failed with status code {response.status_code}. Response: {response.text}"
+    decimals = (18, 18)
+    try:
+        graph = await get_pool_graph()
+        tokens = [graph.tokens.get(graph.find_token(t) or "", {}) for t in (token_in, token_out)]
+        decimals = tuple(int(t.get("decimals", 18)) for t in tokens)
+    except Exception as e:
+        print(f"Token decimals unknown, assuming 18: {e}")
 
-    with open(output_file, 'w') as f:
-        json.dump(response.json(), f)
+    table = route_table(amounts_in, routes, *decimals)
+    await asyncio.to_thread(table.to_parquet, output_file, index=False)
+    return f"Size vs output table saved to {output_file}\n{table.to_string(index=False)}"
+
+
+def resolve_artifacts(response: agent_response, workspace: Workspace) -> agent_response:
+    """
+    Rewrites the artifact file names of a response to absolute paths in the run workspace.
+    """
+    def resolve(file_name):
+        try:
+            return str(workspace.resolve(file_name)) if file_name else file_name
+        except WorkspaceError:
+            return file_name
+
+    return response.model_copy(update={
+        "csv_path": resolve(response.csv_path),
+        "pdf_path": resolve(response.pdf_path),
+        "enso_route_file": resolve(response.enso_route_file),
+        "html_path": [resolve(p) for p in response.html_path],
+        "png_path": [resolve(p) for p in response.png_path],
+    })
 
-    return f"Routing information saved to {output_file}, \n the route is: {response.json()['route']}"
-    
 
 # Running the agent
-def run_agent(user_prompt: str):
-    logfire.configure(token=os.getenv("LOGFIRE_TOKEN"), scrubbing=False)
-    user_prompt = user_prompt
-    deps = agent_state(user_query=user_prompt)
-    result = agent.run_sync(user_prompt, deps=deps, model_settings=ModelSettings(temperature=0.5, timeout=300))
+async def arun_agent(user_prompt: str, use_cache: bool = True):
+    """
+    Runs the agent on the current event loop. Sessions share one loop, so
+    concurrent users do not each hold a thread while the tools wait on I/O.
+    """
+    # Similar recent questions are answered with the earlier report
+    if use_cache:
+        cached = answer_cache.lookup(user_prompt)
+        if cached is not None:
+            entry, similarity = cached
+            print(f"{entry.served_from_cache}, similarity {similarity:.2f} \n {answer_cache.report()}")
+            return agent_response(**{**entry.response, "served_from_cache": entry.served_from_cache})
+
+    workspace = create_workspace()
+    try:
+        deps = agent_state(user_query=user_prompt, workspace=workspace)
+        with timed("agent_run", mode="run"):
+            result = await agent.run(user_prompt, deps=deps, model_settings=ModelSettings(temperature=0.5, timeout=300))
+        response = resolve_artifacts(result.data, workspace)
+    finally:
+        release_workspace(workspace)
+    schedule_images(response.png_path)
 
-    return result.data
+    if use_cache:
+        answer_cache.put(user_prompt, response.model_dump(exclude={"served_from_cache"}))
+    return response
 
-    
+
+def run_agent(user_prompt: str, use_cache: bool = True):
+    """
+    Blocking entry point for sync callers, runs arun_agent on the shared event loop.
+    """
+    return run_coroutine(arun_agent(user_prompt, use_cache=use_cache))
+
+
+# Progress line shown in the chat while a tool runs
+TOOL_PROGRESS = {
+    "get_column_list": "reading dataset columns…",
+    "resolve_token": "resolving token…",
+    "query_local_index": "looking up pools and tokens…",
+    "query_liquidity_data": "querying subgraph…",
+    "query_liquidity_data_batch": "querying subgraph (batch)…",
+    "liquidity_metrics": "computing metrics…",
+    "price_impact": "simulating swaps over pool ticks…",
+    "metric_calculator": "computing metrics…",
+    "graph_generator": "drawing charts…",
+    "get_transaction_route": "fetching swap route…",
+    "get_route_size_table": "quoting swap sizes…",
+}
+
+
+@dataclass
+class agent_event:
+    """
+    One update of a streamed agent run.
+
+    kind is "progress" for tool calls, "report" for the markdown report written
+    so far and "result" for the final agent_response.
+    """
+    kind: str
+    text: str = ''
+    response: Optional[agent_response] = None
+
+
+async def stream_agent(user_prompt: str, use_cache: bool = True) -> AsyncIterator[agent_event]:
+    """
+    Runs the agent node by node, yielding tool progress as tools are called and the
+    markdown report as its tokens arrive, then the final agent_response.
+    """
+    if use_cache:
+        cached = answer_cache.lookup(user_prompt)
+        if cached is not None:
+            entry, _ = cached
+            response = agent_response(**{**entry.response, "served_from_cache": entry.served_from_cache})
+            yield agent_event(kind="result", text=entry.served_from_cache, response=response)
+            return
+
+    started = time.perf_counter()
+    first_output = None
+    workspace = create_workspace()
+    deps = agent_state(user_query=user_prompt, workspace=workspace)
+    yield agent_event(kind="progress", text="planning…")
+
+    try:
+        async with agent.iter(user_prompt, deps=deps, model_settings=ModelSettings(temperature=0.5, timeout=300)) as run:
+            async for node in run:
+                if Agent.is_call_tools_node(node):
+                    async with node.stream(run.ctx) as tool_events:
+                        async for event in tool_events:
+                            if isinstance(event, FunctionToolCallEvent):
+                                tool_name = event.part.tool_name
+                                yield agent_event(kind="progress", text=TOOL_PROGRESS.get(tool_name, f"running {tool_name}…"))
+                elif Agent.is_model_request_node(node):
+                    # Only the final response carries the report, tool call responses yield nothing here
+                    async with node.stream(run.ctx) as request_stream:
+                        async for partial in request_stream.stream_output(debounce_by=0.05):
+                            if partial.markdown_report:
+                                if first_output is None:
+                                    first_output = time.perf_counter() - started
+                                yield agent_event(kind="report", text=partial.markdown_report)
+        response = resolve_artifacts(run.result.data, workspace)
+    finally:
+        release_workspace(workspace)
+    schedule_images(response.png_path)
+
+    # Timed by hand, a span can not stay open across the yields of this generator
+    metrics.observe("agent_run_seconds", time.perf_counter() - started, mode="stream", outcome="ok")
+    if first_output is not None:
+        metrics.observe("first_report_output_seconds", first_output)
+    if use_cache:
+        answer_cache.put(user_prompt, response.model_dump(exclude={"served_from_cache"}))
+    yield agent_event(kind="result", response=response)
+
+
+def run_agent_events(user_prompt: str, on_event: Callable[[agent_event], None], use_cache: bool = True) -> agent_response:
+    """
+    Blocking run of stream_agent on the shared event loop for sync callers such as
+    the QueryRunner tool, handing every event to on_event. Returns the final agent_response.
+    """
+    async def consume():
+        response = None
+        async for event in stream_agent(user_prompt, use_cache=use_cache):
+            on_event(event)
+            if event.kind == "result":
+                response = event.response
+        return response
+
+    return run_coroutine(consume())
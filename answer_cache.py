@@ -0,0 +1,257 @@
+import os
+import re
+import json
+import math
+import time
+import threading
+from collections import Counter, deque
+from dataclasses import dataclass, asdict, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple, Union
+
+from chart_render import image_available
+
+
+ANSWER_CACHE_FILE = Path(os.getenv("ANSWER_CACHE_FILE", ".cache/answers.json"))
+# Seconds a report is served to similar questions, 0 disables the cache
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "900"))
+# Similarity between 0 and 1 a new question needs to reuse a report
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.8"))
+# Least recently used reports are dropped beyond this count
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "200"))
+# Similarities of the latest hits kept in the stats
+SIMILARITY_SAMPLES = 1000
+
+# Words that do not change the answer to a question
+FILLER_WORDS = {
+    "a", "an", "the", "of", "for", "in", "on", "and", "to", "is", "are", "what", "whats", "how", "me", "my",
+    "show", "give", "get", "tell", "with", "about", "please", "can", "you", "i", "want", "need", "do",
+    "analysis", "analyse", "analyze", "report", "detailed", "current", "now", "today", "info", "information",
+}
+# Variants reduced to one word so rephrasings compare equal
+WORD_FORMS = {
+    "daily": "day", "days": "day", "hourly": "hour", "hours": "hour", "weekly": "week", "weeks": "week",
+    "monthly": "month", "months": "month", "yearly": "year", "years": "year", "minutes": "minute",
+    "pools": "pool", "tokens": "token", "swaps": "swap", "trades": "swap", "trade": "swap",
+    "fees": "fee", "prices": "price", "volumes": "volume", "liquid": "liquidity",
+}
+
+# Token symbols, addresses and numbers, a cached report only answers questions naming the same ones
+_ANCHOR = re.compile(r"\b(?:0x[0-9a-fA-F]{6,}|[A-Z][A-Z0-9]{1,}|\d+(?:\.\d+)?%?)(?![\w])")
+# Periods of the data asked for, daily and hourly volume are different answers
+PERIOD_WORDS = {"minute", "hour", "day", "week", "month", "year"}
+
+
+def _words(text: str) -> List[str]:
+    words = re.findall(r"0x[0-9a-f]+|[a-z0-9.%]+", text.lower())
+    words = [WORD_FORMS.get(w.strip("."), w.strip(".")) for w in words]
+    return [w for w in words if w and w not in FILLER_WORDS]
+
+
+def _word_key(question: str) -> str:
+    return " ".join(sorted(set(_words(question))))
+
+
+def _anchors(question: str) -> List[str]:
+    # In order of appearance, "10 WETH to USDC" and "10 USDC to WETH" are different swaps
+    return list(dict.fromkeys(a.lower() for a in _ANCHOR.findall(question)))
+
+
+def _periods(question: str) -> List[str]:
+    return sorted(w for w in _words(question) if w in PERIOD_WORDS)
+
+
+def normalize_question(question: str) -> str:
+    """
+    Lower cases a question, drops filler words and sorts the rest so
+    "liquidity of PEPE" and "PEPE liquidity analysis" normalize alike. The
+    symbols, addresses and numbers follow in their order and then the periods.
+    """
+    return f"{_word_key(question)} | {' '.join(_anchors(question))} | {' '.join(_periods(question))}"
+
+
+def _trigrams(text: str) -> Counter:
+    padded = f"  {text} "
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def question_similarity(a: str, b: str) -> float:
+    """
+    Similarity between two questions from 0 to 1, the mean of the word overlap
+    and the character trigram cosine of their normalized forms. Questions that
+    do not name the same symbols, addresses and numbers in the same order, or
+    not the same periods, score 0.
+    """
+    if _anchors(a) != _anchors(b) or _periods(a) != _periods(b):
+        return 0.0
+    words_a, words_b = set(_words(a)), set(_words(b))
+    if not words_a or not words_b:
+        return 0.0
+    jaccard = len(words_a & words_b) / len(words_a | words_b)
+
+    grams_a, grams_b = _trigrams(_word_key(a)), _trigrams(_word_key(b))
+    dot = sum(count * grams_b[gram] for gram, count in grams_a.items())
+    norm = math.sqrt(sum(c * c for c in grams_a.values())) * math.sqrt(sum(c * c for c in grams_b.values()))
+    cosine = dot / norm if norm else 0.0
+    return (jaccard + cosine) / 2
+
+
+@dataclass
+class AnswerEntry:
+    question: str
+    normalized: str
+    response: Dict[str, Any]
+    created_at: float
+    last_used: float = 0.0
+    hits: int = 0
+
+    @property
+    def served_from_cache(self) -> str:
+        created = datetime.fromtimestamp(self.created_at).strftime("%Y-%m-%d %H:%M:%S")
+        return f"served from cache at {created} (originally asked: {self.question})"
+
+
+@dataclass
+class AnswerCacheStats:
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+    # Bounded, the stats live as long as the process
+    similarities: Deque[float] = field(default_factory=lambda: deque(maxlen=SIMILARITY_SAMPLES))
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def _artifacts_exist(response: Dict[str, Any]) -> bool:
+    # The PDF is only written when it is downloaded
+    paths = [response.get("csv_path"), response.get("enso_route_file")] + list(response.get("html_path") or [])
+    # PNGs are rendered on demand from their saved figure spec
+    images = list(response.get("png_path") or [])
+    return all(Path(p).exists() for p in paths if p) and all(image_available(p) for p in images if p)
+
+
+class AnswerCache:
+    """
+    Recent agent reports keyed by question, reused for questions similar enough
+    within the freshness window. Reports are kept in one JSON file so every
+    Streamlit session and worker shares them.
+
+    Args:
+        path (str): JSON file holding the cached reports
+        ttl (int): Seconds a report stays fresh, 0 disables the cache
+        threshold (float): Minimum question similarity for a hit
+        max_entries (int): Number of reports kept, least recently used are evicted first
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path] = ANSWER_CACHE_FILE,
+        ttl: int = ANSWER_CACHE_TTL,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+    ):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.stats = AnswerCacheStats()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def _load(self) -> List[AnswerEntry]:
+        try:
+            with self.path.open("r", encoding="utf-8") as f:
+                return [AnswerEntry(**entry) for entry in json.load(f)]
+        except (OSError, json.JSONDecodeError, TypeError):
+            return []
+
+    def _save(self, entries: List[AnswerEntry]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Per process and thread, several processes write the shared file
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump([asdict(entry) for entry in entries], f)
+        os.replace(tmp_path, self.path)
+
+    def _fresh(self, entries: List[AnswerEntry], now: float) -> List[AnswerEntry]:
+        # Reports whose files were cleaned up can not be served anymore
+        return [
+            entry for entry in entries
+            if now - entry.created_at <= self.ttl
+            and _artifacts_exist(entry.response)
+        ]
+
+    def lookup(self, question: str) -> Optional[Tuple[AnswerEntry, float]]:
+        """
+        Returns the most similar fresh report and its similarity, None on a miss.
+        """
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entries = self._fresh(self._load(), now)
+            best, best_score = None, 0.0
+            for entry in entries:
+                score = 1.0 if entry.normalized == normalize_question(question) else question_similarity(question, entry.question)
+                if score > best_score:
+                    best, best_score = entry, score
+
+            if best is None or best_score < self.threshold:
+                self.stats.misses += 1
+                return None
+
+            best.last_used = now
+            best.hits += 1
+            self._save(entries)
+            self.stats.hits += 1
+            self.stats.similarities.append(best_score)
+            return best, best_score
+
+    def put(self, question: str, response: Dict[str, Any]) -> Optional[AnswerEntry]:
+        """
+        Stores the report of a question, replacing an earlier report of the same question.
+        """
+        if not self.enabled:
+            return None
+        now = time.time()
+        normalized = normalize_question(question)
+        entry = AnswerEntry(question=question, normalized=normalized, response=response, created_at=now, last_used=now)
+        with self._lock:
+            entries = [e for e in self._fresh(self._load(), now) if e.normalized != normalized]
+            entries.append(entry)
+            if len(entries) > self.max_entries:
+                entries.sort(key=lambda e: e.last_used, reverse=True)
+                self.stats.evictions += len(entries) - self.max_entries
+                entries = entries[:self.max_entries]
+            try:
+                self._save(entries)
+            except OSError as e:
+                print(f"Could not cache answer: {e}")
+                return None
+            self.stats.stores += 1
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            try:
+                self.path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def report(self) -> str:
+        s = self.stats
+        return (
+            f"answer cache hits: {s.hits}, misses: {s.misses}, stores: {s.stores}, "
+            f"evictions: {s.evictions}, hit rate: {s.hit_rate:.0%}"
+        )
+
+
+answer_cache = AnswerCache()
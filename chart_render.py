@@ -0,0 +1,239 @@
+import os
+import time
+import queue
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from code_sandbox import SandboxPool
+from run_workspace import WorkspaceError, workspace_of
+
+
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", "2"))
+CHART_TIMEOUT = float(os.getenv("CHART_TIMEOUT", "120"))
+CHART_CPU_SECONDS = int(os.getenv("CHART_CPU_SECONDS", "120"))
+# The renderer browser reserves a large address space, so no memory limit by default
+CHART_MEMORY_MB = int(os.getenv("CHART_MEMORY_MB", "0"))
+# Render the PNGs of finished runs in the background while chart workers are idle
+CHART_BACKGROUND_RENDER = os.getenv("CHART_BACKGROUND_RENDER", "1").lower() not in ("0", "false", "no")
+
+SPEC_SUFFIX = ".plotly.json"
+
+
+def spec_path(image_path: Union[str, Path]) -> Path:
+    """
+    Returns the figure spec saved in place of an image, chart.png -> chart.plotly.json
+    """
+    return Path(image_path).with_suffix(SPEC_SUFFIX)
+
+
+def image_available(image_path: Union[str, Path]) -> bool:
+    return Path(image_path).exists() or spec_path(image_path).exists()
+
+
+# ---- worker process side ----
+
+# pio.write_image as plotly defines it, before capture_images replaces it
+_write_image = None
+
+
+def warm_up() -> None:
+    """
+    Imports plotly and starts the Kaleido renderer once per worker, the first
+    static export is what launches the headless browser.
+    """
+    import plotly.express  # noqa: F401
+    import plotly.graph_objects as go
+    import plotly.io as pio
+
+    global _write_image
+    _write_image = pio.write_image
+    try:
+        import kaleido
+        # Kaleido 1.x keeps one browser for all exports only with a running sync server
+        if hasattr(kaleido, "start_sync_server"):
+            kaleido.start_sync_server(silence_warnings=True)
+        pio.to_image(go.Figure(), format="png", width=10, height=10)
+    except Exception as e:
+        print(f"Chart renderer warm up failed, images render cold: {e}")
+
+
+def chart_namespace() -> dict:
+    import plotly.express as px
+    import plotly.graph_objects as go
+    import plotly.io as pio
+
+    return {"px": px, "go": go, "pio": pio, "render_specs": render_specs}
+
+
+@contextmanager
+def capture_images():
+    """
+    Collects the static image exports of the code instead of rendering them,
+    save_specs stores the figures so the images are rendered only when needed.
+    """
+    import plotly.io as pio
+    from plotly.basedatatypes import BaseFigure
+
+    pending: List[Tuple[object, str, dict]] = []
+    original_method = BaseFigure.write_image
+    original_function = pio.write_image
+
+    def record(fig, file, *args, **kwargs):
+        kwargs.update(zip(("format", "scale", "width", "height"), args))
+        pending.append((fig, os.path.abspath(str(file)), kwargs))
+
+    BaseFigure.write_image = record
+    pio.write_image = record
+    try:
+        yield pending
+    finally:
+        BaseFigure.write_image = original_method
+        pio.write_image = original_function
+
+
+def save_specs(pending: List[Tuple[object, str, dict]]) -> List[str]:
+    """
+    Saves the figure spec of each collected image next to the image path.
+    """
+    import plotly.io as pio
+
+    lines = []
+    for fig, path, kwargs in pending:
+        pio.write_json(fig, str(spec_path(path)))
+        lines.append(f"{os.path.basename(path)}: saved, rendered on demand")
+    return lines
+
+
+def render_specs(image_paths: List[str]) -> List[str]:
+    """
+    Renders the images of saved figure specs in one pass on the warm renderer
+    and reports the time of each.
+    """
+    import plotly.io as pio
+
+    lines = []
+    for path in image_paths:
+        started = time.perf_counter()
+        try:
+            fig = pio.read_json(str(spec_path(path)))
+            # Written under a temporary name so readers never see half an image
+            tmp_path = f"{path}.tmp"
+            (_write_image or pio.write_image)(fig, tmp_path, format=Path(path).suffix.lstrip(".") or "png")
+            os.replace(tmp_path, path)
+            lines.append(f"{os.path.basename(path)}: {time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            lines.append(f"{os.path.basename(path)}: failed, {e!r}")
+    return lines
+
+
+# ---- parent side ----
+
+chart_pool = SandboxPool(
+    size=CHART_WORKERS,
+    timeout=CHART_TIMEOUT,
+    cpu_seconds=CHART_CPU_SECONDS,
+    memory_mb=CHART_MEMORY_MB,
+    kind="charts",
+)
+
+# Lock of each image being rendered and the number of callers using it
+_render_locks: Dict[str, List] = {}
+_render_locks_guard = threading.Lock()
+
+
+def _render_batch(directory: str, image_paths: List[str]) -> None:
+    # Rendered images count against the quota of their run workspace like every other artifact
+    workspace = workspace_of(directory)
+    max_file_bytes = 0
+    if workspace is not None:
+        try:
+            workspace.ensure_quota()
+        except WorkspaceError as e:
+            print(f"Images not rendered: {e}")
+            return
+        max_file_bytes = workspace.remaining_bytes()
+    code = f"print('\\n'.join(render_specs({image_paths!r})))"
+    # Package code, the renderer may start its browser, so it runs outside the sandbox confinement
+    print(chart_pool.run(code, directory, max_file_bytes=max_file_bytes, confined=False))
+    if workspace is not None:
+        try:
+            workspace.ensure_quota()
+        except WorkspaceError as e:
+            print(f"Images rendered past the workspace quota: {e}")
+
+
+def ensure_images(image_paths: Iterable[str]) -> List[str]:
+    """
+    Renders the images that only have a saved spec, in one batch per directory
+    on a chart worker, and returns the paths that exist afterwards. Rendered
+    images stay next to their spec, so each is rendered at most once. Images of
+    a workspace over its quota are not rendered.
+    """
+    image_paths = [str(p) for p in image_paths if p]
+    # Deduplicated, a path listed twice would wait for its own lock
+    missing = list(dict.fromkeys(p for p in image_paths if not Path(p).exists() and spec_path(p).exists()))
+    if missing:
+        with _render_locks_guard:
+            locks = []
+            for p in missing:
+                entry = _render_locks.setdefault(p, [threading.Lock(), 0])
+                entry[1] += 1
+                locks.append(entry[0])
+        for lock in locks:
+            lock.acquire()
+        try:
+            batches: Dict[str, List[str]] = {}
+            for p in missing:
+                if not Path(p).exists():
+                    batches.setdefault(str(Path(p).parent), []).append(p)
+            for directory, batch in batches.items():
+                _render_batch(directory, batch)
+        finally:
+            for lock in locks:
+                lock.release()
+            # The last caller of a path drops its lock, so the dict only holds renders in progress
+            with _render_locks_guard:
+                for p in missing:
+                    entry = _render_locks[p]
+                    entry[1] -= 1
+                    if entry[1] == 0:
+                        del _render_locks[p]
+    return [p for p in image_paths if Path(p).exists()]
+
+
+def ensure_image(image_path: str) -> Optional[str]:
+    rendered = ensure_images([image_path])
+    return rendered[0] if rendered else None
+
+
+_background: "queue.Queue[List[str]]" = queue.Queue()
+_background_thread: Optional[threading.Thread] = None
+
+
+def _render_in_background() -> None:
+    while True:
+        image_paths = _background.get()
+        # Low priority, chart calls of running agents go first
+        while chart_pool.idle_workers == 0:
+            time.sleep(1)
+        try:
+            ensure_images(image_paths)
+        except Exception as e:
+            print(f"Background chart rendering failed: {e}")
+
+
+def schedule_images(image_paths: Iterable[str]) -> None:
+    """
+    Queues the images of a finished run for rendering while chart workers are idle.
+    """
+    global _background_thread
+    image_paths = [str(p) for p in image_paths if p]
+    if not CHART_BACKGROUND_RENDER or not image_paths:
+        return
+    with _render_locks_guard:
+        if _background_thread is None:
+            _background_thread = threading.Thread(target=_render_in_background, name="chart-renderer", daemon=True)
+            _background_thread.start()
+    _background.put(image_paths)
@@ -5,8 +5,8 @@ import base64
 from PIL import Image
 import os
 from agent_module import run_agent, agent_response
-import asyncio
-import nest_asyncio
+from agent_jobs import agent_jobs, JobStatus, QueueFullError
+import time
 import uuid
 import re
 from datetime import datetime
@@ -26,6 +26,8 @@ from pydantic import BaseModel, Field
 from portia.tool import Tool, ToolRunContext
 from portia import InMemoryToolRegistry
 from tool_lib import QueryRunner
+from chart_render import ensure_images
+from instrumentation import metrics, timed
 import json
 import ast
 pio.templates["custom"] = pio.templates["seaborn"]
@@ -33,8 +35,10 @@ pio.templates.default = "custom"
 pio.templates["custom"].layout.autosize = True
 
 
-# Apply nest_asyncio to allow nested event loops
-nest_asyncio.apply()
+# Show tool progress and the report while the agent runs, set STREAM_AGENT_OUTPUT=0 to wait for the full response
+STREAM_AGENT_OUTPUT = os.getenv("STREAM_AGENT_OUTPUT", "1").lower() not in ("0", "false", "no")
+# Seconds between refreshes of a page waiting on agent jobs
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))
 
 # Initialize session state
 if "file_hashes" not in st.session_state:
@@ -70,7 +74,8 @@ def convert_to_agent_response(json_str: str) -> agent_response:
         png_path=response_dict['png_path'],
         pdf_path=response_dict['pdf_path'],
         enso_route=response_dict['enso_route'],
-        enso_route_file=response_dict['enso_route_file']
+        enso_route_file=response_dict['enso_route_file'],
+        served_from_cache=response_dict.get('served_from_cache', '')
     )
 
 @st.cache_data
@@ -102,7 +107,8 @@ def get_resized_base64_image_src(img_path, max_width=1000, max_height=800):
 
 @st.cache_data
 def write_markdown_to_file(content: Annotated[str, "The markdown content to write"], 
-                        filename: Annotated[str, "The name of the file (with or without .md extension)"] = "blog.md") -> str:
+                        filename: Annotated[str, "The name of the file (with or without .md extension)"] = "blog.md",
+                        image_paths: Tuple[str, ...] = ()) -> str:
     """
     Write markdown content to a file with .md extension and create PDF with appended images.
     Uses Streamlit caching to prevent redundant file operations.
@@ -114,14 +120,19 @@ def write_markdown_to_file(content: Annotated[str, "The markdown content to writ
 
 
 
+        # Charts are appended to the PDF, rendered from their specs on first export
+        if image_paths:
+            content += "\n\n## Charts\n\n" + "\n\n".join(f"![]({path})" for path in image_paths)
+
         # Write markdown content
         with open(md_filename, 'w', encoding='utf-8') as f:
             f.write(content)
         
         # Create PDF
-        pdf = MarkdownPdf()
-        pdf.add_section(Section(content, toc=False))
-        pdf.save(pdf_filename)
+        with timed("pdf_generation", images=len(image_paths)):
+            pdf = MarkdownPdf()
+            pdf.add_section(Section(content, toc=False))
+            pdf.save(pdf_filename)
         
         return f"File {filename} has been created successfully."
         
@@ -188,10 +199,10 @@ def st_fixed_container(
         return st.container(height=height, border=border)
 
 
-def download_button(object_to_download, download_filename, button_text):
+def download_button(object_to_download, download_filename, button_text, image_paths=()):
 
     with st.spinner("Generating PDF..."):
-        write_markdown_to_file(object_to_download, download_filename)
+        write_markdown_to_file(object_to_download, download_filename, tuple(ensure_images(image_paths)))
 
     with open(download_filename.replace("assets", ""), "rb") as pdf_file:
         pdf_bytes = pdf_file.read()
@@ -249,20 +260,10 @@ def load_pdf_as_base64(pdf_path):
         return None
 
 
-# Create a new event loop for async operations
+# The agent runs on the shared event loop of the process, no loop per request
 def get_agent_response(user_query):
     try:
-        # Create a new event loop
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        # Run the agent in the new event loop
-        response = run_agent(user_query)
-        
-        # Close the loop
-        loop.close()
-        
-        return response
+        return run_agent(user_query)
     except Exception as e:
         st.error(f"Error in agent response: {str(e)}")
         return None
@@ -561,6 +562,75 @@ def get_base64_encoded_image(image_path):
     with open(image_path, "rb") as image_file:
         return base64.b64encode(image_file.read()).decode()
 
+def add_to_history(user_query, response):
+    """Validates the metrics of a response and adds it to the chat history."""
+    # Validate metrics_dict before adding to history
+    if hasattr(response, 'metrics_dict'):
+        try:
+            # Test parsing of metrics_dict
+            if isinstance(response.metrics_dict, str):
+                json.loads(response.metrics_dict.replace("'", '"'))
+        except json.JSONDecodeError as e:
+            st.warning(f"Invalid metrics format in response: {str(e)}")
+            response.metrics_dict = "{}"  # Set empty metrics if invalid
+    else:
+        st.warning("Response missing metrics_dict attribute")
+        response.metrics_dict = "{}"
+
+    # Add to chat history (new messages at the beginning)
+    st.session_state.chat_history.insert(0, {
+        "query": user_query,
+        "response": response,
+        "timestamp": datetime.now().isoformat()  # Add timestamp for unique keys
+    })
+
+def run_portia_plan(job):
+    """
+    Answers a chat query with a Portia plan run. The QueryRunner tool hands the
+    progress and partial report of the agent to the job as they arrive.
+    """
+    tool_registry = InMemoryToolRegistry.from_local_tools([QueryRunner(on_event=job.record)])
+    plan_run = Portia(tools=tool_registry).run(job.query)
+    return convert_to_agent_response(plan_run.model_dump_json(indent=2))
+
+def render_pending_jobs(stream_output=True):
+    """
+    Shows the progress of this session's queued and running jobs and moves
+    finished ones to the chat history. Returns True when the history changed.
+    With stream_output off a running job only shows a spinner until its response is ready.
+    """
+    changed = False
+    for job_id in list(st.session_state.pending_jobs):
+        job = agent_jobs.get(job_id)
+        if job is None or job.done:
+            st.session_state.pending_jobs.remove(job_id)
+            changed = True
+            if job is None or job.status == JobStatus.CANCELLED:
+                continue
+            if job.response is not None:
+                add_to_history(job.query, job.response)
+            else:
+                st.error(f"Error processing query: {job.error}")
+            continue
+
+        with st.chat_message("user"):
+            st.write(job.query)
+        with st.chat_message("assistant"):
+            if job.status == JobStatus.QUEUED:
+                label = f"Queued, {agent_jobs.position(job_id)} queries ahead"
+            elif not stream_output:
+                label = f"Processing response for: {job.query}..."
+            else:
+                label = job.progress[-1] if job.progress else "Working on it…"
+            with st.status(label, expanded=False):
+                for line in job.progress if stream_output else ():
+                    st.write(line)
+            if stream_output and job.report:
+                st.markdown(job.report)
+            if st.button("Cancel", key=f"cancel_{job_id}"):
+                agent_jobs.cancel(job_id)
+    return changed
+
 def main():
     # Set page configuration and styling
     set_page_config()
@@ -599,11 +669,6 @@ def main():
     st.title("Pool-Sweeper")
     st.write("Welcome to the Pool-Sweeper - Agent for Liquidity Analysis")
     
-    custom_tool_registry = InMemoryToolRegistry.from_local_tools(
-    [
-        QueryRunner()
-    ])
-
     with st_fixed_container(mode="fixed", position="bottom"):
         st.markdown("""
         <style> 
@@ -642,42 +707,24 @@ def main():
 
 
 
+    stream_output = st.sidebar.toggle("Stream agent output", value=STREAM_AGENT_OUTPUT)
+
+    if "pending_jobs" not in st.session_state:
+        st.session_state.pending_jobs = []
+
     if user_query:
-        # Show spinner while processing
-        with st.spinner(f"Processing response for: {user_query}..."):
-            try:
-                # Get response from agent
-                portia = Portia(tools=custom_tool_registry)
-                plan_run = portia.run(user_query)
-                output = plan_run.model_dump_json(indent=2)
-                response = convert_to_agent_response(output)
-                
-                if response:
-                    # Validate metrics_dict before adding to history
-                    if hasattr(response, 'metrics_dict'):
-                        try:
-                            # Test parsing of metrics_dict
-                            if isinstance(response.metrics_dict, str):
-                                json.loads(response.metrics_dict.replace("'", '"'))
-                        except json.JSONDecodeError as e:
-                            st.warning(f"Invalid metrics format in response: {str(e)}")
-                            response.metrics_dict = "{}"  # Set empty metrics if invalid
-                    else:
-                        st.warning("Response missing metrics_dict attribute")
-                        response.metrics_dict = "{}"
-
-                    # Add to chat history (new messages at the beginning)
-                    st.session_state.chat_history.insert(0, {
-                        "query": user_query,
-                        "response": response,
-                        "timestamp": datetime.now().isoformat()  # Add timestamp for unique keys
-                    })
-                    # Trigger rerun to update the UI
-                    st.rerun()
-            except Exception as e:
-                st.error(f"Error processing query: {str(e)}")
+        # Every query goes through the bounded job queue, the page polls it below
+        try:
+            st.session_state.pending_jobs.append(agent_jobs.submit(user_query, runner=run_portia_plan))
+        except QueueFullError as e:
+            st.error(str(e))
+
+    # Jobs still running show their progress and the report written so far
+    if render_pending_jobs(stream_output):
+        st.rerun()
 
     # Display chat history
+    render_started = time.perf_counter()
     for idx, chat in enumerate(st.session_state.chat_history):
         # User message
         with st.chat_message("user"):
@@ -686,6 +733,10 @@ def main():
         # Assistant response
         with st.chat_message("assistant"):
             try:
+                # Reports reused from a similar earlier question are flagged
+                if getattr(chat["response"], "served_from_cache", ""):
+                    st.info(chat["response"].served_from_cache)
+
                 # Create two columns: one for content, one for document preview
                 # Display markdown report with unique key
                 st.markdown(
@@ -699,6 +750,7 @@ def main():
                                     chat["response"].markdown_report,
                                     chat["response"].pdf_path,
                                     "Download Report PDF",
+                                    chat["response"].png_path,
                                 ),
                         unsafe_allow_html=True
                     )
@@ -727,7 +779,7 @@ def main():
                 st.markdown("\n\n")
                 # Display document preview with error handling
                 st.subheader("Data Preview")
-                if chat["response"].html_path:
+                if chat["response"].html_path or chat["response"].png_path:
                     try:
                         
                         if chat["response"].html_path:
@@ -762,11 +814,12 @@ def main():
                                 except Exception as e:
                                     st.info(f"Error displaying HTML file: {str(e)}")
                                     if chat["response"].png_path:
-                                        for png_path in chat["response"].png_path:
+                                        for png_path in ensure_images(chat["response"].png_path):
                                             image_paths = png_path
                                             st.image(image_paths)
                         elif chat["response"].png_path:
-                            image_paths = chat["response"].png_path
+                            # PNGs are rendered from their figure specs on first display
+                            image_paths = ensure_images(chat["response"].png_path)
                             try:
                                 st.image(image_paths)
                             except Exception as e:
@@ -789,6 +842,12 @@ def main():
 
     # Display footer at the end
     st.markdown(footer_html, unsafe_allow_html=True)
+    metrics.observe("streamlit_render_seconds", time.perf_counter() - render_started, view="chat_history")
+
+    # Keep polling while this session has jobs in flight
+    if st.session_state.pending_jobs:
+        time.sleep(JOB_POLL_INTERVAL)
+        st.rerun()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,425 @@
+import os
+import sys
+import errno
+import site
+import time
+import signal
+import builtins
+import sysconfig
+import threading
+import traceback
+import multiprocessing
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", "2"))
+# Wall clock seconds per call before the worker is killed
+SANDBOX_TIMEOUT = float(os.getenv("SANDBOX_TIMEOUT", "60"))
+SANDBOX_CPU_SECONDS = int(os.getenv("SANDBOX_CPU_SECONDS", "60"))
+SANDBOX_MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", "4096"))
+# Datasets up to this size are loaded into the worker before the code runs
+SANDBOX_PRELOAD_MAX_BYTES = int(os.getenv("SANDBOX_PRELOAD_MAX_BYTES", str(256 * 1024 * 1024)))
+# Longer outputs are cut so one call can not flood the model context
+MAX_OUTPUT_CHARS = 20000
+
+# Modules the sandboxed code may import, os, sys, subprocess and friends are not among them
+SANDBOX_IMPORTS = frozenset({
+    "math", "cmath", "statistics", "random", "datetime", "time", "calendar", "json", "re", "string", "textwrap",
+    "decimal", "fractions", "collections", "itertools", "functools", "operator", "dataclasses", "typing",
+    "numpy", "pandas", "tabulate", "plotly", "scipy",
+})
+# Builtins taken away from the sandboxed code
+BLOCKED_BUILTINS = ("exec", "eval", "compile", "input", "breakpoint", "exit", "quit", "help", "globals", "vars")
+# Audit events refused while sandboxed code runs
+BLOCKED_EVENTS = frozenset({
+    "os.system", "os.exec", "os.posix_spawn", "os.spawn", "os.fork", "os.forkpty", "os.kill", "os.killpg",
+    "subprocess.Popen", "socket.connect", "socket.bind", "ctypes.dlopen", "os.chdir", "os.putenv", "os.unsetenv",
+    "resource.setrlimit", "resource.prlimit", "sys.addaudithook",
+})
+# Audit events taking paths, allowed inside the run workspace
+PATH_EVENTS = frozenset({
+    "os.remove", "os.rmdir", "os.rename", "os.mkdir", "os.truncate", "os.chmod", "os.chown", "os.symlink",
+    "os.link", "os.utime", "os.listdir", "os.scandir", "shutil.rmtree", "shutil.copyfile", "shutil.move",
+})
+
+
+# ---- worker process side ----
+
+class _DatasetCache:
+    """
+    DataFrames of a worker keyed by path and modification time, so every call
+    of a run reuses the datasets loaded by the previous ones.
+    """
+
+    def __init__(self):
+        self.frames: Dict[str, Tuple[float, object]] = {}
+
+    def load(self, path: Path):
+        import pandas as pd
+
+        mtime = path.stat().st_mtime
+        cached = self.frames.get(str(path))
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        if path.suffix.lower() == ".parquet":
+            df = pd.read_parquet(path)
+        else:
+            df = pd.read_csv(path)
+        self.frames[str(path)] = (mtime, df)
+        return df
+
+    def preload(self, workspace: Path) -> Dict[str, object]:
+        datasets = {}
+        for path in sorted(workspace.glob("*.parquet")):
+            if path.stat().st_size <= SANDBOX_PRELOAD_MAX_BYTES:
+                # Copy-on-write, the code can not change the cached frame
+                datasets[path.stem] = self.load(path).copy(deep=False)
+        return datasets
+
+    def forget_other_workspaces(self, workspace: Path) -> None:
+        for key in [k for k in self.frames if Path(k).parent != workspace]:
+            del self.frames[key]
+
+
+def _limit_cpu(cpu_seconds: int) -> None:
+    if resource is None:
+        return
+    # RLIMIT_CPU counts the whole life of the process, so the budget starts at its current usage
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = int(usage.ru_utime + usage.ru_stime) + cpu_seconds
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+# Workspace and read only directories of the code running now, None outside sandboxed code
+_confinement: Optional[Tuple[Path, Tuple[Path, ...]]] = None
+
+
+def _inside(path, roots: Tuple[Path, ...]) -> bool:
+    try:
+        resolved = Path(os.fsdecode(path)).resolve()
+    except (TypeError, ValueError, OSError):
+        return False
+    return any(resolved == root or root in resolved.parents for root in roots)
+
+
+def _audit(event: str, args: tuple) -> None:
+    """
+    Audit hook of the worker process. While sandboxed code runs, files are only
+    written inside the run workspace and only read from it and the Python
+    installation (lazy imports), and processes, sockets and native libraries
+    are refused. Hooks can not be removed, so this holds for every module the
+    code reaches, not only for the names in its namespace.
+    """
+    if _confinement is None:
+        return
+    workspace, readable = _confinement
+    if event in BLOCKED_EVENTS:
+        raise PermissionError(f"{event} is not allowed in the sandbox")
+    if event == "open":
+        path, mode, flags = args
+        if path is None or isinstance(path, int):
+            return
+        writing = any(c in (mode or "") for c in "wax+") or bool(
+            (flags or 0) & (os.O_WRONLY | os.O_RDWR | os.O_CREAT | os.O_APPEND | os.O_TRUNC)
+        )
+        if not _inside(path, (workspace,) if writing else (workspace,) + readable):
+            raise PermissionError(f"{path} is outside the run workspace, use plain file names")
+    elif event in PATH_EVENTS:
+        for path in args[:2] if event in ("os.rename", "os.symlink", "os.link", "shutil.copyfile", "shutil.move") else args[:1]:
+            if isinstance(path, (str, bytes, os.PathLike)) and not _inside(path, (workspace,)):
+                raise PermissionError(f"{path} is outside the run workspace, use plain file names")
+
+
+def _readable_roots() -> Tuple[Path, ...]:
+    paths = {sys.prefix, sys.base_prefix, sys.exec_prefix, "/usr/share/zoneinfo", os.devnull}
+    paths.update(v for k, v in sysconfig.get_paths().items() if k in ("stdlib", "platstdlib", "purelib", "platlib"))
+    try:
+        paths.update(site.getsitepackages())
+    except AttributeError:
+        pass
+    return tuple(Path(p).resolve() for p in paths if p)
+
+
+def _sandbox_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level or name.split(".")[0] not in SANDBOX_IMPORTS:
+        raise ImportError(
+            f"import of {name} is not allowed in the sandbox, the working directory is the run workspace, use plain file names"
+        )
+    return builtins.__import__(name, globals, locals, fromlist, level)
+
+
+def _sandbox_builtins() -> dict:
+    safe = {k: v for k, v in vars(builtins).items() if k not in BLOCKED_BUILTINS}
+    safe["__import__"] = _sandbox_import
+    return safe
+
+
+def _limit_file_size(max_bytes: int) -> None:
+    # A write past the remaining workspace quota fails with EFBIG instead of filling the disk
+    if resource is None:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_FSIZE)
+    soft = max(0, max_bytes) if max_bytes else resource.RLIM_INFINITY
+    if hard != resource.RLIM_INFINITY and (soft == resource.RLIM_INFINITY or soft > hard):
+        soft = hard
+    resource.setrlimit(resource.RLIMIT_FSIZE, (soft, hard))
+
+
+def _execute(
+    code: str, workspace: Path, cpu_seconds: int, cache: _DatasetCache, kind: str, confined: bool = True, max_file_bytes: int = 0
+) -> Tuple[bool, str]:
+    global _confinement
+    import numpy as np
+    import pandas as pd
+    from tabulate import tabulate
+
+    cache.forget_other_workspaces(workspace)
+    os.chdir(workspace)
+
+    def load_dataset(file_name, columns=None):
+        df = cache.load((workspace / file_name).resolve())
+        return df[columns] if columns else df.copy(deep=False)
+
+    namespace = {
+        "__name__": "__main__",
+        "pd": pd,
+        "np": np,
+        "tabulate": tabulate,
+        "WORKSPACE": str(workspace),
+        "load_dataset": load_dataset,
+        "datasets": cache.preload(workspace),
+    }
+    if confined:
+        namespace["__builtins__"] = _sandbox_builtins()
+    catcher = StringIO()
+    _limit_cpu(cpu_seconds)
+    _limit_file_size(max_file_bytes)
+    try:
+        if confined:
+            _confinement = (workspace.resolve(), _readable_roots())
+        if kind == "charts":
+            import chart_render
+
+            namespace.update(chart_render.chart_namespace())
+            with redirect_stdout(catcher), chart_render.capture_images() as pending:
+                exec(code, namespace)
+            # Images are kept as figure specs and rendered when first needed
+            saved = chart_render.save_specs(pending)
+            if saved:
+                catcher.write("images: " + ", ".join(saved) + "\n")
+        else:
+            with redirect_stdout(catcher):
+                exec(code, namespace)
+        return True, catcher.getvalue()
+    except MemoryError:
+        return False, "Failed to run code. Error: memory limit of the sandbox exceeded, load fewer columns or rows"
+    except BaseException as e:
+        trace = traceback.format_exception_only(type(e), e)
+        if isinstance(e, OSError) and e.errno == errno.EFBIG:
+            trace = ["OSError: file too large, the run workspace quota is used up"]
+        return False, f"Failed to run code. Error: {''.join(trace).strip()}"
+    finally:
+        _confinement = None
+        _limit_file_size(0)
+
+
+def _worker_main(conn, memory_mb: int, kind: str) -> None:
+    # Imported once per worker, not once per call
+    import numpy  # noqa: F401
+    import pandas  # noqa: F401
+    import pyarrow.parquet  # noqa: F401
+    import tabulate  # noqa: F401
+
+    if kind == "charts":
+        import chart_render
+
+        chart_render.warm_up()
+
+    if resource is not None and memory_mb > 0:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if hasattr(signal, "SIGXFSZ"):
+        # Writes past the file size limit raise OSError instead of killing the worker
+        signal.signal(signal.SIGXFSZ, signal.SIG_IGN)
+    sys.addaudithook(_audit)
+
+    cache = _DatasetCache()
+    conn.send("ready")
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if message is None:
+            return
+        code, workspace, cpu_seconds, confined, max_file_bytes = message
+        started = time.perf_counter()
+        ok, output = _execute(code, Path(workspace), cpu_seconds, cache, kind, confined, max_file_bytes)
+        conn.send((ok, output, time.perf_counter() - started))
+
+
+# ---- parent side ----
+
+class SandboxWorker:
+    """
+    One warm worker process and the pipe to it.
+    """
+
+    def __init__(self, context, memory_mb: int, kind: str):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child_conn, memory_mb, kind), name=f"{kind}-sandbox", daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.workspace: Optional[str] = None
+
+    def wait_ready(self, timeout: float) -> None:
+        if not self.ready and self.conn.poll(timeout):
+            self.ready = self.conn.recv() == "ready"
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class SandboxPool:
+    """
+    Pool of pre-warmed worker processes running model written analysis code.
+    pandas and numpy are imported once per worker, the datasets of the run are
+    preloaded into the code namespace and stay loaded between calls, and each
+    call is bound by CPU time, memory and wall clock limits. A worker that hits
+    a limit is killed and replaced without affecting other runs.
+
+    The code gets restricted builtins and imports, and an audit hook keeps its
+    file access inside the run workspace and refuses processes and sockets.
+    This guards against model code wandering off, it is not a boundary against
+    deliberately hostile code.
+
+    Args:
+        size (int): Number of worker processes
+        timeout (float): Wall clock seconds per call
+        cpu_seconds (int): CPU seconds per call
+        memory_mb (int): Address space limit of each worker, 0 for none
+        kind (str): "metrics" for analysis code, "charts" for plotly code whose
+            static image exports are batched on a resident Kaleido renderer
+    """
+
+    def __init__(
+        self,
+        size: int = SANDBOX_WORKERS,
+        timeout: float = SANDBOX_TIMEOUT,
+        cpu_seconds: int = SANDBOX_CPU_SECONDS,
+        memory_mb: int = SANDBOX_MEMORY_MB,
+        kind: str = "metrics",
+    ):
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.kind = kind
+        # Spawned workers do not inherit the threads and sockets of the server
+        self._context = multiprocessing.get_context("spawn")
+        self._idle: List[SandboxWorker] = []
+        self._started = False
+        self._condition = threading.Condition()
+
+    def start(self) -> None:
+        with self._condition:
+            if self._started:
+                return
+            self._idle = [SandboxWorker(self._context, self.memory_mb, self.kind) for _ in range(self.size)]
+            self._started = True
+
+    @property
+    def idle_workers(self) -> int:
+        return len(self._idle) if self._started else self.size
+
+    def _acquire(self, workspace: str) -> SandboxWorker:
+        self.start()
+        with self._condition:
+            while not self._idle:
+                self._condition.wait()
+            # A worker that already holds the datasets of this run is preferred
+            worker = next((w for w in self._idle if w.workspace == workspace), self._idle[0])
+            self._idle.remove(worker)
+            return worker
+
+    def _release(self, worker: SandboxWorker, healthy: bool) -> None:
+        if not healthy:
+            worker.kill()
+            worker = SandboxWorker(self._context, self.memory_mb, self.kind)
+        with self._condition:
+            self._idle.append(worker)
+            self._condition.notify()
+
+    def run(
+        self, code: str, workspace: str, timeout: Optional[float] = None, max_file_bytes: int = 0, confined: bool = True
+    ) -> str:
+        """
+        Runs code in a worker with the run workspace as working directory.
+
+        Args:
+            code (str): The python code
+            workspace (str): The run workspace, the only directory the code may write to
+            timeout (float): Wall clock seconds, the pool timeout by default
+            max_file_bytes (int): Largest file the code may write, the remaining workspace quota. 0 for no limit
+            confined (bool): False only for code of this package, e.g. the PNG rendering of saved charts
+
+        Returns:
+            str: The printed output, or the error prefixed with "Failed to run code."
+        """
+        timeout = timeout or self.timeout
+        worker = self._acquire(workspace)
+        healthy = False
+        try:
+            worker.wait_ready(timeout)
+            worker.conn.send((code, workspace, self.cpu_seconds, confined, max_file_bytes))
+            if not worker.conn.poll(timeout):
+                return f"Failed to run code. Error: timed out after {timeout:.0f}s and was stopped"
+            try:
+                ok, output, elapsed = worker.conn.recv()
+            except EOFError:
+                # Killed by the CPU or memory limit
+                return (
+                    "Failed to run code. Error: the worker was stopped, it exceeded "
+                    f"{self.cpu_seconds}s of CPU time or {self.memory_mb}MB of memory"
+                )
+            healthy = True
+            worker.workspace = workspace
+            print(f"{self.kind} code ran in {elapsed:.2f}s")
+            if len(output) > MAX_OUTPUT_CHARS:
+                output = output[:MAX_OUTPUT_CHARS] + f"\n... output cut at {MAX_OUTPUT_CHARS} characters"
+            return output
+        except (OSError, EOFError) as e:
+            return f"Failed to run code. Error: {e!r}"
+        finally:
+            self._release(worker, healthy)
+
+    def close(self) -> None:
+        with self._condition:
+            for worker in self._idle:
+                try:
+                    worker.conn.send(None)
+                except OSError:
+                    pass
+                worker.kill()
+            self._idle = []
+            self._started = False
+
+
+sandbox_pool = SandboxPool()
@@ -0,0 +1,96 @@
+import os
+from decimal import Decimal, InvalidOperation
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from schema_index import FieldInfo
+
+
+# BigDecimal columns are float64 unless exact decimals are requested
+EXACT_DECIMALS = os.getenv("SUBGRAPH_EXACT_DECIMALS", "").lower() in ("1", "true", "yes")
+
+# Unix seconds fields decoded to UTC datetimes
+TIMESTAMP_FIELDS = {"timestamp", "createdAtTimestamp", "date", "periodStartUnix"}
+
+# uint128/uint160/int128 values that routinely overflow int64
+WIDE_INT_FIELDS = {"liquidity", "liquidityGross", "liquidityNet", "sqrtPrice", "sqrtPriceX96", "amount", "totalSupply"}
+
+# Widest integer a Parquet decimal256 column can hold
+MAX_WIDE_INT = 10 ** 76
+
+
+def _to_int(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return int(value)
+
+
+def _to_decimal(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        return None
+
+
+def _decode_big_int(series: pd.Series, wide: bool) -> pd.Series:
+    if not wide:
+        numeric = pd.to_numeric(series, errors="coerce", dtype_backend="numpy_nullable")
+        # Values beyond int64 come back as floats, those fall through to Python ints
+        if numeric.dtype == "Int64" or numeric.isna().all():
+            return numeric.astype("Int64")
+    # Arbitrary precision Python ints, parsed from the exact strings
+    values = series.map(_to_int)
+    if values.dropna().map(abs).ge(MAX_WIDE_INT).any():
+        return pd.to_numeric(series, errors="coerce").astype("float64")
+    return values.astype(object)
+
+
+def decode_column(series: pd.Series, field_info: FieldInfo) -> pd.Series:
+    """
+    Converts a column of raw subgraph values to a compact dtype based on its schema type.
+
+    - BigDecimal -> float64, or Decimal objects with SUBGRAPH_EXACT_DECIMALS
+    - BigInt / Int -> nullable Int64, Python ints for values beyond int64
+    - ID / Bytes -> category
+    - time fields -> datetime64 UTC
+    """
+    if field_info.is_list:
+        return series
+
+    type_name = field_info.type_name
+    if field_info.name in TIMESTAMP_FIELDS and type_name in ("BigInt", "Int"):
+        return pd.to_datetime(pd.to_numeric(series, errors="coerce"), unit="s", utc=True)
+    if type_name == "BigDecimal":
+        if EXACT_DECIMALS:
+            return series.map(_to_decimal).astype(object)
+        return pd.to_numeric(series, errors="coerce").astype("float64")
+    if type_name in ("BigInt", "Int"):
+        return _decode_big_int(series, wide=is_wide_int(field_info))
+    if type_name in ("ID", "Bytes"):
+        return series.astype("category")
+    if type_name == "Boolean":
+        return series.astype("boolean")
+    return series
+
+
+def is_wide_int(field_info: FieldInfo) -> bool:
+    """
+    Returns True for columns decoded to arbitrary precision Python ints.
+    """
+    return field_info.type_name == "BigInt" and field_info.name in WIDE_INT_FIELDS and not field_info.is_list
+
+
+def decode_columns(df: pd.DataFrame, column_types: Dict[str, FieldInfo]) -> pd.DataFrame:
+    """
+    Decodes every column with a known schema type, other columns are left as they are.
+    """
+    decoded = {
+        column: decode_column(df[column], column_types[column])
+        for column in df.columns
+        if column in column_types
+    }
+    return df.assign(**decoded) if decoded else df
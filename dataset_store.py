@@ -0,0 +1,153 @@
+from decimal import Decimal
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+DATASET_SUFFIX = ".parquet"
+
+
+def dataset_path(file_name: Union[str, Path]) -> Path:
+    """
+    Returns the Parquet path for a requested output file name,
+    e.g. query_results.csv -> query_results.parquet
+    """
+    return Path(file_name).with_suffix(DATASET_SUFFIX)
+
+
+def _is_parquet(path: Union[str, Path]) -> bool:
+    return Path(path).suffix.lower() == DATASET_SUFFIX
+
+
+def _first_value(series: pd.Series):
+    values = series.dropna()
+    return values.iloc[0] if not values.empty else None
+
+
+class DatasetWriter:
+    """
+    Streams DataFrame pages into a single Parquet file. The schema of the
+    first page is embedded in the file and every later page is cast to it.
+
+    Args:
+        path (str): Target Parquet file
+        wide_int_columns (List[str]): Columns holding Python ints beyond int64,
+            detected from the first page when not given
+    """
+
+    def __init__(self, path: Union[str, Path], wide_int_columns: Optional[List[str]] = None):
+        self.path = Path(path)
+        self.wide_int_columns = list(wide_int_columns or [])
+        self.schema: Optional[pa.Schema] = None
+        self.rows = 0
+        self._writer: Optional[pq.ParquetWriter] = None
+
+    def _infer_schema(self, df: pd.DataFrame) -> pa.Schema:
+        # Python ints beyond int64 (liquidity, sqrtPrice) are stored as wide decimals
+        wide_ints = [
+            column for column in df.columns
+            if column in self.wide_int_columns
+            or (df[column].dtype == object and isinstance(_first_value(df[column]), int))
+        ]
+        # Probe with Decimals so the embedded pandas metadata reads them back as objects
+        probe = df.assign(**{
+            column: df[column].map(lambda value: Decimal(value) if isinstance(value, int) else None)
+            for column in wide_ints
+        })
+        schema = pa.Schema.from_pandas(probe, preserve_index=False)
+        fields = []
+        for f in schema:
+            if f.name in wide_ints:
+                f = pa.field(f.name, pa.decimal256(76, 0))
+            elif pa.types.is_dictionary(f.type):
+                # Category codes differ per page, use one index width for all pages
+                f = pa.field(f.name, pa.dictionary(pa.int32(), pa.string()))
+            elif pa.types.is_null(f.type):
+                # Columns that are empty on the first page carry no type yet
+                f = pa.field(f.name, pa.string())
+            fields.append(f)
+        return pa.schema(fields, metadata=schema.metadata)
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self._writer is None:
+            self.schema = self._infer_schema(df)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._writer = pq.ParquetWriter(self.path, self.schema, compression="zstd")
+        table = pa.Table.from_pandas(
+            df.reindex(columns=self.schema.names), schema=self.schema, preserve_index=False
+        )
+        self._writer.write_table(table)
+        self.rows += len(df)
+
+    @property
+    def columns(self) -> List[str]:
+        return self.schema.names if self.schema is not None else []
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def read_columns(file_name: Union[str, Path]) -> Dict[str, str]:
+    """
+    Returns the column names and types of a dataset without loading its rows.
+
+    Args:
+        file_name (str): Path to a Parquet dataset or CSV export
+
+    Returns:
+        Dict[str, str]: Column name to type
+    """
+    if _is_parquet(file_name):
+        schema = pq.read_schema(file_name)
+        return {f.name: str(f.type) for f in schema}
+    df = pd.read_csv(file_name, nrows=0)
+    return {column: "unknown" for column in df.columns}
+
+
+def load_dataset(file_name: Union[str, Path], columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Loads a dataset, reading only the requested columns.
+
+    Args:
+        file_name (str): Path to a Parquet dataset or CSV export
+        columns (List[str]): Columns to load, all when None
+
+    Returns:
+        pd.DataFrame: The loaded data
+    """
+    if _is_parquet(file_name):
+        return pd.read_parquet(file_name, columns=columns, memory_map=True)
+    return pd.read_csv(file_name, usecols=columns)
+
+
+def export_csv(file_name: Union[str, Path], csv_file: Optional[Union[str, Path]] = None) -> Path:
+    """
+    Exports a Parquet dataset to CSV one row group at a time.
+
+    Args:
+        file_name (str): Path to the Parquet dataset
+        csv_file (str): Target path, defaults to the dataset path with a .csv suffix
+
+    Returns:
+        Path: The CSV file written
+    """
+    csv_file = Path(csv_file) if csv_file else Path(file_name).with_suffix(".csv")
+    parquet_file = pq.ParquetFile(file_name, memory_map=True)
+    with csv_file.open("w", encoding="utf-8", newline="") as f:
+        for i in range(parquet_file.num_row_groups):
+            df = parquet_file.read_row_group(i).to_pandas()
+            df.to_csv(f, index=False, header=(i == 0))
+        if parquet_file.num_row_groups == 0:
+            pd.DataFrame(columns=parquet_file.schema_arrow.names).to_csv(f, index=False)
+    return csv_file
@@ -0,0 +1,234 @@
+import os
+import time
+import math
+import asyncio
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+import pandas as pd
+
+
+ENSO_REQUEST_TIMEOUT = float(os.getenv("ENSO_REQUEST_TIMEOUT", "30"))
+# Connections kept open to the route API per event loop
+ENSO_POOL_MAXSIZE = int(os.getenv("ENSO_POOL_MAXSIZE", "10"))
+# Seconds a quote is reused for the same pair, chain and amount bucket, 0 disables the cache
+ENSO_CACHE_TTL = int(os.getenv("ENSO_CACHE_TTL", "30"))
+ENSO_CACHE_MAX_ENTRIES = 500
+# Amounts agreeing in this many significant digits share a cached quote
+ENSO_AMOUNT_DIGITS = 4
+# Retries of rate limited (429) and server error responses
+ENSO_RETRIES = int(os.getenv("ENSO_RETRIES", "2"))
+ENSO_BATCH_CONCURRENCY = 4
+CHAIN_ID = int(os.getenv("ENSO_CHAIN_ID", "1"))
+
+ROUTER_ADDRESS = "0xc500557bFbB3D30B3d40BB36ae93b30F896c2ED6"
+FEE_RECEIVER = "0x220866B1A2219f40e72f5c628B65D54268cA3A9D"
+
+
+class EnsoError(Exception):
+    """Non 200 response from the Enso route API."""
+
+    def __init__(self, status: int, text: str):
+        super().__init__(f"API request failed with status code {status}. Response: {text}")
+        self.status = status
+        self.text = text
+
+
+def route_payload(token_in: str, token_out: str, amount_in: str, chain_id: int = CHAIN_ID) -> Dict[str, Any]:
+    """
+    Builds the route request body for a swap of amount_in (wei) of token_in to token_out.
+    """
+    return {
+        "chainId": chain_id,
+        "fromAddress": ROUTER_ADDRESS,
+        "routingStrategy": "router",
+        "toEoa": True,
+        "receiver": ROUTER_ADDRESS,
+        "spender": ROUTER_ADDRESS,
+        "amountIn": [amount_in],
+        "minAmountOut": None,
+        "slippage": "300",
+        "fee": ["100"],
+        "feeReceiver": FEE_RECEIVER,
+        "ignoreAggregators": ["false"],
+        "ignoreStandards": ["<false>"],
+        "tokenIn": [token_in],
+        "tokenOut": [token_out],
+        "variableEstimates": None
+    }
+
+
+def amount_bucket(amount_in: str) -> str:
+    """
+    Rounds a wei amount to ENSO_AMOUNT_DIGITS significant digits,
+    1000000000000000000 and 1000049999999999999 share a bucket.
+    """
+    amount = int(amount_in)
+    if amount <= 0:
+        return str(amount)
+    drop = max(0, len(str(amount)) - ENSO_AMOUNT_DIGITS)
+    return f"{round(amount / 10 ** drop)}e{drop}"
+
+
+class RouteCache:
+    """
+    Recent route quotes keyed on (tokenIn, tokenOut, amount bucket, chain).
+    Concurrent requests for one key share a single API call.
+    """
+
+    def __init__(self, ttl: int = ENSO_CACHE_TTL, max_entries: int = ENSO_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: Dict[Tuple[str, str, str, int], Tuple[float, Dict[str, Any]]] = {}
+        self.pending: Dict[Tuple[str, str, str, int], asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(token_in: str, token_out: str, amount_in: str, chain_id: int) -> Tuple[str, str, str, int]:
+        return token_in.lower(), token_out.lower(), amount_bucket(amount_in), chain_id
+
+    def get(self, key) -> Optional[Dict[str, Any]]:
+        cached = self.entries.get(key)
+        if cached is None or time.time() - cached[0] > self.ttl:
+            self.entries.pop(key, None)
+            return None
+        return cached[1]
+
+    def put(self, key, route: Dict[str, Any]) -> None:
+        if self.ttl <= 0:
+            return
+        self.entries[key] = (time.time(), route)
+        if len(self.entries) > self.max_entries:
+            oldest = min(self.entries, key=lambda k: self.entries[k][0])
+            del self.entries[oldest]
+
+    def report(self) -> str:
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0.0
+        return f"route cache hits: {self.hits}, misses: {self.misses}, hit rate: {rate:.0%}"
+
+
+route_cache = RouteCache()
+
+# aiohttp sessions are bound to an event loop, so one session is kept per loop
+_sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = weakref.WeakKeyDictionary()
+
+
+def _session() -> aiohttp.ClientSession:
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=ENSO_POOL_MAXSIZE, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=ENSO_REQUEST_TIMEOUT),
+            headers={"Content-Type": "application/json"},
+        )
+        _sessions[loop] = session
+    return session
+
+
+async def _request_route(payload: Dict[str, Any]) -> Dict[str, Any]:
+    headers = {"Authorization": f"Bearer {os.getenv('ENSO_API_KEY')}"}
+    for attempt in range(ENSO_RETRIES + 1):
+        retry_after = ""
+        try:
+            async with _session().post(os.getenv("ENSO_API_URL"), headers=headers, json=payload) as response:
+                if response.status == 200:
+                    return await response.json()
+                text = await response.text()
+                if attempt == ENSO_RETRIES or not (response.status == 429 or response.status >= 500):
+                    raise EnsoError(response.status, text)
+                retry_after = response.headers.get("Retry-After", "")
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt == ENSO_RETRIES:
+                raise
+        await asyncio.sleep(float(retry_after) if retry_after.isdigit() else 0.5 * 2 ** attempt)
+
+
+async def fetch_route(token_in: str, token_out: str, amount_in: str, chain_id: int = CHAIN_ID) -> Dict[str, Any]:
+    """
+    Requests the best swap route from the Enso Finance API over the pooled
+    session of the event loop. Quotes are reused for ENSO_CACHE_TTL seconds
+    for amounts in the same bucket.
+
+    Returns:
+        Dict[str, Any]: The route response
+
+    Raises:
+        EnsoError: On a non 200 response after retries
+    """
+    key = route_cache.key(token_in, token_out, amount_in, chain_id)
+    cached = route_cache.get(key)
+    if cached is not None:
+        route_cache.hits += 1
+        return cached
+    pending = route_cache.pending.get(key)
+    if pending is not None:
+        route_cache.hits += 1
+        return await asyncio.shield(pending)
+
+    route_cache.misses += 1
+    pending = asyncio.ensure_future(_request_route(route_payload(token_in, token_out, amount_in, chain_id)))
+    route_cache.pending[key] = pending
+    try:
+        route = await asyncio.shield(pending)
+    finally:
+        route_cache.pending.pop(key, None)
+    route_cache.put(key, route)
+    return route
+
+
+async def fetch_routes(
+    token_in: str,
+    token_out: str,
+    amounts_in: List[str],
+    chain_id: int = CHAIN_ID,
+    concurrency: int = ENSO_BATCH_CONCURRENCY,
+) -> List[Any]:
+    """
+    Requests the routes of several input amounts in parallel.
+
+    Returns:
+        List[Any]: The route response of each amount in order, or the exception it failed with
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(amount_in):
+        async with semaphore:
+            return await fetch_route(token_in, token_out, amount_in, chain_id)
+
+    return await asyncio.gather(*(one(a) for a in amounts_in), return_exceptions=True)
+
+
+def route_table(amounts_in: List[str], routes: List[Any], decimals_in: int = 18, decimals_out: int = 18) -> pd.DataFrame:
+    """
+    Size vs output table of a batch of routes, rate is output per input in token units.
+    """
+    rows = []
+    for amount_in, route in zip(amounts_in, routes):
+        amount = int(amount_in) / 10 ** decimals_in
+        if isinstance(route, BaseException):
+            rows.append({"amount_in": amount, "amount_out": math.nan, "rate": math.nan,
+                         "price_impact_bps": math.nan, "hops": 0, "source": f"failed: {route}"})
+            continue
+        amount_out = int(route.get("amountOut") or 0) / 10 ** decimals_out
+        rows.append({
+            "amount_in": amount,
+            "amount_out": amount_out,
+            "rate": amount_out / amount if amount else math.nan,
+            "price_impact_bps": float(route.get("priceImpact") or math.nan),
+            "hops": len(route.get("route") or []),
+            "source": route.get("source", "enso"),
+        })
+    return pd.DataFrame(rows)
+
+
+async def close_sessions() -> None:
+    """
+    Closes the session of the running event loop, used on shutdown.
+    """
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
@@ -0,0 +1,245 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import pandas as pd
+
+from graphql_client import get_client, resolve_endpoint
+from query_pagination import iter_pages
+
+
+MIRROR_DB = Path(os.getenv("MIRROR_DB", ".cache/mirror.sqlite"))
+# Seconds between refreshes of the mirrored pools and tokens
+MIRROR_REFRESH_SECONDS = int(os.getenv("MIRROR_REFRESH_SECONDS", "600"))
+# Most liquid entities mirrored, discovery questions are about these
+MIRROR_MAX_POOLS = int(os.getenv("MIRROR_MAX_POOLS", "5000"))
+MIRROR_MAX_TOKENS = int(os.getenv("MIRROR_MAX_TOKENS", "5000"))
+# Rows returned by one SQL lookup
+MIRROR_MAX_ROWS = 200
+
+POOLS_QUERY = """
+{
+  pools(first: %d, orderBy: totalValueLockedUSD, orderDirection: desc, where: {liquidity_gt: "0"}) {
+    id feeTier liquidity sqrtPrice tick token0Price token1Price
+    volumeUSD feesUSD txCount totalValueLockedUSD createdAtTimestamp
+    token0 { id symbol name decimals }
+    token1 { id symbol name decimals }
+  }
+}
+"""
+TOKENS_QUERY = """
+{
+  tokens(first: %d, orderBy: totalValueLockedUSD, orderDirection: desc) {
+    id symbol name decimals volumeUSD feesUSD txCount poolCount totalValueLockedUSD derivedETH
+  }
+}
+"""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pools (
+    id TEXT PRIMARY KEY, fee_tier INTEGER,
+    token0_id TEXT, token0_symbol TEXT, token0_name TEXT, token0_decimals INTEGER,
+    token1_id TEXT, token1_symbol TEXT, token1_name TEXT, token1_decimals INTEGER,
+    liquidity TEXT, sqrt_price TEXT, tick INTEGER, token0_price REAL, token1_price REAL,
+    volume_usd REAL, fees_usd REAL, tx_count INTEGER, tvl_usd REAL, created_at INTEGER
+);
+CREATE INDEX IF NOT EXISTS pools_token0 ON pools (token0_id);
+CREATE INDEX IF NOT EXISTS pools_token1 ON pools (token1_id);
+CREATE INDEX IF NOT EXISTS pools_token0_symbol ON pools (token0_symbol COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS pools_token1_symbol ON pools (token1_symbol COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS pools_fee_tier ON pools (fee_tier, tvl_usd DESC);
+CREATE INDEX IF NOT EXISTS pools_tvl ON pools (tvl_usd DESC);
+CREATE TABLE IF NOT EXISTS tokens (
+    id TEXT PRIMARY KEY, symbol TEXT, name TEXT, decimals INTEGER, volume_usd REAL, fees_usd REAL,
+    tx_count INTEGER, pool_count INTEGER, tvl_usd REAL, derived_eth REAL
+);
+CREATE INDEX IF NOT EXISTS tokens_symbol ON tokens (symbol COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS tokens_tvl ON tokens (tvl_usd DESC);
+CREATE INDEX IF NOT EXISTS tokens_volume ON tokens (volume_usd DESC);
+CREATE TABLE IF NOT EXISTS mirror_state (name TEXT PRIMARY KEY, refreshed_at REAL, endpoint TEXT);
+"""
+
+# Only reads are allowed from the lookup tool
+_READ_ONLY = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+
+
+def _float(value) -> Optional[float]:
+    return float(value) if value not in (None, "") else None
+
+
+def _int(value) -> Optional[int]:
+    return int(value) if value not in (None, "") else None
+
+
+def _pool_record(row: Dict[str, Any]) -> tuple:
+    t0, t1 = row["token0"], row["token1"]
+    return (
+        row["id"].lower(), _int(row["feeTier"]),
+        t0["id"].lower(), t0["symbol"], t0.get("name"), _int(t0["decimals"]),
+        t1["id"].lower(), t1["symbol"], t1.get("name"), _int(t1["decimals"]),
+        str(row["liquidity"]), str(row["sqrtPrice"]), _int(row.get("tick")),
+        _float(row.get("token0Price")), _float(row.get("token1Price")),
+        _float(row.get("volumeUSD")), _float(row.get("feesUSD")), _int(row.get("txCount")),
+        _float(row.get("totalValueLockedUSD")), _int(row.get("createdAtTimestamp")),
+    )
+
+
+def _token_record(row: Dict[str, Any]) -> tuple:
+    return (
+        row["id"].lower(), row["symbol"], row.get("name"), _int(row["decimals"]),
+        _float(row.get("volumeUSD")), _float(row.get("feesUSD")), _int(row.get("txCount")),
+        _int(row.get("poolCount")), _float(row.get("totalValueLockedUSD")), _float(row.get("derivedETH")),
+    )
+
+
+class EntityMirror:
+    """
+    Local SQLite copy of the most liquid Pool and Token entities, indexed on
+    token ids, symbols, fee tier and TVL, so discovery lookups (pools of a
+    token, top pools, top tokens) run locally instead of on the subgraph.
+
+    Args:
+        path (str): SQLite database file
+        refresh_seconds (int): Age after which the mirror is refreshed
+    """
+
+    def __init__(self, path: Union[str, Path] = MIRROR_DB, refresh_seconds: int = MIRROR_REFRESH_SECONDS):
+        self.path = Path(path)
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._refresher: Optional[threading.Thread] = None
+        self._listeners: List[Callable[[], object]] = []
+        self._ready = False
+
+    def _connect(self, read_only: bool = False) -> sqlite3.Connection:
+        if not self._ready:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with closing(sqlite3.connect(self.path, timeout=30)) as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+            self._ready = True
+        if read_only:
+            return sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=30)
+        return sqlite3.connect(self.path, timeout=30)
+
+    def refreshed_at(self, endpoint: Optional[str] = None) -> Optional[float]:
+        with closing(self._connect(read_only=True)) as conn:
+            row = conn.execute("SELECT MIN(refreshed_at), MAX(endpoint) FROM mirror_state").fetchone()
+        if row is None or row[0] is None or (endpoint is not None and row[1] != endpoint):
+            return None
+        return row[0]
+
+    def is_fresh(self, endpoint: Optional[str] = None) -> bool:
+        refreshed_at = self.refreshed_at(endpoint)
+        return refreshed_at is not None and time.time() - refreshed_at <= self.refresh_seconds
+
+    def refresh(self, endpoint: Optional[str] = None) -> str:
+        """
+        Fetches the pools and tokens from the subgraph and replaces the mirrored
+        rows in one transaction, readers see either the old or the new rows.
+        """
+        endpoint = resolve_endpoint(endpoint)
+        client = get_client(endpoint)
+        started = time.perf_counter()
+        pools, tokens = [], []
+        for page in iter_pages(client.execute, POOLS_QUERY % MIRROR_MAX_POOLS, schema=client.schema):
+            pools.extend(_pool_record(row) for row in page)
+        for page in iter_pages(client.execute, TOKENS_QUERY % MIRROR_MAX_TOKENS, schema=client.schema):
+            tokens.extend(_token_record(row) for row in page)
+
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM pools")
+            conn.executemany(f"INSERT OR REPLACE INTO pools VALUES ({', '.join('?' * 20)})", pools)
+            conn.execute("DELETE FROM tokens")
+            conn.executemany(f"INSERT OR REPLACE INTO tokens VALUES ({', '.join('?' * 10)})", tokens)
+            now = time.time()
+            conn.executemany(
+                "INSERT OR REPLACE INTO mirror_state VALUES (?, ?, ?)",
+                [("pools", now, endpoint), ("tokens", now, endpoint)],
+            )
+        message = f"mirror refreshed: {len(pools)} pools, {len(tokens)} tokens in {time.perf_counter() - started:.1f}s"
+        print(message)
+        return message
+
+    def ensure_fresh(self, endpoint: Optional[str] = None) -> None:
+        """
+        Refreshes now when the mirror is empty or was built for another endpoint,
+        otherwise leaves it to the background refresher.
+        """
+        endpoint = resolve_endpoint(endpoint)
+        if self.refreshed_at(endpoint) is None:
+            self.refresh(endpoint)
+        self.start_refresher()
+
+    def add_listener(self, callback: Callable[[], object]) -> None:
+        """
+        Registers a callback run on the refresher thread after every check, e.g. to rebuild an index of the mirror.
+        """
+        with self._lock:
+            self._listeners.append(callback)
+
+    def start_refresher(self) -> None:
+        """
+        Starts the background thread keeping the mirror fresh, once per process.
+        """
+        with self._lock:
+            if self._refresher is not None:
+                return
+
+            def run():
+                while True:
+                    try:
+                        if not self.is_fresh():
+                            self.refresh()
+                    except Exception as e:
+                        print(f"Mirror refresh failed: {e}")
+                    for callback in list(self._listeners):
+                        try:
+                            callback()
+                        except Exception as e:
+                            print(f"Mirror listener failed: {e}")
+                    time.sleep(max(30, self.refresh_seconds // 4))
+
+            self._refresher = threading.Thread(target=run, name="entity-mirror", daemon=True)
+            self._refresher.start()
+
+    def query(self, sql: str, params: tuple = (), max_rows: int = MIRROR_MAX_ROWS) -> pd.DataFrame:
+        """
+        Runs a read only SQL query on the mirror.
+
+        Raises:
+            ValueError: For statements other than SELECT / WITH
+            sqlite3.Error: For invalid SQL
+        """
+        if not _READ_ONLY.match(sql) or ";" in sql.strip().rstrip(";"):
+            raise ValueError("only a single SELECT statement is allowed")
+        with closing(self._connect(read_only=True)) as conn:
+            conn.execute("PRAGMA query_only = ON")
+            cursor = conn.execute(sql.strip().rstrip(";"), params)
+            columns = [c[0] for c in cursor.description]
+            return pd.DataFrame(cursor.fetchmany(max_rows), columns=columns)
+
+    def pool_rows(self, min_tvl_usd: float = 0.0, limit: int = MIRROR_MAX_POOLS) -> List[Dict[str, Any]]:
+        """
+        Mirrored pools in the shape of subgraph Pool rows, most liquid first.
+        """
+        df = self.query(
+            "SELECT * FROM pools WHERE tvl_usd >= ? ORDER BY tvl_usd DESC LIMIT ?", (min_tvl_usd, limit), max_rows=limit
+        )
+        return [
+            {
+                "id": r.id, "feeTier": r.fee_tier, "liquidity": r.liquidity, "sqrtPrice": r.sqrt_price, "tick": r.tick,
+                "totalValueLockedUSD": r.tvl_usd,
+                "token0": {"id": r.token0_id, "symbol": r.token0_symbol, "decimals": r.token0_decimals},
+                "token1": {"id": r.token1_id, "symbol": r.token1_symbol, "decimals": r.token1_decimals},
+            }
+            for r in df.itertuples(index=False)
+        ]
+
+
+entity_mirror = EntityMirror()
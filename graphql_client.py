@@ -0,0 +1,249 @@
+import os
+import json
+import time
+import hashlib
+import asyncio
+import threading
+import weakref
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+from gql import gql, Client
+from gql.client import SyncClientSession, AsyncClientSession
+from gql.transport.aiohttp import AIOHTTPTransport
+from gql.transport.requests import RequestsHTTPTransport
+from requests.adapters import HTTPAdapter
+
+
+# Where introspection results are cached between processes
+SCHEMA_CACHE_DIR = Path(os.getenv("GRAPHQL_SCHEMA_CACHE_DIR", ".cache/graphql_schema"))
+# How long a cached introspection result stays valid (seconds)
+SCHEMA_CACHE_TTL = int(os.getenv("GRAPHQL_SCHEMA_CACHE_TTL", str(24 * 60 * 60)))
+# Max number of keep-alive connections per endpoint
+POOL_MAXSIZE = int(os.getenv("GRAPHQL_POOL_MAXSIZE", "20"))
+REQUEST_TIMEOUT = int(os.getenv("GRAPHQL_REQUEST_TIMEOUT", "60"))
+
+
+def _schema_cache_path(endpoint: str) -> Path:
+    """
+    Returns the cache file for an endpoint. The endpoint is hashed since
+    gateway urls usually embed an API key.
+    """
+    digest = hashlib.sha256(endpoint.encode("utf-8")).hexdigest()[:32]
+    return SCHEMA_CACHE_DIR / f"{digest}.json"
+
+
+def load_cached_introspection(endpoint: str) -> Optional[Dict[str, Any]]:
+    """
+    Reads the cached introspection result of an endpoint.
+
+    Returns:
+        Optional[Dict[str, Any]]: The introspection result, None if missing or expired
+    """
+    cache_file = _schema_cache_path(endpoint)
+    try:
+        with cache_file.open("r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+    if time.time() - cached.get("fetched_at", 0) > SCHEMA_CACHE_TTL:
+        return None
+    return cached.get("introspection")
+
+
+def save_introspection(endpoint: str, introspection: Dict[str, Any]) -> None:
+    """
+    Writes the introspection result of an endpoint to the disk cache.
+    """
+    cache_file = _schema_cache_path(endpoint)
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        with tmp_file.open("w", encoding="utf-8") as f:
+            json.dump({"fetched_at": time.time(), "introspection": introspection}, f)
+        # Atomic swap so concurrent processes never read a partial file
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        print(f"Could not cache GraphQL schema: {e}")
+
+
+class EndpointClient:
+    """
+    A connected gql client for a single endpoint. The underlying requests
+    session is kept open so connections are reused across tool calls.
+    """
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        introspection = load_cached_introspection(endpoint)
+        self._introspection_cached = introspection is not None
+
+        transport = RequestsHTTPTransport(url=endpoint, verify=True, retries=3, timeout=REQUEST_TIMEOUT)
+        self.client = Client(
+            transport=transport,
+            introspection=introspection,
+            fetch_schema_from_transport=introspection is None,
+        )
+        self.session: SyncClientSession = self.client.connect_sync()
+        self._resize_pool(transport)
+
+        if not self._introspection_cached and self.client.introspection:
+            save_introspection(endpoint, self.client.introspection)
+            self._introspection_cached = True
+
+    @staticmethod
+    def _resize_pool(transport: RequestsHTTPTransport) -> None:
+        # gql mounts an adapter with the default pool size, keep its retry policy
+        for prefix in ("http://", "https://"):
+            current = transport.session.get_adapter(prefix)
+            adapter = HTTPAdapter(
+                pool_connections=POOL_MAXSIZE,
+                pool_maxsize=POOL_MAXSIZE,
+                max_retries=current.max_retries,
+            )
+            transport.session.mount(prefix, adapter)
+
+    @property
+    def schema(self):
+        return self.client.schema
+
+    def execute(self, query: str) -> Dict[str, Any]:
+        result = self.session.execute(gql(query))
+        # Older gql versions fetch the schema lazily on the first execute
+        if not self._introspection_cached and self.client.introspection:
+            save_introspection(self.endpoint, self.client.introspection)
+            self._introspection_cached = True
+        return result
+
+    def close(self) -> None:
+        self.client.close_sync()
+
+
+class AsyncEndpointClient:
+    """
+    Async counterpart of EndpointClient over aiohttp. aiohttp sessions are bound
+    to an event loop, so one client is kept per endpoint and loop.
+    """
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.client: Optional[Client] = None
+        self.session: Optional[AsyncClientSession] = None
+        self.connected: Optional[asyncio.Future] = None
+
+    async def connect(self) -> "AsyncEndpointClient":
+        introspection = load_cached_introspection(self.endpoint)
+        transport = AIOHTTPTransport(url=self.endpoint, timeout=REQUEST_TIMEOUT)
+        self.client = Client(
+            transport=transport,
+            introspection=introspection,
+            fetch_schema_from_transport=introspection is None,
+        )
+        self.session = await self.client.connect_async()
+        if introspection is None and self.client.introspection:
+            save_introspection(self.endpoint, self.client.introspection)
+        return self
+
+    @property
+    def schema(self):
+        return self.client.schema
+
+    async def execute(self, query: str) -> Dict[str, Any]:
+        return await self.session.execute(gql(query))
+
+    async def close(self) -> None:
+        await self.client.close_async()
+
+
+_clients: Dict[str, EndpointClient] = {}
+_clients_lock = threading.Lock()
+
+
+def resolve_endpoint(endpoint: Optional[str] = None) -> str:
+    """
+    Returns the endpoint to use, defaults to GRAPHQL_ENDPOINT.
+    """
+    endpoint = endpoint or os.getenv("GRAPHQL_ENDPOINT")
+    if not endpoint:
+        raise ValueError("GRAPHQL_ENDPOINT is not set")
+    return endpoint
+
+
+def get_client(endpoint: Optional[str] = None) -> EndpointClient:
+    """
+    Returns the process-wide client for an endpoint, creating it on first use.
+
+    Args:
+        endpoint (str): GraphQL endpoint url, defaults to GRAPHQL_ENDPOINT
+
+    Returns:
+        EndpointClient: The shared, connected client
+    """
+    endpoint = resolve_endpoint(endpoint)
+
+    with _clients_lock:
+        endpoint_client = _clients.get(endpoint)
+        if endpoint_client is None:
+            endpoint_client = EndpointClient(endpoint)
+            _clients[endpoint] = endpoint_client
+        return endpoint_client
+
+
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, AsyncEndpointClient]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+async def get_async_client(endpoint: Optional[str] = None) -> AsyncEndpointClient:
+    """
+    Returns the async client of an endpoint for the running event loop,
+    connecting it on first use.
+
+    Args:
+        endpoint (str): GraphQL endpoint url, defaults to GRAPHQL_ENDPOINT
+
+    Returns:
+        AsyncEndpointClient: The shared, connected client
+    """
+    endpoint = resolve_endpoint(endpoint)
+    loop_clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    endpoint_client = loop_clients.get(endpoint)
+    if endpoint_client is None:
+        # Registered before connecting so concurrent callers do not open a second session
+        endpoint_client = AsyncEndpointClient(endpoint)
+        endpoint_client.connected = asyncio.ensure_future(endpoint_client.connect())
+        loop_clients[endpoint] = endpoint_client
+    try:
+        await endpoint_client.connected
+    except Exception:
+        loop_clients.pop(endpoint, None)
+        raise
+    return endpoint_client
+
+
+def execute_query(query: str, endpoint: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Executes a GraphQL query over the pooled client of the endpoint.
+
+    Args:
+        query (str): The GraphQL query
+        endpoint (str): GraphQL endpoint url, defaults to GRAPHQL_ENDPOINT
+
+    Returns:
+        Dict[str, Any]: The query response data
+    """
+    return get_client(endpoint).execute(query)
+
+
+def close_clients() -> None:
+    """
+    Closes all pooled clients, used on shutdown and in tests.
+    """
+    with _clients_lock:
+        for endpoint_client in _clients.values():
+            try:
+                endpoint_client.close()
+            except Exception as e:
+                print(f"Error closing GraphQL client for endpoint: {e}")
+        _clients.clear()
@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import bisect
+import functools
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+import logfire
+from pydantic_ai.models.wrapper import WrapperModel
+
+
+# Port of the local Prometheus text endpoint (/metrics, /metrics.json), 0 disables it
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+# JSON lines file receiving one line per timed operation, empty disables it
+METRICS_LOG = os.getenv("METRICS_LOG", "")
+METRICS_PREFIX = "pool_sweeper"
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound of the bucket holding the q quantile.
+        """
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class MetricsRegistry:
+    """
+    Latency histograms and counters kept in process, exported as Prometheus
+    text and optionally appended to a JSON lines log, so timings are available
+    without any external service.
+    """
+
+    def __init__(self, log_path: str = METRICS_LOG):
+        self.log_path = log_path
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _labels(labels: Dict[str, object]) -> Labels:
+        return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        key = (name, self._labels(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, self._labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def log(self, event: Dict[str, object]) -> None:
+        if not self.log_path:
+            return
+        line = json.dumps({"ts": time.time(), **event}, default=str)
+        with self._lock, open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def render_prometheus(self) -> str:
+        def label_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+        lines, typed = [], set()
+        with self._lock:
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                metric = f"{METRICS_PREFIX}_{name}"
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} histogram")
+                    typed.add(metric)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f"{metric}_bucket{label_text(labels, [('le', le)])} {cumulative}")
+                lines.append(f"{metric}_sum{label_text(labels)} {histogram.sum:.6f}")
+                lines.append(f"{metric}_count{label_text(labels)} {histogram.count}")
+            for (name, labels), value in sorted(self.counters.items()):
+                metric = f"{METRICS_PREFIX}_{name}"
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} counter")
+                    typed.add(metric)
+                lines.append(f"{metric}{label_text(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "histograms": [
+                    {"name": name, "labels": dict(labels), "count": h.count, "sum": round(h.sum, 6),
+                     "p50": h.quantile(0.5), "p95": h.quantile(0.95)}
+                    for (name, labels), h in self.histograms.items()
+                ],
+                "counters": [{"name": name, "labels": dict(labels), "value": v} for (name, labels), v in self.counters.items()],
+            }
+
+    def report(self) -> str:
+        lines = []
+        for h in sorted(self.snapshot()["histograms"], key=lambda h: -h["sum"]):
+            labels = ", ".join(f"{k}={v}" for k, v in h["labels"].items())
+            lines.append(f"{h['name']}[{labels}]: {h['count']} calls, {h['sum']:.2f}s total, p50 <= {h['p50']:g}s, p95 <= {h['p95']:g}s")
+        return "\n".join(lines)
+
+
+metrics = MetricsRegistry()
+
+
+@contextmanager
+def timed(name: str, **labels):
+    """
+    Times a block as a logfire span and records its latency in the
+    `<name>_seconds` histogram with an outcome label.
+    """
+    started = time.perf_counter()
+    outcome = "ok"
+    with logfire.span(name, **labels):
+        try:
+            yield
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.observe(f"{name}_seconds", elapsed, outcome=outcome, **labels)
+            metrics.log({"event": name, "seconds": round(elapsed, 6), "outcome": outcome, **labels})
+
+
+def instrument_tool(function):
+    """
+    Times every call of an async agent tool. The wrapper keeps the signature
+    and docstring of the tool, so the agent sees the same tool schema.
+    """
+    @functools.wraps(function)
+    async def wrapper(*args, **kwargs):
+        with timed("tool", tool=function.__name__):
+            return await function(*args, **kwargs)
+
+    return wrapper
+
+
+def _record_usage(model_name: str, usage) -> None:
+    # Older pydantic-ai versions call them request/response tokens
+    input_tokens = getattr(usage, "input_tokens", None) or getattr(usage, "request_tokens", None) or 0
+    output_tokens = getattr(usage, "output_tokens", None) or getattr(usage, "response_tokens", None) or 0
+    metrics.inc("llm_tokens_total", input_tokens, model=model_name, kind="input")
+    metrics.inc("llm_tokens_total", output_tokens, model=model_name, kind="output")
+    metrics.log({"event": "llm_usage", "model": model_name, "input_tokens": input_tokens, "output_tokens": output_tokens})
+
+
+class timed_model(WrapperModel):
+    """
+    Model wrapper recording the latency and token counts of every LLM turn.
+    """
+
+    async def request(self, *args, **kwargs):
+        with timed("llm_turn", model=self.model_name, mode="request"):
+            response = await super().request(*args, **kwargs)
+        _record_usage(self.model_name, response.usage)
+        return response
+
+    @asynccontextmanager
+    async def request_stream(self, *args, **kwargs):
+        with timed("llm_turn", model=self.model_name, mode="stream"):
+            async with super().request_stream(*args, **kwargs) as stream:
+                yield stream
+        _record_usage(self.model_name, stream.usage())
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body, content_type = json.dumps(metrics.snapshot()).encode(), "application/json"
+        elif self.path.startswith("/metrics"):
+            body, content_type = metrics.render_prometheus().encode(), "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_setup_lock = threading.Lock()
+_setup_done = False
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def setup_instrumentation() -> None:
+    """
+    Configures logfire and starts the metrics endpoint, once per process.
+    Spans are sent to logfire only when LOGFIRE_TOKEN is set.
+    """
+    global _setup_done, _server
+    with _setup_lock:
+        if _setup_done:
+            return
+        _setup_done = True
+        logfire.configure(
+            token=os.getenv("LOGFIRE_TOKEN"), send_to_logfire="if-token-present", scrubbing=False, console=False
+        )
+        if METRICS_PORT:
+            try:
+                # Several Streamlit sessions share the process, only the first call binds the port
+                _server = ThreadingHTTPServer(("127.0.0.1", METRICS_PORT), _MetricsHandler)
+                threading.Thread(target=_server.serve_forever, name="metrics-endpoint", daemon=True).start()
+                print(f"Metrics endpoint on http://127.0.0.1:{METRICS_PORT}/metrics")
+            except OSError as e:
+                print(f"Metrics endpoint not started: {e}")
@@ -0,0 +1,199 @@
+import re
+import time
+import shutil
+import asyncio
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from graphql_client import get_client, get_async_client, resolve_endpoint
+from query_pagination import iter_pages, aiter_pages, PaginationStats, RunningSummary
+from dataset_store import DatasetWriter, dataset_path, export_csv as write_csv_export
+from query_cache import query_cache
+from schema_index import default_index
+from result_flattening import FlattenPlan
+from timeseries_store import TIMESERIES_SYNC, parse_series_request, sync_plan, timeseries_store
+
+
+# Default number of queries fetched at the same time by fetch_datasets
+BATCH_CONCURRENCY = 4
+
+
+def _cached_details(query: str, endpoint: str, output_path: Path) -> Optional[str]:
+    cached = query_cache.get(query, endpoint)
+    if cached is None:
+        return None
+    try:
+        shutil.copyfile(cached.dataset, output_path)
+    except FileNotFoundError:
+        # Evicted or expired after the lookup, possibly by another process, fetch it again
+        return None
+    fetched_at = datetime.fromtimestamp(cached.created_at).strftime("%Y-%m-%d %H:%M:%S")
+    return f"{cached.message} \n served from cache, fetched at {fetched_at}"
+
+
+def _saved_message(output_path: Path, details: str, export_csv: bool) -> str:
+    print(f"Saved query results to {output_path}")
+    message = f"Saved query results to {output_path} \n"
+    if export_csv:
+        message += f" csv export: {write_csv_export(output_path)} \n"
+    return message + f" {details}"
+
+
+def _series_plan(query: str, endpoint: str) -> Optional[sync_plan]:
+    # Day and hour data of one pool or token is synced incrementally into the time series store
+    if not TIMESERIES_SYNC:
+        return None
+    request = parse_series_request(query, endpoint)
+    return timeseries_store.plan(request) if request is not None else None
+
+
+def _write_series(series: sync_plan, output_path: Path, stats: PaginationStats) -> Optional[str]:
+    summary = RunningSummary()
+    plan = FlattenPlan.from_query(series.request.query, default_index())
+    with DatasetWriter(output_path, wide_int_columns=plan.wide_int_columns) as writer:
+        for rows in timeseries_store.read(series.request):
+            df = plan.flatten(rows)
+            writer.write(df)
+            summary.update(df)
+    if writer.rows == 0:
+        return None
+    return f"{timeseries_store.report(series, writer.rows)} \n {stats.report()} \n dataset summary:\n {summary.to_frame()}"
+
+
+def fetch_dataset(query: str, output_file: Union[str, Path], export_csv: bool = False) -> str:
+    """
+    Runs a GraphQL query and streams all of its pages into a Parquet dataset.
+
+    Args:
+        query (str): The GraphQL query
+        output_file (str): Requested dataset file name, stored with a .parquet suffix
+        export_csv (bool): Also write a CSV export next to the dataset
+
+    Returns:
+        str: Where the data was saved, row counts, throughput and a dataset summary
+    """
+    output_path = dataset_path(output_file)
+    endpoint = resolve_endpoint()
+
+    # Repeated questions are answered from the query cache
+    details = _cached_details(query, endpoint, output_path)
+    if details is None:
+        # Shared pooled client, schema introspection is cached on disk
+        graphql_client = get_client(endpoint)
+        stats = PaginationStats()
+        series = _series_plan(query, endpoint)
+        if series is not None:
+            if series.fetch_query is not None:
+                for page in iter_pages(graphql_client.execute, series.fetch_query, schema=graphql_client.schema, stats=stats):
+                    timeseries_store.merge(series, page)
+                timeseries_store.finish(series)
+            details = _write_series(series, output_path, stats)
+            if details is None:
+                return f"Query returned no rows \n {stats.report()}"
+            query_cache.put(query, endpoint, output_path, details)
+            return _saved_message(output_path, details, export_csv)
+
+        summary = RunningSummary()
+        # Nested entities are expanded into prefixed columns following the schema
+        plan = FlattenPlan.from_query(query, default_index())
+
+        # Each page is appended to the file as it arrives to keep memory bounded
+        with DatasetWriter(output_path, wide_int_columns=plan.wide_int_columns) as writer:
+            for page in iter_pages(graphql_client.execute, query, schema=graphql_client.schema, stats=stats):
+                df = plan.flatten(page)
+                writer.write(df)
+                summary.update(df)
+                print(f"Fetched page {stats.pages} ({stats.rows} rows)")
+
+        if writer.rows == 0:
+            return f"Query returned no rows \n {stats.report()}"
+
+        details = f"{stats.report()} \n dataset summary:\n {summary.to_frame()}"
+        query_cache.put(query, endpoint, output_path, details)
+
+    return _saved_message(output_path, details, export_csv)
+
+
+async def afetch_dataset(query: str, output_file: Union[str, Path], export_csv: bool = False) -> str:
+    """
+    Async version of fetch_dataset over the aiohttp client. Flattening and
+    writing run in a worker thread so other fetches keep going meanwhile.
+    """
+    output_path = dataset_path(output_file)
+    endpoint = resolve_endpoint()
+
+    details = _cached_details(query, endpoint, output_path)
+    if details is None:
+        graphql_client = await get_async_client(endpoint)
+        stats = PaginationStats()
+        series = await asyncio.to_thread(_series_plan, query, endpoint)
+        if series is not None:
+            if series.fetch_query is not None:
+                async for page in aiter_pages(graphql_client.execute, series.fetch_query, schema=graphql_client.schema, stats=stats):
+                    await asyncio.to_thread(timeseries_store.merge, series, page)
+                await asyncio.to_thread(timeseries_store.finish, series)
+            details = await asyncio.to_thread(_write_series, series, output_path, stats)
+            if details is None:
+                return f"Query returned no rows \n {stats.report()}"
+            query_cache.put(query, endpoint, output_path, details)
+            return await asyncio.to_thread(_saved_message, output_path, details, export_csv)
+
+        summary = RunningSummary()
+        plan = FlattenPlan.from_query(query, default_index())
+
+        def write_page(page):
+            df = plan.flatten(page)
+            writer.write(df)
+            summary.update(df)
+
+        with DatasetWriter(output_path, wide_int_columns=plan.wide_int_columns) as writer:
+            async for page in aiter_pages(graphql_client.execute, query, schema=graphql_client.schema, stats=stats):
+                await asyncio.to_thread(write_page, page)
+                print(f"Fetched page {stats.pages} of {output_path} ({stats.rows} rows)")
+
+        if writer.rows == 0:
+            return f"Query returned no rows \n {stats.report()}"
+
+        details = f"{stats.report()} \n dataset summary:\n {summary.to_frame()}"
+        query_cache.put(query, endpoint, output_path, details)
+
+    return await asyncio.to_thread(_saved_message, output_path, details, export_csv)
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name).strip("._") or "query"
+
+
+async def fetch_datasets(
+    queries: Dict[str, str],
+    concurrency: int = BATCH_CONCURRENCY,
+    export_csv: bool = False,
+    output_dir: Union[str, Path] = ".",
+) -> Dict[str, str]:
+    """
+    Fetches several named queries concurrently, one dataset per query.
+
+    Args:
+        queries (Dict[str, str]): Query name to GraphQL query, the name becomes the file name
+        concurrency (int): Maximum number of queries in flight
+        export_csv (bool): Also write CSV exports
+        output_dir (str): Directory the datasets are written to
+
+    Returns:
+        Dict[str, str]: Query name to the fetch message or error
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(name: str, query: str) -> str:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                message = await afetch_dataset(query, Path(output_dir) / f"{_safe_name(name)}.parquet", export_csv)
+            except Exception as e:
+                message = f"GraphQL query failed: {e}"
+            return f"{message} \n query time: {time.perf_counter() - started:.2f}s"
+
+    names = list(queries)
+    results = await asyncio.gather(*(run(name, queries[name]) for name in names))
+    return dict(zip(names, results))
@@ -0,0 +1,294 @@
+import os
+import json
+import time
+import asyncio
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from entity_mirror import entity_mirror
+from graphql_client import get_async_client, resolve_endpoint
+from query_pagination import aiter_pages
+from tick_depth import get_depth_profile
+from v3_math import MAX_SQRT_RATIO, MIN_SQRT_RATIO, Q96, swap_step
+
+
+# "enso": Enso route API with the local router as fallback, "local": local router only
+ROUTE_SOURCE = os.getenv("ROUTE_SOURCE", "enso").lower()
+ROUTER_GRAPH_FILE = Path(os.getenv("ROUTER_GRAPH_FILE", ".cache/pool_graph.json"))
+# Seconds the pool graph is reused before it is fetched again
+ROUTER_GRAPH_TTL = int(os.getenv("ROUTER_GRAPH_TTL", "300"))
+# Pools with the highest TVL taken into the graph
+ROUTER_MAX_POOLS = int(os.getenv("ROUTER_MAX_POOLS", "2000"))
+ROUTER_MIN_TVL_USD = float(os.getenv("ROUTER_MIN_TVL_USD", "10000"))
+ROUTER_MAX_HOPS = 3
+# Partial routes kept per token and hop count during the search
+ROUTER_BEAM = 4
+# Best routes re-quoted over the ticks of their pools
+ROUTER_REFINE = 3
+
+POOLS_QUERY = """
+{
+  pools(first: %d, orderBy: totalValueLockedUSD, orderDirection: desc,
+        where: {liquidity_gt: "0", totalValueLockedUSD_gt: "%s"}) {
+    id feeTier liquidity sqrtPrice tick totalValueLockedUSD
+    token0 { id symbol decimals }
+    token1 { id symbol decimals }
+  }
+}
+"""
+
+
+@dataclass
+class graph_pool:
+    id: str
+    fee: int
+    liquidity: int
+    sqrt_price: int
+    token0: str
+    token1: str
+    tvl_usd: float
+
+    def quote(self, amount_in: int, zero_for_one: bool) -> Tuple[int, float]:
+        """
+        Output of an exact input swap with the in range liquidity held constant,
+        and the mid price of the direction (output per input, raw units).
+        Deep trades crossing ticks are re-quoted exactly by refine.
+        """
+        price = (self.sqrt_price / Q96) ** 2
+        mid = price if zero_for_one else 1 / price
+        limit = MIN_SQRT_RATIO + 1 if zero_for_one else MAX_SQRT_RATIO - 1
+        _, used, out, fee_amount = swap_step(self.sqrt_price, limit, self.liquidity, amount_in, self.fee)
+        # Whatever the range can not absorb is not swapped
+        return (out if used + fee_amount >= amount_in else 0), mid
+
+
+@dataclass
+class local_route:
+    token_path: List[str]
+    pools: List[graph_pool]
+    amounts: List[int]
+    mid_out: float
+    exact: bool = False
+
+    @property
+    def amount_out(self) -> int:
+        return self.amounts[-1]
+
+    @property
+    def price_impact_bps(self) -> float:
+        return (1 - self.amount_out / self.mid_out) * 10000 if self.mid_out else 0.0
+
+
+class PoolGraph:
+    """
+    Token/pool graph of the most liquid pools, built from cached Pool rows.
+
+    Args:
+        pools (List[Dict[str, Any]]): Pool rows with id, feeTier, liquidity, sqrtPrice,
+            totalValueLockedUSD, token0 and token1
+    """
+
+    def __init__(self, pools: List[Dict[str, Any]], fetched_at: Optional[float] = None):
+        self.fetched_at = fetched_at or time.time()
+        self.rows = pools
+        self.tokens: Dict[str, Dict[str, Any]] = {}
+        self.edges: Dict[str, List[Tuple[graph_pool, bool]]] = {}
+        self.token_tvl: Dict[str, float] = {}
+        for row in pools:
+            if int(row["liquidity"]) <= 0 or int(row["sqrtPrice"]) <= 0:
+                continue
+            pool = graph_pool(
+                id=row["id"],
+                fee=int(row["feeTier"]),
+                liquidity=int(row["liquidity"]),
+                sqrt_price=int(row["sqrtPrice"]),
+                token0=row["token0"]["id"].lower(),
+                token1=row["token1"]["id"].lower(),
+                tvl_usd=float(row.get("totalValueLockedUSD") or 0),
+            )
+            for token in (row["token0"], row["token1"]):
+                self.tokens[token["id"].lower()] = token
+                self.token_tvl[token["id"].lower()] = self.token_tvl.get(token["id"].lower(), 0.0) + pool.tvl_usd
+            self.edges.setdefault(pool.token0, []).append((pool, True))
+            self.edges.setdefault(pool.token1, []).append((pool, False))
+
+    def find_token(self, token: str) -> Optional[str]:
+        """
+        Address of a token given its address or symbol, the most liquid one for a shared symbol.
+        """
+        token = token.lower()
+        if token in self.tokens:
+            return token
+        matches = [address for address, t in self.tokens.items() if t["symbol"].lower() == token]
+        return max(matches, key=lambda a: self.token_tvl.get(a, 0.0)) if matches else None
+
+    def search(self, token_in: str, token_out: str, amount_in: int, max_hops: int = ROUTER_MAX_HOPS) -> List[local_route]:
+        """
+        Best routes of 1 to max_hops hops for an exact input amount. Each hop
+        level keeps the ROUTER_BEAM best partial routes per token, routes never
+        revisit a token or pool.
+
+        Returns:
+            List[local_route]: Complete routes, best output first
+        """
+        level = {token_in: [local_route([token_in], [], [amount_in], float(amount_in))]}
+        complete: List[local_route] = []
+        for _ in range(max_hops):
+            candidates: Dict[str, List[local_route]] = {}
+            for token, routes in level.items():
+                for route in routes:
+                    for pool, zero_for_one in self.edges.get(token, ()):
+                        next_token = pool.token1 if zero_for_one else pool.token0
+                        if next_token in route.token_path:
+                            continue
+                        out, mid = pool.quote(route.amount_out, zero_for_one)
+                        if out <= 0:
+                            continue
+                        extended = local_route(
+                            token_path=route.token_path + [next_token],
+                            pools=route.pools + [pool],
+                            amounts=route.amounts + [out],
+                            mid_out=route.mid_out * mid,
+                        )
+                        if next_token == token_out:
+                            complete.append(extended)
+                        else:
+                            candidates.setdefault(next_token, []).append(extended)
+            level = {
+                token: sorted(routes, key=lambda r: r.amount_out, reverse=True)[:ROUTER_BEAM]
+                for token, routes in candidates.items()
+            }
+            if not level:
+                break
+        return sorted(complete, key=lambda r: r.amount_out, reverse=True)
+
+    def to_enso_format(self, route: local_route, alternatives: List[local_route] = ()) -> Dict[str, Any]:
+        """
+        The route in the shape of an Enso route response, amounts in wei strings.
+        """
+        steps = []
+        for i, pool in enumerate(route.pools):
+            steps.append({
+                "action": "swap",
+                "protocol": "uniswap-v3",
+                "primaryAddress": pool.id,
+                "tokenIn": [route.token_path[i]],
+                "tokenOut": [route.token_path[i + 1]],
+                "feeTier": pool.fee,
+                "amountIn": str(route.amounts[i]),
+                "amountOut": str(route.amounts[i + 1]),
+            })
+        return {
+            "source": "local",
+            "amountOut": str(route.amount_out),
+            "priceImpact": round(route.price_impact_bps, 2),
+            "route": steps,
+            "exact": route.exact,
+            "alternatives": [
+                {"path": " -> ".join(self.tokens[t]["symbol"] for t in alt.token_path), "amountOut": str(alt.amount_out)}
+                for alt in alternatives
+            ],
+            "createdAt": int(time.time()),
+        }
+
+
+async def refine(route: local_route) -> local_route:
+    """
+    Re-quotes a route hop by hop over the initialized ticks of its pools, so
+    trades that cross ticks are quoted exactly.
+    """
+    profiles = await asyncio.gather(*(get_depth_profile(pool.id) for pool in route.pools))
+    amounts = [route.amounts[0]]
+    for (pool, profile), token in zip(zip(route.pools, profiles), route.token_path[:-1]):
+        zero_for_one = token == pool.token0
+        used, out, _, _, filled = profile.quote_raw([amounts[-1]], zero_for_one)[0]
+        amounts.append(out if filled else 0)
+    return local_route(route.token_path, route.pools, amounts, route.mid_out, exact=True)
+
+
+_graph: Optional[PoolGraph] = None
+_graph_lock: Optional[asyncio.Lock] = None
+
+
+def _load_graph_file() -> Optional[PoolGraph]:
+    try:
+        with ROUTER_GRAPH_FILE.open("r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if time.time() - cached.get("fetched_at", 0) > ROUTER_GRAPH_TTL:
+        return None
+    return PoolGraph(cached["pools"], cached["fetched_at"])
+
+
+def _save_graph_file(graph: PoolGraph) -> None:
+    ROUTER_GRAPH_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = ROUTER_GRAPH_FILE.with_suffix(".tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        json.dump({"fetched_at": graph.fetched_at, "pools": graph.rows}, f)
+    os.replace(tmp_path, ROUTER_GRAPH_FILE)
+
+
+async def get_pool_graph(endpoint: Optional[str] = None) -> PoolGraph:
+    """
+    Returns the pool graph, from memory or the graph file while fresh, then
+    from the local pool mirror, otherwise fetched from the subgraph.
+    """
+    global _graph, _graph_lock
+    if _graph_lock is None:
+        _graph_lock = asyncio.Lock()
+    async with _graph_lock:
+        if _graph is not None and time.time() - _graph.fetched_at <= ROUTER_GRAPH_TTL:
+            return _graph
+        graph = await asyncio.to_thread(_load_graph_file)
+        endpoint = resolve_endpoint(endpoint)
+        if graph is None and await asyncio.to_thread(entity_mirror.is_fresh, endpoint):
+            # The local pool mirror already holds the most liquid pools
+            rows = await asyncio.to_thread(entity_mirror.pool_rows, ROUTER_MIN_TVL_USD, ROUTER_MAX_POOLS)
+            if rows:
+                graph = await asyncio.to_thread(PoolGraph, rows, entity_mirror.refreshed_at(endpoint))
+        if graph is None:
+            client = await get_async_client(endpoint)
+            rows = []
+            query = POOLS_QUERY % (ROUTER_MAX_POOLS, ROUTER_MIN_TVL_USD)
+            async for page in aiter_pages(client.execute, query, schema=client.schema):
+                rows.extend(page)
+            graph = await asyncio.to_thread(PoolGraph, rows)
+            await asyncio.to_thread(_save_graph_file, graph)
+        _graph = graph
+        return graph
+
+
+async def find_route(token_in: str, token_out: str, amount_in: str, exact: bool = True) -> Dict[str, Any]:
+    """
+    Finds the best 1 to 3 hop Uniswap v3 route between two tokens locally.
+
+    Args:
+        token_in (str): Input token address or symbol
+        token_out (str): Output token address or symbol
+        amount_in (str): Input amount in wei
+        exact (bool): Re-quote the best routes over the ticks of their pools
+
+    Returns:
+        Dict[str, Any]: The route in the shape of an Enso route response
+
+    Raises:
+        ValueError: When a token is not in the graph or no route exists
+    """
+    graph = await get_pool_graph()
+    address_in, address_out = graph.find_token(token_in), graph.find_token(token_out)
+    if address_in is None or address_out is None:
+        missing = token_in if address_in is None else token_out
+        raise ValueError(f"token {missing} is not in any of the {len(graph.rows)} cached pools")
+
+    routes = await asyncio.to_thread(graph.search, address_in, address_out, int(amount_in))
+    if not routes:
+        raise ValueError(f"no route of up to {ROUTER_MAX_HOPS} hops between {token_in} and {token_out}")
+    if exact:
+        try:
+            refined = await asyncio.gather(*(refine(route) for route in routes[:ROUTER_REFINE]))
+            routes = sorted(refined, key=lambda r: r.amount_out, reverse=True) + routes[ROUTER_REFINE:]
+        except Exception as e:
+            print(f"Could not re-quote routes over ticks, using in range estimates: {e}")
+    return graph.to_enso_format(routes[0], routes[1:ROUTER_REFINE])
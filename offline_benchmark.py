@@ -0,0 +1,723 @@
+"""
+Offline end to end benchmark of the agent pipeline.
+
+Subgraph responses, Enso route responses and model turns are replayed by local
+stand-ins: a stub GraphQL server executing queries on fixture entities (or
+replaying recorded responses), a stub route server quoting from the fixture
+pools, and a scripted pydantic-ai FunctionModel. Typical questions run
+through run_agent and the QueryRunner tool, and the per stage p50/p95 latency,
+peak RSS and bytes written are reported. No network access is needed.
+
+The fixtures are synthetic unless --fixtures points to a directory of real
+ones. generate_fixtures builds seeded random tokens, pools and day data, and
+there is no recorder for live responses: responses.json and routes.json must
+be captured separately and none are committed. p50/p95 over synthetic fixtures
+compare one build of the pipeline with another on the same data, they are not
+an estimate of production latency, whose subgraph and model response sizes
+and timings differ. Reports carry the fixture source, and comparing reports
+of different fixtures is refused.
+
+Usage:
+    python offline_benchmark.py --runs 3 --json bench.json
+    python offline_benchmark.py --baseline bench.json       # exit code 1 on p95 regressions
+    python offline_benchmark.py --save-fixtures fixtures/   # write the generated fixtures for editing
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from graphql import GraphQLSchema, build_schema, graphql_sync
+
+from query_cache import normalize_query
+from schema_index import default_index, plural_field_name
+from v3_math import sqrt_ratio_at_tick
+
+
+PACKAGE_DIR = Path(__file__).resolve().parent
+# Relative p95 increase of a stage over the baseline that counts as a regression
+REGRESSION_TOLERANCE = 0.2
+FIXTURE_SEED = 7
+DAY = 86400
+Q96 = 1 << 96
+
+# ---- subgraph stand-in ----
+
+FILTER_OPERATORS = ("not", "gt", "lt", "gte", "lte", "in", "not_in", "contains", "starts_with")
+
+
+def subgraph_query_schema() -> GraphQLSchema:
+    """
+    Builds a graph-node style query schema from the entity SDL: one single and
+    one list root field per entity with first/skip/orderBy/orderDirection/where.
+    All fields are nullable so fixtures only need the fields they use.
+    """
+    index = default_index()
+    lines = ["scalar BigInt", "scalar BigDecimal", "scalar Bytes", "enum OrderDirection { asc desc }"]
+    query_fields = []
+    for entity in index.entities.values():
+        fields, filters, order = [], [], []
+        for f in entity.fields.values():
+            type_name = f.type_name
+            fields.append(f"  {f.name}: {'[' + type_name + ']' if f.is_list else type_name}")
+            if f.is_list:
+                continue
+            order.append(f.name)
+            value_type = type_name if f.is_scalar else "String"
+            filters.append(f"  {f.name}: {value_type}")
+            for op in FILTER_OPERATORS:
+                if op in ("contains", "starts_with") and value_type not in ("String", "Bytes"):
+                    continue
+                op_type = f"[{value_type}!]" if op in ("in", "not_in") else value_type
+                filters.append(f"  {f.name}_{op}: {op_type}")
+        lines.append(f"type {entity.name} {{\n" + "\n".join(fields) + "\n}")
+        lines.append(f"input {entity.name}_filter {{\n" + "\n".join(filters) + "\n}")
+        lines.append(f"enum {entity.name}_orderBy {{ {' '.join(order)} }}")
+        singular = entity.name[0].lower() + entity.name[1:]
+        query_fields.append(f"  {singular}(id: ID!): {entity.name}")
+        query_fields.append(
+            f"  {plural_field_name(entity.name)}(first: Int = 100, skip: Int = 0, orderBy: {entity.name}_orderBy, "
+            f"orderDirection: OrderDirection, where: {entity.name}_filter): [{entity.name}!]!"
+        )
+    lines.append("type Query {\n" + "\n".join(query_fields) + "\n}")
+    return build_schema("\n\n".join(lines))
+
+
+def _comparable(value):
+    if isinstance(value, dict):
+        return value.get("id")
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return value.lower()
+    return value
+
+
+def _matches(row: Dict[str, Any], where: Dict[str, Any]) -> bool:
+    for key, expected in where.items():
+        name, op = key, "eq"
+        for candidate in FILTER_OPERATORS:
+            if key.endswith(f"_{candidate}") and key[: -len(candidate) - 1] in row:
+                name, op = key[: -len(candidate) - 1], candidate
+                break
+        actual = _comparable(row.get(name))
+        if op in ("in", "not_in"):
+            contained = actual in {_comparable(v) for v in expected}
+            if contained != (op == "in"):
+                return False
+            continue
+        expected = _comparable(expected)
+        if actual is None:
+            return False
+        if op == "eq" and actual != expected or op == "not" and actual == expected:
+            return False
+        if op in ("gt", "lt", "gte", "lte"):
+            try:
+                ok = {"gt": actual > expected, "lt": actual < expected, "gte": actual >= expected, "lte": actual <= expected}[op]
+            except TypeError:
+                return False
+            if not ok:
+                return False
+        if op == "contains" and str(expected) not in str(actual):
+            return False
+        if op == "starts_with" and not str(actual).startswith(str(expected)):
+            return False
+    return True
+
+
+class StubSubgraph:
+    """
+    Answers GraphQL queries from fixture entities, graph-node style filtering,
+    ordering and first/skip included, or from recorded responses keyed by the
+    normalized query.
+    """
+
+    def __init__(self, entities: Dict[str, List[Dict[str, Any]]], responses: Optional[Dict[str, Any]] = None):
+        self.normalize = normalize_query
+        self.entities = entities
+        self.responses = responses or {}
+        self.schema = subgraph_query_schema()
+        self.by_id = {name: {row["id"]: row for row in rows} for name, rows in entities.items()}
+        for field_name, field in self.schema.query_type.fields.items():
+            field.resolve = self._resolver(field_name)
+
+    def _resolver(self, field_name: str) -> Callable:
+        def resolve(_, info, id=None, first=100, skip=0, orderBy=None, orderDirection=None, where=None):
+            if id is not None:
+                return self.by_id.get(plural_field_name(field_name), {}).get(id.lower())
+            rows = [row for row in self.entities.get(field_name, []) if _matches(row, where or {})]
+            key = orderBy or "id"
+            rows.sort(key=lambda r: (_comparable(r.get(key)) is None, _comparable(r.get(key)) or 0), reverse=orderDirection == "desc")
+            return rows[skip:skip + min(first, 1000)]
+
+        return resolve
+
+    def execute(self, query: str, variables: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        try:
+            recorded = self.responses.get(self.normalize(query))
+        except Exception:
+            recorded = None
+        if recorded is not None:
+            return {"data": recorded}
+        result = graphql_sync(self.schema, query, variable_values=variables)
+        response = {"data": result.data}
+        if result.errors:
+            response["errors"] = [{"message": str(e)} for e in result.errors]
+        return response
+
+
+class StubServer:
+    """
+    Local HTTP server on a free port answering POST requests with a handler,
+    recording the latency and bytes of each request.
+    """
+
+    def __init__(self, name: str, handler: Callable[[Dict[str, Any]], Tuple[int, Dict[str, Any]]], latency_ms: float = 0):
+        self.name = name
+        self.timings: List[float] = []
+        self.bytes_sent = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                started = time.perf_counter()
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                if latency_ms:
+                    time.sleep(latency_ms / 1000)
+                status, payload = handler(body)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                server.timings.append(time.perf_counter() - started)
+                server.bytes_sent += len(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name=f"stub-{name}", daemon=True)
+
+    def __enter__(self) -> "StubServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def route_handler(entities: Dict[str, List[Dict[str, Any]]], recorded: Optional[Dict[str, Any]] = None):
+    """
+    Enso route API stand-in, recorded routes keyed "tokenIn:tokenOut:amountIn"
+    first, otherwise quoted from the fixture pools with the local router.
+    """
+    from local_router import PoolGraph
+
+    graph = PoolGraph(entities["pools"])
+    recorded = recorded or {}
+
+    def handle(body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        token_in, token_out, amount_in = body["tokenIn"][0].lower(), body["tokenOut"][0].lower(), body["amountIn"][0]
+        key = f"{token_in}:{token_out}:{amount_in}"
+        if key in recorded:
+            return 200, recorded[key]
+        routes = graph.search(token_in, token_out, int(amount_in))
+        if not routes:
+            return 400, {"message": "no route found"}
+        route = graph.to_enso_format(routes[0])
+        route.update({"source": "enso", "gas": str(120000 * len(routes[0].pools)), "tx": {"to": body["fromAddress"], "data": "0x"}})
+        return 200, route
+
+    return handle
+
+
+# ---- fixtures ----
+
+TOKEN_PRICES = {"WETH": 3000.0, "USDC": 1.0, "USDT": 1.0, "DAI": 1.0, "WBTC": 60000.0, "PEPE": 0.00001, "UNI": 8.0, "LINK": 15.0}
+TOKEN_DECIMALS = {"USDC": 6, "USDT": 6, "WBTC": 8}
+TICK_SPACINGS = {100: 1, 500: 10, 3000: 60, 10000: 200}
+
+
+def _address(rng: random.Random) -> str:
+    return "0x" + "".join(rng.choice("0123456789abcdef") for _ in range(40))
+
+
+def generate_fixtures(seed: int = FIXTURE_SEED, filler_tokens: int = 100, pools: int = 300, days: int = 365) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Deterministic Uniswap v3 like entities: tokens, pools with consistent
+    prices, ticks and liquidity, day and hour data, swaps and the ETH bundle.
+    """
+    rng = random.Random(seed)
+    now = int(time.time()) // DAY * DAY
+
+    tokens = []
+    symbols = list(TOKEN_PRICES) + [f"TK{i}" for i in range(filler_tokens)]
+    for symbol in symbols:
+        price = TOKEN_PRICES.get(symbol, round(rng.uniform(0.01, 50), 4))
+        tokens.append({
+            "id": _address(rng), "symbol": symbol, "name": f"{symbol} Token", "decimals": str(TOKEN_DECIMALS.get(symbol, 18)),
+            "priceUSD": price, "derivedETH": str(price / TOKEN_PRICES["WETH"]), "txCount": str(rng.randint(1000, 10 ** 6)),
+            "poolCount": "0", "volumeUSD": "0", "feesUSD": "0", "totalValueLockedUSD": "0", "totalSupply": str(10 ** 27),
+        })
+    majors = tokens[:len(TOKEN_PRICES)]
+
+    pool_rows, tick_rows = [], []
+    pairs = set()
+    while len(pool_rows) < pools:
+        t0 = rng.choice(majors) if len(pool_rows) < pools // 2 else rng.choice(tokens)
+        t1 = rng.choice(majors)
+        fee = rng.choice(list(TICK_SPACINGS))
+        if t0 is t1 or (t0["id"], t1["id"], fee) in pairs:
+            continue
+        if t0["id"] > t1["id"]:
+            t0, t1 = t1, t0
+        pairs.add((t0["id"], t1["id"], fee))
+        d0, d1 = int(t0["decimals"]), int(t1["decimals"])
+        raw_price = t0["priceUSD"] / t1["priceUSD"] * 10 ** (d1 - d0)
+        tick = math.floor(math.log(raw_price) / math.log(1.0001))
+        sqrt_price = int(math.sqrt(raw_price) * Q96)
+        tvl = 10 ** rng.uniform(4, 8.5)
+        # Liquidity whose virtual token1 reserve is worth half the TVL, split over positions around the price
+        total_liquidity = int(tvl / 2 / t1["priceUSD"] * 10 ** d1 / (sqrt_price / Q96))
+        spacing = TICK_SPACINGS[fee]
+        pool_id = _address(rng)
+        nets: Dict[int, int] = {}
+        active = 0
+        for _ in range(rng.randint(5, 15)):
+            width = spacing * rng.randint(5, 400)
+            lower = (tick - rng.randint(0, width)) // spacing * spacing
+            upper = lower + width
+            amount = max(1, total_liquidity // rng.randint(2, 10))
+            nets[lower] = nets.get(lower, 0) + amount
+            nets[upper] = nets.get(upper, 0) - amount
+            if lower <= tick < upper:
+                active += amount
+        volume = tvl * rng.uniform(0.05, 3) * 365
+        pool = {
+            "id": pool_id, "feeTier": str(fee), "liquidity": str(active), "sqrtPrice": str(sqrt_price), "tick": str(tick),
+            "token0": t0, "token1": t1, "token0Price": str(1 / raw_price * 10 ** (d1 - d0)),
+            "token1Price": str(raw_price / 10 ** (d1 - d0)), "totalValueLockedUSD": f"{tvl:.2f}",
+            "volumeUSD": f"{volume:.2f}", "feesUSD": f"{volume * fee / 1e6:.2f}", "txCount": str(rng.randint(100, 10 ** 6)),
+            "createdAtTimestamp": str(now - rng.randint(30, 900) * DAY), "liquidityProviderCount": str(rng.randint(1, 5000)),
+        }
+        pool_rows.append(pool)
+        for tick_idx, net in sorted(nets.items()):
+            if net:
+                tick_rows.append({
+                    "id": f"{pool_id}#{tick_idx}", "pool": pool, "poolAddress": pool_id, "tickIdx": str(tick_idx),
+                    "liquidityNet": str(net), "liquidityGross": str(abs(net)),
+                    "price0": str(float(sqrt_ratio_at_tick(tick_idx)) ** 2 / Q96 ** 2),
+                })
+        for token, side_tvl in ((t0, tvl / 2), (t1, tvl / 2)):
+            token["totalValueLockedUSD"] = f"{float(token['totalValueLockedUSD']) + side_tvl:.2f}"
+            token["volumeUSD"] = f"{float(token['volumeUSD']) + volume / 2:.2f}"
+            token["poolCount"] = str(int(token["poolCount"]) + 1)
+
+    ranked = sorted(pool_rows, key=lambda p: float(p["totalValueLockedUSD"]), reverse=True)
+    pool_days, pool_hours, swaps = [], [], []
+    for pool in ranked[:30]:
+        tvl, volume = float(pool["totalValueLockedUSD"]), float(pool["volumeUSD"]) / 365
+        for i in range(days):
+            date = now - (days - 1 - i) * DAY
+            day_volume = volume * rng.uniform(0.3, 1.7)
+            pool_days.append({
+                "id": f"{pool['id']}-{date // DAY}", "date": date, "pool": pool, "tvlUSD": f"{tvl * rng.uniform(0.8, 1.2):.2f}",
+                "volumeUSD": f"{day_volume:.2f}", "feesUSD": f"{day_volume * int(pool['feeTier']) / 1e6:.2f}",
+                "txCount": str(rng.randint(10, 5000)), "liquidity": pool["liquidity"], "sqrtPrice": pool["sqrtPrice"],
+                "token0Price": pool["token0Price"], "token1Price": pool["token1Price"],
+            })
+    for pool in ranked[:10]:
+        for i in range(72):
+            start = now - (71 - i) * 3600
+            pool_hours.append({
+                "id": f"{pool['id']}-{start // 3600}", "periodStartUnix": start, "pool": pool,
+                "tvlUSD": pool["totalValueLockedUSD"], "volumeUSD": f"{float(pool['volumeUSD']) / 8760 * rng.uniform(0.2, 2):.2f}",
+            })
+        for i in range(300):
+            amount_usd = 10 ** rng.uniform(1, 6)
+            swaps.append({
+                "id": f"{pool['id']}-swap-{i}", "pool": pool, "token0": pool["token0"], "token1": pool["token1"],
+                "timestamp": str(now - rng.randint(0, 7 * DAY)), "amountUSD": f"{amount_usd:.2f}",
+                "amount0": f"{amount_usd / pool['token0']['priceUSD']:.6f}", "amount1": f"{-amount_usd / pool['token1']['priceUSD']:.6f}",
+                "sender": _address(rng), "recipient": _address(rng), "origin": _address(rng),
+            })
+    token_days = []
+    for token in majors:
+        for i in range(days):
+            date = now - (days - 1 - i) * DAY
+            price = token["priceUSD"] * math.exp(rng.gauss(0, 0.03) * math.sqrt(days - i) / 4)
+            token_days.append({
+                "id": f"{token['id']}-{date // DAY}", "date": date, "token": token, "priceUSD": f"{price:.10g}",
+                "volumeUSD": f"{float(token['volumeUSD']) / 365 * rng.uniform(0.3, 1.7):.2f}",
+                "totalValueLockedUSD": token["totalValueLockedUSD"], "feesUSD": "0",
+                "open": f"{price:.10g}", "high": f"{price * 1.02:.10g}", "low": f"{price * 0.98:.10g}", "close": f"{price:.10g}",
+            })
+    return {
+        "tokens": tokens, "pools": pool_rows, "ticks": tick_rows, "poolDayDatas": pool_days, "poolHourDatas": pool_hours,
+        "tokenDayDatas": token_days, "swaps": swaps,
+        "bundles": [{"id": "1", "ethPriceUSD": str(TOKEN_PRICES["WETH"])}],
+    }
+
+
+def _reference_ids(entities: Dict[str, List[Dict[str, Any]]]) -> Dict[str, List[Dict[str, Any]]]:
+    # Nested entities are stored by id on disk and linked again on load
+    flat = {}
+    for name, rows in entities.items():
+        flat[name] = [{k: ({"@ref": v["id"]} if isinstance(v, dict) else v) for k, v in row.items()} for row in rows]
+    return flat
+
+
+def _link(entities: Dict[str, List[Dict[str, Any]]]) -> Dict[str, List[Dict[str, Any]]]:
+    by_id = {row["id"]: row for rows in entities.values() for row in rows}
+    for rows in entities.values():
+        for row in rows:
+            for k, v in row.items():
+                if isinstance(v, dict) and "@ref" in v:
+                    row[k] = by_id[v["@ref"]]
+    return entities
+
+
+def save_fixtures(directory: Path, entities: Dict[str, List[Dict[str, Any]]]) -> None:
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / "entities.json", "w", encoding="utf-8") as f:
+        json.dump(_reference_ids(entities), f)
+    for name in ("responses.json", "routes.json"):
+        if not (directory / name).exists():
+            (directory / name).write_text("{}", encoding="utf-8")
+
+
+def load_fixtures(directory: Optional[Path]) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, Any], Dict[str, Any]]:
+    """
+    Loads entities.json, responses.json (normalized query -> response data) and
+    routes.json ("tokenIn:tokenOut:amountIn" -> route response) of a fixture
+    directory, generating the entities when there is no directory.
+    """
+    if directory is None:
+        return generate_fixtures(), {}, {}
+
+    def read(name):
+        path = directory / name
+        return json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+
+    return _link(read("entities.json")) or generate_fixtures(), read("responses.json"), read("routes.json")
+
+
+# ---- scripted model ----
+
+def scenarios(entities: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Representative questions and the tool calls the scripted model makes for
+    each, one list of calls per model turn. The final turn returns the report.
+    """
+    tokens = {t["symbol"]: t for t in entities["tokens"]}
+    weth, usdc, pepe = tokens["WETH"]["id"], tokens["USDC"]["id"], tokens["PEPE"]["id"]
+    day_pools = {row["pool"]["id"]: row["pool"] for row in entities["poolDayDatas"]}
+    history_pool = next(iter(day_pools.values()))
+    impact_pool = next(p for p in entities["pools"] if weth in (p["token0"]["id"], p["token1"]["id"]))
+
+    return [
+        {
+            "name": "pool_discovery",
+            "question": "Which are the top WETH pools by TVL and how concentrated is WETH liquidity?",
+            "turns": [
+                [("query_local_index", {"sql": "SELECT id, token0_symbol, token1_symbol, fee_tier, tvl_usd FROM pools "
+                                               "WHERE token0_symbol = 'WETH' OR token1_symbol = 'WETH' ORDER BY tvl_usd DESC LIMIT 20"})],
+                [("query_liquidity_data", {"query": '{ pools(first: 200, orderBy: totalValueLockedUSD, orderDirection: desc, '
+                                                    f'where: {{token0: "{weth}"}}) {{ id feeTier totalValueLockedUSD volumeUSD feesUSD '
+                                                    'token0 { symbol } token1 { symbol } } }',
+                                           "output_file": "weth_pools.parquet"})],
+                [("liquidity_metrics", {"file_names": ["weth_pools.parquet"]}),
+                 ("metric_calculator", {"code": "df = datasets['weth_pools']\n"
+                                                "print(tabulate(df.nlargest(5, 'totalValueLockedUSD'), headers='keys'))"})],
+            ],
+            "result": {"csv_path": "weth_pools.parquet"},
+        },
+        {
+            "name": "pool_history",
+            "question": f"Daily volume and fee APR of pool {history_pool['id']} over the last year",
+            "turns": [
+                [("query_liquidity_data", {"query": '{ poolDayDatas(first: 365, orderBy: date, orderDirection: desc, '
+                                                    f'where: {{pool: "{history_pool["id"]}"}}) {{ date tvlUSD volumeUSD feesUSD }} }}',
+                                           "output_file": "pool_days.parquet"})],
+                [("get_column_list", {"file_name": "pool_days.parquet"}),
+                 ("liquidity_metrics", {"file_names": ["pool_days.parquet"]})],
+                [("graph_generator", {"code": "df = datasets['pool_days']\n"
+                                              "fig = px.line(df.sort_values('date'), x='date', y='volumeUSD')\n"
+                                              "fig.write_html('volume.html')\nfig.write_image('volume.png')"})],
+            ],
+            "result": {"csv_path": "pool_days.parquet", "html_path": ["volume.html"], "png_path": ["volume.png"]},
+        },
+        {
+            "name": "token_comparison",
+            "question": "Compare the TVL, volume and volatility of WETH, PEPE and UNI over the last 90 days",
+            "turns": [
+                [("query_liquidity_data_batch", {"queries": [
+                    {"name": f"{symbol.lower()}_days",
+                     "query": '{ tokenDayDatas(first: 90, orderBy: date, orderDirection: desc, '
+                              f'where: {{token: "{tokens[symbol]["id"]}"}}) {{ date priceUSD volumeUSD totalValueLockedUSD token {{ symbol }} }} }}'}
+                    for symbol in ("WETH", "PEPE", "UNI")
+                ]})],
+                [("liquidity_metrics", {"file_names": ["weth_days.parquet", "pepe_days.parquet", "uni_days.parquet"]})],
+            ],
+            "result": {"csv_path": "weth_days.parquet"},
+        },
+        {
+            "name": "swap_route",
+            "question": "Best route to swap 1, 10 and 100 WETH into USDC and the price impact of selling WETH",
+            "turns": [
+                [("resolve_token", {"token": "PEPE"}),
+                 ("get_route_size_table", {"token_in": weth, "token_out": usdc,
+                                           "amounts_in": [str(10 ** 18), str(10 ** 19), str(10 ** 20)]})],
+                [("get_transaction_route", {"token_in": weth, "token_out": pepe, "output_file": "transaction_route.json"}),
+                 ("price_impact", {"pool_id": impact_pool["id"], "token_in": "WETH", "amounts": [1, 10, 100, 1000],
+                                   "output_file": "impact.parquet"})],
+            ],
+            "result": {"enso_route_file": "transaction_route.json"},
+        },
+    ]
+
+
+def scripted_model(scenario: Dict[str, Any]):
+    """
+    FunctionModel playing the tool calls of a scenario turn by turn, then the final result.
+    """
+    from pydantic_ai.messages import ModelResponse, ToolCallPart
+    from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+    def play(messages, info: AgentInfo) -> ModelResponse:
+        turn = sum(isinstance(m, ModelResponse) for m in messages)
+        if turn < len(scenario["turns"]):
+            return ModelResponse(parts=[ToolCallPart(name, args) for name, args in scenario["turns"][turn]])
+        output_tools = getattr(info, "output_tools", None) or getattr(info, "result_tools", None)
+        result = {
+            "markdown_report": f"# {scenario['question']}\n\nScripted report of the offline benchmark.",
+            "csv_path": "", "metrics_dict": "", "html_path": [], "png_path": [], "pdf_path": "report.pdf",
+            "enso_route": "", "enso_route_file": "",
+            **scenario["result"],
+        }
+        return ModelResponse(parts=[ToolCallPart(output_tools[0].name, result)])
+
+    return FunctionModel(play)
+
+
+# ---- measurement ----
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * q
+    low, high = math.floor(position), math.ceil(position)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def _written_bytes() -> Optional[int]:
+    # Bytes written by this process through write calls, Linux only
+    try:
+        with open("/proc/self/io", encoding="utf-8") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith("wchar"))
+    except (OSError, StopIteration):
+        return None
+
+
+def _directory_bytes(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def _peak_rss_mb() -> Tuple[float, float]:
+    if resource is None:
+        return 0.0, 0.0
+    # ru_maxrss is in kilobytes on Linux
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return own, children
+
+
+def summarize(samples: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    return {
+        stage: {"count": len(values), "p50": _percentile(values, 0.5), "p95": _percentile(values, 0.95), "total": sum(values)}
+        for stage, values in sorted(samples.items())
+    }
+
+
+def compare(stages: Dict[str, Dict[str, float]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Stages whose p95 grew by more than tolerance over the baseline.
+    """
+    regressions = []
+    for stage, stats in stages.items():
+        before = baseline.get("stages", {}).get(stage)
+        # Sub millisecond stages are too noisy to compare
+        if before and before["p95"] > 0.001 and stats["p95"] > before["p95"] * (1 + tolerance):
+            regressions.append(f"{stage}: p95 {before['p95'] * 1000:.1f}ms -> {stats['p95'] * 1000:.1f}ms")
+    return regressions
+
+
+def fixture_source(directory: Optional[str]) -> str:
+    """
+    "synthetic" for generated fixtures, otherwise the fixture directory.
+    """
+    if directory and (Path(directory) / "entities.json").exists():
+        return str(Path(directory).resolve())
+    return "synthetic"
+
+
+def run_benchmark(args) -> Dict[str, Any]:
+    entities, responses, routes = load_fixtures(Path(args.fixtures) if args.fixtures else None)
+    subgraph = StubSubgraph(entities, responses)
+    work_dir = Path(tempfile.mkdtemp(prefix="pool-sweeper-bench-"))
+
+    with StubServer("subgraph", lambda body: (200, subgraph.execute(body.get("query", ""), body.get("variables"))),
+                    args.latency_ms) as subgraph_server, \
+            StubServer("routes", route_handler(entities, routes), args.latency_ms) as route_server:
+        # Every cache and workspace of the run lives in the scratch directory
+        os.environ.update({
+            "GRAPHQL_ENDPOINT": subgraph_server.url,
+            "ENSO_API_URL": route_server.url,
+            "ENSO_API_KEY": "offline",
+            "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY") or "offline",
+            "ANSWER_CACHE_TTL": "0",
+            "CHART_BACKGROUND_RENDER": "0",
+            "METRICS_LOG": str(work_dir / "metrics.jsonl"),
+        })
+        os.chdir(work_dir)
+        sys.path.insert(0, str(PACKAGE_DIR))
+
+        written_before = _written_bytes()
+        try:
+            import agent_module
+        except ImportError as e:
+            raise SystemExit(f"The agent dependencies are not installed: {e}")
+        from instrumentation import timed_model
+
+        samples: Dict[str, List[float]] = {}
+        scenario_list = [s for s in scenarios(entities) if not args.scenario or s["name"] in args.scenario]
+        for scenario in scenario_list:
+            with agent_module.agent.override(model=timed_model(scripted_model(scenario))):
+                for run in range(args.runs):
+                    started = time.perf_counter()
+                    agent_module.run_agent(scenario["question"], use_cache=False)
+                    label = "cold" if run == 0 else "warm"
+                    samples.setdefault(f"scenario:{scenario['name']}:{label}", []).append(time.perf_counter() - started)
+                    print(f"{scenario['name']} run {run + 1}: {time.perf_counter() - started:.2f}s")
+
+        try:
+            from tool_lib import QueryRunner
+        except ImportError as e:
+            print(f"QueryRunner stage skipped: {e}")
+        else:
+            scenario = scenario_list[0] if scenario_list else scenarios(entities)[0]
+            with agent_module.agent.override(model=timed_model(scripted_model(scenario))):
+                for _ in range(args.runs):
+                    started = time.perf_counter()
+                    QueryRunner().run(None, scenario["question"])
+                    samples.setdefault("query_runner", []).append(time.perf_counter() - started)
+
+        from code_sandbox import sandbox_pool
+        from chart_render import chart_pool
+
+        sandbox_pool.close()
+        chart_pool.close()
+        written_after = _written_bytes()
+
+    with open(work_dir / "metrics.jsonl", encoding="utf-8") as f:
+        for line in f:
+            event = json.loads(line)
+            if "seconds" not in event:
+                continue
+            stage = event["event"] + (f":{event['tool']}" if "tool" in event else "")
+            if event.get("outcome") == "error":
+                stage += ":error"
+            samples.setdefault(stage, []).append(event["seconds"])
+    samples["stub:subgraph_request"] = subgraph_server.timings
+    samples["stub:route_request"] = route_server.timings
+
+    own_rss, children_rss = _peak_rss_mb()
+    return {
+        "runs": args.runs,
+        "fixtures": fixture_source(args.fixtures),
+        "stages": summarize(samples),
+        "peak_rss_mb": round(own_rss, 1),
+        "peak_rss_children_mb": round(children_rss, 1),
+        "bytes_written": (written_after - written_before) if written_before is not None else None,
+        "disk_bytes": _directory_bytes(work_dir),
+        "subgraph_bytes_sent": subgraph_server.bytes_sent,
+        "work_dir": str(work_dir),
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    width = max(len(stage) for stage in report["stages"]) if report["stages"] else 10
+    print(f"\n{'stage':<{width}}  {'count':>5}  {'p50 ms':>9}  {'p95 ms':>9}  {'total s':>8}")
+    for stage, stats in report["stages"].items():
+        print(f"{stage:<{width}}  {stats['count']:>5}  {stats['p50'] * 1000:>9.1f}  {stats['p95'] * 1000:>9.1f}  {stats['total']:>8.2f}")
+    print(f"\npeak RSS: {report['peak_rss_mb']} MB (workers {report['peak_rss_children_mb']} MB)")
+    if report["bytes_written"] is not None:
+        print(f"bytes written: {report['bytes_written']:,}")
+    print(f"files on disk: {report['disk_bytes']:,} bytes in {report['work_dir']}")
+    print(f"subgraph responses: {report['subgraph_bytes_sent']:,} bytes")
+    if report["fixtures"] == "synthetic":
+        print("fixtures: synthetic, use the latencies to compare builds, not as production figures")
+    else:
+        print(f"fixtures: {report['fixtures']}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline end to end benchmark of the agent pipeline")
+    parser.add_argument("--runs", type=int, default=3, help="runs per scenario, the first one is cold")
+    parser.add_argument("--scenario", action="append", help="only run these scenarios")
+    parser.add_argument("--fixtures", help="directory with entities.json, responses.json and routes.json")
+    parser.add_argument("--save-fixtures", help="write the generated fixtures to this directory and exit")
+    parser.add_argument("--latency-ms", type=float, default=0, help="added latency of each stub response")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="report of an earlier run to compare p95 latencies with")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(PACKAGE_DIR))
+    if args.save_fixtures:
+        save_fixtures(Path(args.save_fixtures), generate_fixtures())
+        print(f"Fixtures written to {args.save_fixtures}")
+        return 0
+
+    json_path = Path(args.json).resolve() if args.json else None
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8")) if args.baseline else None
+    report = run_benchmark(args)
+    print_report(report)
+    if json_path:
+        json_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    if baseline is not None:
+        if baseline.get("fixtures", "synthetic") != report["fixtures"]:
+            print(f"Baseline ran on other fixtures ({baseline.get('fixtures', 'synthetic')}), not compared")
+            return 1
+        regressions = compare(report["stages"], baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,293 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from graphql import (
+    parse,
+    print_ast,
+    FieldNode,
+    ListValueNode,
+    ObjectValueNode,
+    OperationDefinitionNode,
+    SelectionSetNode,
+    IntValueNode,
+    StringValueNode,
+)
+
+from query_pagination import replace_node
+
+
+QUERY_CACHE_DIR = Path(os.getenv("QUERY_CACHE_DIR", ".cache/query_results"))
+# Total size of cached datasets before least recently used entries are evicted, 0 disables the cache
+QUERY_CACHE_MAX_BYTES = int(os.getenv("QUERY_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+DEFAULT_TTL = 300
+# TTL in seconds per root field, live state expires quickly, aggregates slower
+ENTITY_TTLS = {
+    "bundle": 60, "bundles": 60,
+    "pool": 60, "pools": 60,
+    "tick": 60, "ticks": 60,
+    "token": 300, "tokens": 300,
+    "factory": 600, "factories": 600,
+    "swaps": 120, "mints": 120, "burns": 120, "collects": 120, "flashes": 120, "transactions": 120,
+    "poolHourDatas": 600, "tokenHourDatas": 600,
+    "poolDayDatas": 3600, "tokenDayDatas": 3600, "uniswapDayDatas": 3600,
+}
+# Periods that are fully in the past never change
+CLOSED_PERIOD_TTL = 7 * 24 * 60 * 60
+
+# Length of one period per time field, used to decide if a range is closed
+TIME_FIELD_PERIODS = {"date": 86400, "periodStartUnix": 3600, "timestamp": 1}
+# Events younger than this may still be re-indexed after a reorg
+FINALITY_MARGIN = 3600
+
+
+def _sort_value(node):
+    # Object fields and nested values are ordered by name so argument order does not matter
+    if isinstance(node, ObjectValueNode):
+        fields = sorted(
+            (replace_node(f, value=_sort_value(f.value)) for f in node.fields),
+            key=lambda f: f.name.value,
+        )
+        return replace_node(node, fields=tuple(fields))
+    if isinstance(node, ListValueNode):
+        return replace_node(node, values=tuple(_sort_value(v) for v in node.values))
+    return node
+
+
+def _sort_selection_set(selection_set: Optional[SelectionSetNode]) -> Optional[SelectionSetNode]:
+    if selection_set is None:
+        return None
+    selections = []
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            arguments = sorted(
+                (replace_node(a, value=_sort_value(a.value)) for a in selection.arguments or ()),
+                key=lambda a: a.name.value,
+            )
+            selection = replace_node(
+                selection,
+                arguments=tuple(arguments),
+                selection_set=_sort_selection_set(selection.selection_set),
+            )
+        selections.append(selection)
+    return replace_node(selection_set, selections=tuple(selections))
+
+
+def normalize_query(query: str) -> str:
+    """
+    Returns a canonical form of a query: whitespace, comments, argument order
+    and input object field order do not change the result.
+    """
+    document = parse(query)
+    definitions = tuple(
+        replace_node(d, selection_set=_sort_selection_set(d.selection_set)) if hasattr(d, "selection_set") else d
+        for d in document.definitions
+    )
+    return print_ast(replace_node(document, definitions=definitions))
+
+
+def _literal_value(node) -> Optional[float]:
+    if isinstance(node, (IntValueNode, StringValueNode)):
+        try:
+            return float(node.value)
+        except ValueError:
+            return None
+    return None
+
+
+def query_ttl(query: str, now: Optional[float] = None) -> int:
+    """
+    Returns how long the result of a query may be cached, based on the queried
+    entity and on whether the requested time range is already closed.
+    """
+    now = now if now is not None else time.time()
+    document = parse(query)
+    operation = next(d for d in document.definitions if isinstance(d, OperationDefinitionNode))
+    root = next(s for s in operation.selection_set.selections if isinstance(s, FieldNode))
+    ttl = ENTITY_TTLS.get(root.name.value, DEFAULT_TTL)
+
+    where = next((a.value for a in root.arguments or () if a.name.value == "where"), None)
+    if not isinstance(where, ObjectValueNode):
+        return ttl
+
+    for where_field in where.fields:
+        name = where_field.name.value
+        for time_field, period in TIME_FIELD_PERIODS.items():
+            if name not in (f"{time_field}_lt", f"{time_field}_lte"):
+                continue
+            bound = _literal_value(where_field.value)
+            if bound is None:
+                continue
+            range_end = bound if name.endswith("_lt") else bound + period
+            open_period_start = (now // period) * period if period > 1 else now - FINALITY_MARGIN
+            if range_end <= open_period_start:
+                return CLOSED_PERIOD_TTL
+    return ttl
+
+
+@dataclass
+class CacheEntry:
+    key: str
+    dataset: str
+    message: str
+    created_at: float
+    ttl: int
+
+    @property
+    def expired(self) -> bool:
+        return time.time() - self.created_at > self.ttl
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    stores: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class QueryCache:
+    """
+    Content-addressed disk cache of query datasets. Entries are keyed on the
+    normalized query plus endpoint and evicted least recently used first once
+    the cache grows over its size budget.
+    """
+
+    def __init__(self, cache_dir: Union[str, Path] = QUERY_CACHE_DIR, max_bytes: int = QUERY_CACHE_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key(query: str, endpoint: str, variables: Optional[Dict[str, Any]] = None) -> str:
+        payload = "\n".join([
+            endpoint,
+            normalize_query(query),
+            json.dumps(variables or {}, sort_keys=True, separators=(",", ":")),
+        ])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _paths(self, key: str):
+        return self.cache_dir / f"{key}.parquet", self.cache_dir / f"{key}.json"
+
+    def get(self, query: str, endpoint: str, variables: Optional[Dict[str, Any]] = None) -> Optional[CacheEntry]:
+        """
+        Returns the cached entry of a query, None on a miss or when expired.
+        """
+        if not self.enabled:
+            return None
+        key = self.key(query, endpoint, variables)
+        dataset_file, meta_file = self._paths(key)
+        with self._lock:
+            try:
+                with meta_file.open("r", encoding="utf-8") as f:
+                    entry = CacheEntry(**json.load(f))
+            except (OSError, json.JSONDecodeError, TypeError):
+                self.stats.misses += 1
+                return None
+
+            if entry.expired or not dataset_file.is_file():
+                self.stats.expired += 1
+                self.stats.misses += 1
+                self._remove(key)
+                return None
+
+            # Access time drives LRU eviction
+            now = time.time()
+            os.utime(meta_file, (now, now))
+            self.stats.hits += 1
+            return entry
+
+    def put(
+        self,
+        query: str,
+        endpoint: str,
+        dataset_file: Union[str, Path],
+        message: str,
+        variables: Optional[Dict[str, Any]] = None,
+    ) -> Optional[CacheEntry]:
+        """
+        Copies a dataset into the cache together with the message it was reported with.
+        """
+        if not self.enabled:
+            return None
+        key = self.key(query, endpoint, variables)
+        cached_dataset, meta_file = self._paths(key)
+        entry = CacheEntry(
+            key=key,
+            dataset=str(cached_dataset),
+            message=message,
+            created_at=time.time(),
+            ttl=query_ttl(query),
+        )
+        with self._lock:
+            try:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(dataset_file, cached_dataset)
+                with meta_file.open("w", encoding="utf-8") as f:
+                    json.dump(asdict(entry), f)
+            except OSError as e:
+                print(f"Could not cache query result: {e}")
+                self._remove(key)
+                return None
+            self.stats.stores += 1
+            self._evict()
+        return entry
+
+    def _remove(self, key: str) -> None:
+        for path in self._paths(key):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _evict(self) -> None:
+        entries = []
+        total = 0
+        for meta_file in self.cache_dir.glob("*.json"):
+            dataset_file = meta_file.with_suffix(".parquet")
+            try:
+                size = dataset_file.stat().st_size + meta_file.stat().st_size
+                last_used = meta_file.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            entries.append((last_used, meta_file.stem, size))
+            total += size
+
+        for _, key, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(key)
+            total -= size
+            self.stats.evictions += 1
+
+    def size_bytes(self) -> int:
+        return sum(path.stat().st_size for path in self.cache_dir.glob("*") if path.is_file())
+
+    def report(self) -> str:
+        s = self.stats
+        return (
+            f"query cache hits: {s.hits}, misses: {s.misses}, expired: {s.expired}, "
+            f"stores: {s.stores}, evictions: {s.evictions}, hit rate: {s.hit_rate:.0%}"
+        )
+
+
+query_cache = QueryCache()
@@ -0,0 +1,363 @@
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional
+
+import pandas as pd
+from graphql import (
+    parse,
+    print_ast,
+    ArgumentNode,
+    EnumValueNode,
+    FieldNode,
+    IntValueNode,
+    NameNode,
+    ObjectFieldNode,
+    ObjectValueNode,
+    OperationDefinitionNode,
+    SelectionSetNode,
+    StringValueNode,
+    GraphQLList,
+    get_nullable_type,
+)
+
+
+# The Graph caps `first` at 1000 and `skip` at 5000
+PAGE_SIZE = int(os.getenv("SUBGRAPH_PAGE_SIZE", "1000"))
+MAX_SKIP = 5000
+# Hard stop so an unbounded query cannot fill the disk
+MAX_ROWS = int(os.getenv("SUBGRAPH_MAX_ROWS", "500000"))
+
+# Fields that are monotonic in time and can be used as a cursor
+TIME_CURSOR_FIELDS = ("timestamp", "date", "periodStartUnix", "createdAtTimestamp")
+
+
+def _name(value: str) -> NameNode:
+    return NameNode(value=value)
+
+
+def _literal(value: Any):
+    if isinstance(value, int) and not isinstance(value, bool):
+        return IntValueNode(value=str(value))
+    return StringValueNode(value=str(value))
+
+
+def _argument(name: str, value) -> ArgumentNode:
+    return ArgumentNode(name=_name(name), value=value)
+
+
+def replace_node(node, **changes):
+    """
+    Returns a copy of an AST node with some attributes changed,
+    nodes are immutable in recent graphql-core versions.
+    """
+    values = {key: getattr(node, key, None) for key in node.keys if key != "loc"}
+    values.update(changes)
+    return type(node)(**values)
+
+
+@dataclass
+class PaginationStats:
+    rows: int = 0
+    pages: int = 0
+    mode: str = "single"
+    truncated: bool = False
+    started_at: float = field(default_factory=time.perf_counter)
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+    def report(self) -> str:
+        report = (
+            f"rows: {self.rows}, pages: {self.pages}, pagination: {self.mode}, "
+            f"time: {self.elapsed:.2f}s, throughput: {self.rows_per_second:.0f} rows/s"
+        )
+        if self.truncated:
+            report += f"\n WARNING: result truncated at {self.rows} rows, narrow the query filters"
+        return report
+
+
+class PagedQuery:
+    """
+    Rewrites the first top-level list field of a GraphQL query into cursor pages.
+
+    The cursor depends on the requested order:
+    - no orderBy or orderBy: id -> `id_gt` / `id_lt` cursor
+    - orderBy on a time field -> `<field>_gte` / `<field>_lte` cursor, boundary rows de-duplicated by id
+    - any other orderBy -> `skip` pages, limited to what the subgraph allows
+    """
+
+    def __init__(self, query: str, schema=None):
+        self.document = parse(query)
+        self.operation = next(
+            definition for definition in self.document.definitions
+            if isinstance(definition, OperationDefinitionNode)
+        )
+        self.field: FieldNode = next(
+            selection for selection in self.operation.selection_set.selections
+            if isinstance(selection, FieldNode)
+        )
+        self.response_key = (self.field.alias or self.field.name).value
+
+        arguments = {argument.name.value: argument.value for argument in self.field.arguments or ()}
+        first = arguments.get("first")
+        self.limit = int(first.value) if isinstance(first, IntValueNode) else None
+
+        order_by = arguments.get("orderBy")
+        self.order_by = order_by.value if isinstance(order_by, (EnumValueNode, StringValueNode)) else None
+        direction = arguments.get("orderDirection")
+        self.descending = isinstance(direction, (EnumValueNode, StringValueNode)) and direction.value == "desc"
+
+        where = arguments.get("where")
+        self.mode = self._pick_mode(schema, where, arguments)
+        self.cursor_field = "id" if self.mode == "id" else self.order_by
+
+    def _is_list_field(self, schema) -> bool:
+        if schema is not None and schema.query_type is not None:
+            field_def = schema.query_type.fields.get(self.field.name.value)
+            if field_def is not None:
+                return isinstance(get_nullable_type(field_def.type), GraphQLList)
+        # Without a schema fall back on the subgraph naming convention
+        return self.field.name.value.endswith("s")
+
+    def _pick_mode(self, schema, where, arguments) -> str:
+        if not self._is_list_field(schema):
+            return "single"
+        if self.limit is not None and self.limit <= PAGE_SIZE:
+            return "single"
+        # Filters passed as variables or explicit offsets cannot be rewritten safely
+        if where is not None and not isinstance(where, ObjectValueNode):
+            return "single"
+        if "skip" in arguments:
+            return "single"
+        if self.order_by in (None, "id"):
+            return "id"
+        if self.order_by in TIME_CURSOR_FIELDS:
+            return "time"
+        return "skip"
+
+    @staticmethod
+    def _with_selected(field_node: FieldNode, names: List[str]) -> FieldNode:
+        # The cursor value is read from the rows, so it has to be selected
+        selections = list(field_node.selection_set.selections) if field_node.selection_set else []
+        for name in names:
+            if not any(isinstance(s, FieldNode) and s.name.value == name and s.alias is None for s in selections):
+                selections.append(FieldNode(name=_name(name), arguments=(), directives=()))
+        return replace_node(field_node, selection_set=SelectionSetNode(selections=tuple(selections)))
+
+    def page_query(self, page_size: int, cursor: Any = None, skip: int = 0) -> str:
+        """
+        Returns the query for one page.
+
+        Args:
+            page_size (int): Number of rows to request
+            cursor (Any): Last cursor value seen, None for the first page
+            skip (int): Offset for skip pagination
+        """
+        field_node = self.field
+        arguments = {argument.name.value: argument.value for argument in field_node.arguments or ()}
+        arguments["first"] = IntValueNode(value=str(page_size))
+
+        if self.mode in ("id", "time"):
+            field_node = self._with_selected(field_node, ["id", self.cursor_field])
+            if self.mode == "id":
+                arguments["orderBy"] = EnumValueNode(value="id")
+                arguments["orderDirection"] = EnumValueNode(value="desc" if self.descending else "asc")
+            if cursor is not None:
+                if self.mode == "id":
+                    suffix = "_lt" if self.descending else "_gt"
+                else:
+                    suffix = "_lte" if self.descending else "_gte"
+                cursor_key = f"{self.cursor_field}{suffix}"
+                where = arguments.get("where")
+                where_fields = [f for f in (where.fields if where is not None else ()) if f.name.value != cursor_key]
+                where_fields.append(ObjectFieldNode(name=_name(cursor_key), value=_literal(cursor)))
+                arguments["where"] = ObjectValueNode(fields=tuple(where_fields))
+        elif self.mode == "skip" and skip:
+            arguments["skip"] = IntValueNode(value=str(skip))
+
+        field_node = replace_node(field_node, arguments=tuple(_argument(name, value) for name, value in arguments.items()))
+        # Only the paginated field is kept, extra root fields would be re-fetched on every page
+        operation = replace_node(self.operation, selection_set=SelectionSetNode(selections=(field_node,)))
+        definitions = tuple(
+            operation if definition is self.operation else definition
+            for definition in self.document.definitions
+            if definition is self.operation or not isinstance(definition, OperationDefinitionNode)
+        )
+        return print_ast(replace_node(self.document, definitions=definitions))
+
+
+class Paginator:
+    """
+    Drives the page requests of a query independently of how they are executed,
+    so the same cursor logic serves the sync and async clients.
+
+    Usage:
+        while (page_query := paginator.next_query()) is not None:
+            rows = paginator.accept(execute(page_query))
+    """
+
+    def __init__(self, query: str, schema=None, stats: Optional[PaginationStats] = None):
+        self.query = query
+        self.paged = PagedQuery(query, schema)
+        self.stats = stats if stats is not None else PaginationStats()
+        self.stats.mode = self.paged.mode
+        self.remaining = self.paged.limit if self.paged.limit is not None else MAX_ROWS
+        self._cursor = None
+        self._skip = 0
+        self._boundary_ids = set()
+        self._page_size = 0
+        self._done = False
+
+    def next_query(self) -> Optional[str]:
+        """
+        Returns the query of the next page, None when all pages were fetched.
+        """
+        if self._done:
+            return None
+        if self.paged.mode == "single":
+            return self.query
+        if self.remaining <= 0:
+            self.stats.truncated = self.paged.limit is None
+            self._finish()
+            return None
+        # Boundary rows come back again on a `_gte` cursor, so the page also makes room for them
+        self._page_size = min(PAGE_SIZE, self.remaining + len(self._boundary_ids))
+        return self.paged.page_query(self._page_size, cursor=self._cursor, skip=self._skip)
+
+    def _finish(self) -> None:
+        self._done = True
+        self.stats.elapsed = time.perf_counter() - self.stats.started_at
+
+    def accept(self, response: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Consumes the response of the last page query and returns its new rows.
+        """
+        paged, stats = self.paged, self.stats
+        data = response[paged.response_key]
+
+        if paged.mode == "single":
+            rows = data if isinstance(data, list) else [data] if data else []
+            stats.pages, stats.rows = 1, len(rows)
+            self._finish()
+            return rows
+
+        rows = data or []
+        fetched = len(rows)
+        if paged.mode == "time" and self._boundary_ids:
+            # `_gte` cursors return the rows of the last timestamp again
+            rows = [row for row in rows if row.get("id") not in self._boundary_ids]
+        rows = rows[:self.remaining]
+
+        if rows:
+            stats.pages += 1
+            stats.rows += len(rows)
+            self.remaining -= len(rows)
+            stats.elapsed = time.perf_counter() - stats.started_at
+
+        if fetched < self._page_size:
+            self._finish()
+        elif paged.mode == "skip":
+            self._skip += fetched
+            if self._skip > MAX_SKIP:
+                stats.truncated = True
+                self._finish()
+        elif paged.mode == "id":
+            self._cursor = rows[-1]["id"]
+        elif not rows:
+            # A full page sharing one timestamp, the cursor cannot advance
+            stats.truncated = True
+            self._finish()
+        else:
+            last_value = rows[-1][paged.cursor_field]
+            if last_value != self._cursor:
+                self._boundary_ids = set()
+            self._cursor = last_value
+            self._boundary_ids.update(row["id"] for row in rows if row[paged.cursor_field] == last_value)
+        return rows
+
+
+def iter_pages(
+    execute: Callable[[str], Dict[str, Any]],
+    query: str,
+    schema=None,
+    stats: Optional[PaginationStats] = None,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Executes a query page by page and yields the rows of each page as they arrive.
+
+    Args:
+        execute: Callable running a query string and returning the response data
+        query (str): The GraphQL query
+        schema: Optional GraphQLSchema used to detect list fields
+        stats (PaginationStats): Filled with row counts and timings while iterating
+
+    Yields:
+        List[Dict[str, Any]]: The rows of one page
+    """
+    paginator = Paginator(query, schema, stats)
+    while (page_query := paginator.next_query()) is not None:
+        rows = paginator.accept(execute(page_query))
+        if rows:
+            yield rows
+
+
+async def aiter_pages(
+    execute: Callable[[str], Awaitable[Dict[str, Any]]],
+    query: str,
+    schema=None,
+    stats: Optional[PaginationStats] = None,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Async version of iter_pages, execute is a coroutine function.
+    """
+    paginator = Paginator(query, schema, stats)
+    while (page_query := paginator.next_query()) is not None:
+        rows = paginator.accept(await execute(page_query))
+        if rows:
+            yield rows
+
+
+class RunningSummary:
+    """
+    Keeps count/mean/min/max of numeric columns over streamed pages,
+    so the dataset summary does not need the full frame in memory.
+    """
+
+    def __init__(self):
+        self._columns: Dict[str, Dict[str, float]] = {}
+
+    def update(self, df: pd.DataFrame) -> None:
+        for column in df.columns:
+            series = df[column]
+            if pd.api.types.is_bool_dtype(series):
+                continue
+            if not pd.api.types.is_numeric_dtype(series):
+                # Only untyped columns are parsed, categories and datetimes are skipped
+                if series.dtype != object:
+                    continue
+                series = pd.to_numeric(series, errors="coerce")
+            values = series.dropna()
+            if values.empty:
+                continue
+            summary = self._columns.setdefault(
+                column, {"count": 0, "sum": 0.0, "min": float("inf"), "max": float("-inf")}
+            )
+            summary["count"] += int(values.count())
+            summary["sum"] += float(values.sum())
+            summary["min"] = min(summary["min"], float(values.min()))
+            summary["max"] = max(summary["max"], float(values.max()))
+
+    def to_frame(self) -> pd.DataFrame:
+        frame = pd.DataFrame({
+            column: {
+                "count": s["count"],
+                "mean": s["sum"] / s["count"],
+                "min": s["min"],
+                "max": s["max"],
+            }
+            for column, s in self._columns.items()
+        })
+        return frame
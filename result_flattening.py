@@ -0,0 +1,120 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+from graphql import (
+    parse,
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    InlineFragmentNode,
+    OperationDefinitionNode,
+)
+
+from schema_index import SchemaIndex, FieldInfo
+from column_types import decode_columns, is_wide_int
+
+
+SEPARATOR = "_"
+
+
+@dataclass
+class PlanNode:
+    """
+    A nested object or list of objects in the selection, expanded into
+    columns prefixed with its column name.
+    """
+    column: str
+    is_list: bool
+    children: List["PlanNode"] = field(default_factory=list)
+
+
+@dataclass
+class FlattenPlan:
+    """
+    How to turn the rows of a root list field into flat columns, derived
+    once from the query selection set and the schema.
+
+    Nested objects become prefixed columns (token0 { symbol } -> token0_symbol).
+    Lists of objects are exploded into one row per item with prefixed columns,
+    sibling lists are exploded one after another.
+    """
+    entity: Optional[str]
+    columns: List[str] = field(default_factory=list)
+    nodes: List[PlanNode] = field(default_factory=list)
+    column_types: Dict[str, FieldInfo] = field(default_factory=dict)
+
+    @classmethod
+    def from_query(cls, query: str, index: SchemaIndex) -> "FlattenPlan":
+        document = parse(query)
+        fragments = {
+            d.name.value: d for d in document.definitions if isinstance(d, FragmentDefinitionNode)
+        }
+        operation = next(d for d in document.definitions if isinstance(d, OperationDefinitionNode))
+        root = next(s for s in operation.selection_set.selections if isinstance(s, FieldNode))
+        entity = index.entity_for_root_field(root.name.value)
+        plan = cls(entity=entity.name if entity else None)
+        if entity is not None and root.selection_set is not None:
+            plan.nodes = plan._walk(root.selection_set, entity.name, "", index, fragments)
+        return plan
+
+    def _walk(self, selection_set, entity_name, prefix, index, fragments) -> List[PlanNode]:
+        nodes = []
+        for selection in self._fields(selection_set, fragments):
+            key = (selection.alias or selection.name).value
+            column = f"{prefix}{key}"
+            field_info = index.field(entity_name, selection.name.value)
+            if field_info is not None and index.is_entity(field_info.type_name) and selection.selection_set:
+                node = PlanNode(column=column, is_list=field_info.is_list)
+                node.children = self._walk(
+                    selection.selection_set, field_info.type_name, f"{column}{SEPARATOR}", index, fragments
+                )
+                nodes.append(node)
+            else:
+                self.columns.append(column)
+                if field_info is not None:
+                    self.column_types[column] = field_info
+        return nodes
+
+    @property
+    def wide_int_columns(self) -> List[str]:
+        return [column for column, field_info in self.column_types.items() if is_wide_int(field_info)]
+
+    @classmethod
+    def _fields(cls, selection_set, fragments):
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                yield selection
+            elif isinstance(selection, InlineFragmentNode):
+                yield from cls._fields(selection.selection_set, fragments)
+            elif isinstance(selection, FragmentSpreadNode) and selection.name.value in fragments:
+                yield from cls._fields(fragments[selection.name.value].selection_set, fragments)
+
+    def flatten(self, rows: List[Dict[str, Any]]) -> pd.DataFrame:
+        """
+        Flattens one page of rows and decodes the columns to their schema dtypes.
+        Each nested column is expanded at once from its values, so rows are never
+        copied one by one.
+        """
+        if self.entity is None:
+            # Unknown root field, fall back on generic nested dict flattening
+            return pd.json_normalize(rows, sep=SEPARATOR)
+
+        df = pd.DataFrame.from_records(rows)
+        pending = list(self.nodes)
+        while pending:
+            node = pending.pop(0)
+            if node.column not in df.columns:
+                continue
+            if node.is_list:
+                df = df.explode(node.column, ignore_index=True)
+            values = df[node.column]
+            mask = values.notna()
+            expanded = pd.DataFrame.from_records(values[mask].tolist(), index=df.index[mask])
+            expanded = expanded.add_prefix(f"{node.column}{SEPARATOR}")
+            df = df.drop(columns=node.column).join(expanded)
+            pending.extend(node.children)
+
+        # Same columns in the same order on every page, missing nested objects become nulls
+        df = df.reindex(columns=self.columns)
+        return decode_columns(df, self.column_types)
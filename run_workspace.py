@@ -0,0 +1,200 @@
+import os
+import time
+import uuid
+import shutil
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+
+WORKSPACE_ROOT = Path(os.getenv("AGENT_WORKSPACE_DIR", ".cache/workspaces")).resolve()
+# Bytes one run may write before its tools are refused
+WORKSPACE_QUOTA_BYTES = int(os.getenv("WORKSPACE_QUOTA_BYTES", str(1024 * 1024 * 1024)))
+# Bytes all workspaces may use together, least recently used are reaped beyond it
+WORKSPACES_MAX_BYTES = int(os.getenv("WORKSPACES_MAX_BYTES", str(8 * 1024 * 1024 * 1024)))
+# Seconds an idle workspace is kept, long enough for its session to download the artifacts
+WORKSPACE_MAX_AGE = int(os.getenv("WORKSPACE_MAX_AGE", str(24 * 60 * 60)))
+REAPER_INTERVAL = int(os.getenv("WORKSPACE_REAPER_INTERVAL", "600"))
+
+# Marker file whose mtime records the last use of a workspace
+_LAST_USED = ".last_used"
+
+
+class WorkspaceError(Exception):
+    """Raised for paths outside a workspace and for exceeded quotas."""
+
+
+def _directory_size(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+@dataclass
+class Workspace:
+    """
+    Directory holding every artifact of one agent run. Tools resolve the file
+    names chosen by the model against it, so concurrent runs never share files.
+    """
+    id: str
+    path: Path
+    quota_bytes: int = WORKSPACE_QUOTA_BYTES
+
+    def resolve(self, file_name: Union[str, Path]) -> Path:
+        """
+        Returns the absolute path of a file in the workspace.
+
+        Raises:
+            WorkspaceError: When the name points outside the workspace
+        """
+        path = Path(file_name)
+        if not path.is_absolute():
+            path = self.path / path
+        path = path.resolve()
+        if path != self.path and self.path not in path.parents:
+            raise WorkspaceError(f"{file_name} is outside the run workspace {self.path}")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def resolve_all(self, file_names: List[str]) -> List[str]:
+        return [str(self.resolve(name)) for name in file_names if name]
+
+    def size_bytes(self) -> int:
+        return _directory_size(self.path)
+
+    def remaining_bytes(self) -> int:
+        return max(0, self.quota_bytes - self.size_bytes())
+
+    def ensure_quota(self) -> None:
+        """
+        Raises:
+            WorkspaceError: When the workspace already uses its whole quota
+        """
+        size = self.size_bytes()
+        if size >= self.quota_bytes:
+            raise WorkspaceError(
+                f"Workspace quota exceeded ({size / 1e6:.0f}MB of {self.quota_bytes / 1e6:.0f}MB), "
+                "fetch fewer rows or columns"
+            )
+
+    def touch(self) -> None:
+        (self.path / _LAST_USED).touch()
+
+
+_active: Dict[str, Workspace] = {}
+_lock = threading.Lock()
+_reaper: Optional[threading.Thread] = None
+
+
+def create_workspace(root: Union[str, Path] = WORKSPACE_ROOT) -> Workspace:
+    """
+    Creates the workspace of a new run and marks it active so the reaper keeps it.
+    """
+    start_reaper()
+    workspace_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    path = Path(root).resolve() / workspace_id
+    path.mkdir(parents=True, exist_ok=True)
+    workspace = Workspace(id=workspace_id, path=path)
+    workspace.touch()
+    with _lock:
+        _active[workspace_id] = workspace
+    return workspace
+
+
+def release_workspace(workspace: Workspace) -> None:
+    """
+    Marks a finished run's workspace idle, it is reaped once old enough.
+    """
+    workspace.touch()
+    with _lock:
+        _active.pop(workspace.id, None)
+
+
+def workspace_of(path: Union[str, Path], root: Union[str, Path] = WORKSPACE_ROOT) -> Optional[Workspace]:
+    """
+    Returns the workspace holding a file, also after its run finished, or None
+    when the file is not in a workspace under root.
+    """
+    path = Path(path).resolve()
+    with _lock:
+        for workspace in _active.values():
+            if workspace.path in path.parents:
+                return workspace
+    root = Path(root).resolve()
+    if root not in path.parents or path.parent == root:
+        return None
+    workspace_id = path.relative_to(root).parts[0]
+    return Workspace(id=workspace_id, path=root / workspace_id)
+
+
+def reap_workspaces(
+    root: Union[str, Path] = WORKSPACE_ROOT,
+    max_age: int = WORKSPACE_MAX_AGE,
+    max_bytes: int = WORKSPACES_MAX_BYTES,
+) -> int:
+    """
+    Deletes idle workspaces older than max_age, then the least recently used
+    ones until all workspaces fit in max_bytes. Active runs are never reaped.
+
+    Returns:
+        int: Number of workspaces deleted
+    """
+    root = Path(root)
+    if not root.is_dir():
+        return 0
+    now = time.time()
+    with _lock:
+        active = set(_active)
+
+    idle = []
+    total = 0
+    for path in root.iterdir():
+        if not path.is_dir():
+            continue
+        size = _directory_size(path)
+        total += size
+        if path.name in active:
+            continue
+        try:
+            last_used = (path / _LAST_USED).stat().st_mtime
+        except FileNotFoundError:
+            last_used = path.stat().st_mtime
+        idle.append((last_used, path, size))
+
+    reaped = 0
+    for last_used, path, size in sorted(idle, key=lambda item: item[0]):
+        if now - last_used <= max_age and total <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        reaped += 1
+    if reaped:
+        print(f"Reaped {reaped} workspaces, {total / 1e6:.0f}MB left")
+    return reaped
+
+
+def start_reaper(interval: int = REAPER_INTERVAL) -> None:
+    """
+    Starts the background thread reaping old workspaces, once per process.
+    """
+    global _reaper
+    with _lock:
+        if _reaper is not None:
+            return
+
+        def run():
+            while True:
+                try:
+                    reap_workspaces()
+                except Exception as e:
+                    print(f"Workspace reaper failed: {e}")
+                time.sleep(interval)
+
+        _reaper = threading.Thread(target=run, name="workspace-reaper", daemon=True)
+        _reaper.start()
@@ -0,0 +1,155 @@
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from graphql import (
+    parse,
+    ListTypeNode,
+    NonNullTypeNode,
+    ObjectTypeDefinitionNode,
+    StringValueNode,
+    TokenKind,
+)
+
+from subgraph_schema import schema
+
+
+SCALAR_TYPES = {"ID", "Bytes", "String", "Int", "BigInt", "BigDecimal", "Boolean", "Float"}
+
+
+@dataclass
+class FieldInfo:
+    name: str
+    type_name: str
+    is_list: bool = False
+    required: bool = False
+    derived_from: Optional[str] = None
+    description: str = ""
+
+    @property
+    def is_scalar(self) -> bool:
+        return self.type_name in SCALAR_TYPES
+
+
+@dataclass
+class EntityInfo:
+    name: str
+    fields: Dict[str, FieldInfo] = field(default_factory=dict)
+    description: str = ""
+    # SDL text of the type including its leading comments
+    source: str = ""
+
+
+def _unwrap(type_node):
+    """
+    Returns (type name, is list, required) of a field type node.
+    """
+    required = isinstance(type_node, NonNullTypeNode)
+    if required:
+        type_node = type_node.type
+    is_list = isinstance(type_node, ListTypeNode)
+    while isinstance(type_node, (ListTypeNode, NonNullTypeNode)):
+        type_node = type_node.type
+    return type_node.name.value, is_list, required
+
+
+def _comment_tokens(node) -> list:
+    # Comments are kept in the token stream right before the node
+    tokens = []
+    token = node.loc.start_token.prev if node.loc else None
+    while token is not None and token.kind == TokenKind.COMMENT:
+        tokens.append(token)
+        token = token.prev
+    return list(reversed(tokens))
+
+
+def _leading_comments(node) -> str:
+    return " ".join(token.value.strip() for token in _comment_tokens(node))
+
+
+def _source(sdl: str, node) -> str:
+    comments = _comment_tokens(node)
+    start = comments[0].start if comments else node.loc.start
+    return sdl[start:node.loc.end]
+
+
+def plural_field_name(entity_name: str) -> str:
+    """
+    Returns the root query field of an entity list the way graph-node names it,
+    e.g. Pool -> pools, Factory -> factories, Flash -> flashes.
+    """
+    name = entity_name[0].lower() + entity_name[1:]
+    if name.endswith("y") and name[-2:-1] not in "aeiou":
+        return name[:-1] + "ies"
+    if name.endswith(("s", "sh", "ch", "x")):
+        return name + "es"
+    return name + "s"
+
+
+class SchemaIndex:
+    """
+    Entities and fields of the subgraph SDL, used to plan flattening
+    and typing of query results.
+    """
+
+    def __init__(self, entities: Dict[str, EntityInfo]):
+        self.entities = entities
+        self._root_fields: Dict[str, str] = {}
+        for entity_name in entities:
+            singular = entity_name[0].lower() + entity_name[1:]
+            self._root_fields[singular] = entity_name
+            self._root_fields[plural_field_name(entity_name)] = entity_name
+
+    @classmethod
+    def from_sdl(cls, sdl: str) -> "SchemaIndex":
+        entities = {}
+        for definition in parse(sdl).definitions:
+            if not isinstance(definition, ObjectTypeDefinitionNode):
+                continue
+            entity = EntityInfo(
+                name=definition.name.value,
+                description=_leading_comments(definition),
+                source=_source(sdl, definition),
+            )
+            for field_def in definition.fields:
+                type_name, is_list, required = _unwrap(field_def.type)
+                derived_from = None
+                for directive in field_def.directives or ():
+                    if directive.name.value == "derivedFrom":
+                        argument = directive.arguments[0].value
+                        derived_from = argument.value if isinstance(argument, StringValueNode) else None
+                entity.fields[field_def.name.value] = FieldInfo(
+                    name=field_def.name.value,
+                    type_name=type_name,
+                    is_list=is_list,
+                    required=required,
+                    derived_from=derived_from,
+                    description=_leading_comments(field_def),
+                )
+            entities[entity.name] = entity
+        return cls(entities)
+
+    def entity_for_root_field(self, root_field: str) -> Optional[EntityInfo]:
+        """
+        Returns the entity returned by a root query field, e.g. poolDayDatas -> PoolDayData.
+        """
+        entity_name = self._root_fields.get(root_field)
+        return self.entities.get(entity_name) if entity_name else None
+
+    def field(self, entity_name: str, field_name: str) -> Optional[FieldInfo]:
+        entity = self.entities.get(entity_name)
+        return entity.fields.get(field_name) if entity else None
+
+    def is_entity(self, type_name: str) -> bool:
+        return type_name in self.entities
+
+    def entity_names(self) -> List[str]:
+        return list(self.entities)
+
+
+@lru_cache(maxsize=1)
+def default_index() -> SchemaIndex:
+    """
+    Returns the index of the embedded Uniswap v3 schema, parsed once per process.
+    """
+    return SchemaIndex.from_sdl(schema)
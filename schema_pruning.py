@@ -0,0 +1,224 @@
+import os
+import re
+import math
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from schema_index import SchemaIndex, EntityInfo, default_index
+from subgraph_schema import schema
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+# Set SCHEMA_PRUNING=0 to always send the full schema
+SCHEMA_PRUNING = os.getenv("SCHEMA_PRUNING", "1").lower() not in ("0", "false", "no")
+# Entities scoring at least this share of the best score are kept
+MIN_RELATIVE_SCORE = 0.5
+# @derivedFrom collections of kept entities are added above this share
+RELATED_RELATIVE_SCORE = 0.3
+MAX_ENTITIES = 4
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Weight of the share of an entity name mentioned in the query, on top of the BM25 score of its fields
+NAME_WEIGHT = 6.0
+
+# Query words mapped to the schema vocabulary they imply
+SYNONYMS = {
+    "tvl": ["total", "value", "locked", "tvl"],
+    "locked": ["locked"],
+    "depth": ["tick", "liquidity"],
+    "slippage": ["tick", "liquidity"],
+    "impact": ["tick", "liquidity"],
+    "range": ["tick"],
+    "daily": ["day"],
+    "days": ["day"],
+    "history": ["day"],
+    "historical": ["day"],
+    "trend": ["day"],
+    "week": ["day"],
+    "month": ["day"],
+    "hourly": ["hour"],
+    "hours": ["hour"],
+    "intraday": ["hour"],
+    "trade": ["swap"],
+    "trades": ["swap"],
+    "traded": ["swap", "volume"],
+    "fee": ["fees"],
+    "apr": ["fees", "volume"],
+    "yield": ["fees"],
+    "lp": ["mint", "burn", "liquidity"],
+    "provider": ["mint", "burn"],
+    "deposit": ["mint"],
+    "withdraw": ["burn"],
+    "gas": ["transaction"],
+    "tx": ["transaction"],
+    "eth": ["eth", "bundle"],
+    "uniswap": ["uniswap", "factory"],
+    "protocol": ["uniswap", "factory"],
+}
+
+STOP_WORDS = {
+    "a", "an", "the", "of", "for", "in", "on", "and", "or", "to", "is", "are", "what", "which", "how",
+    "me", "show", "give", "get", "with", "by", "from", "at", "last", "top", "all", "analysis", "analyse",
+    "analyze", "report", "data", "about", "please", "best", "recent", "current", "large",
+}
+
+
+def _split_words(text: str) -> List[str]:
+    # camelCase and snake_case are split so field names match plain words
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text)
+    words = re.findall(r"[A-Za-z0-9]+", text.lower())
+    return [w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w for w in words]
+
+
+def count_tokens(text: str) -> int:
+    """
+    Counts prompt tokens with tiktoken when available, ~4 characters per token otherwise.
+    """
+    if tiktoken is not None:
+        try:
+            return len(tiktoken.get_encoding("o200k_base").encode(text))
+        except Exception:
+            pass
+    return math.ceil(len(text) / 4)
+
+
+@dataclass
+class SchemaSelection:
+    sdl: str
+    entities: List[str]
+    scores: Dict[str, float] = field(default_factory=dict)
+    full_tokens: int = 0
+    pruned_tokens: int = 0
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.full_tokens - self.pruned_tokens
+
+    def report(self) -> str:
+        return (
+            f"schema entities: {', '.join(self.entities)} | prompt schema tokens: "
+            f"{self.pruned_tokens} of {self.full_tokens} (saved {self.saved_tokens})"
+        )
+
+
+class SchemaRetriever:
+    """
+    BM25 index over the entities of a schema. Each entity is one document made of
+    its field names and comments, and mentions of the entity name itself add a
+    fixed bonus so PoolDayData wins "pool day data" over every type with a pool field.
+    """
+
+    def __init__(self, index: SchemaIndex, full_sdl: str):
+        self.index = index
+        self.full_sdl = full_sdl
+        self.full_tokens = count_tokens(full_sdl)
+        self.documents: Dict[str, Counter] = {}
+        self.names: Dict[str, set] = {}
+        for entity in index.entities.values():
+            self.names[entity.name] = set(_split_words(entity.name)) - STOP_WORDS
+            terms = _split_words(entity.description)
+            for field_info in entity.fields.values():
+                terms += _split_words(field_info.name)
+                terms += _split_words(field_info.description)
+            self.documents[entity.name] = Counter(terms)
+
+        self.avg_length = sum(sum(d.values()) for d in self.documents.values()) / max(len(self.documents), 1)
+        document_frequency = Counter(term for d in self.documents.values() for term in d)
+        n = len(self.documents)
+        self.idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+
+    def _query_terms(self, query: str) -> List[str]:
+        terms = []
+        for word in _split_words(query):
+            if word in STOP_WORDS:
+                continue
+            terms.append(word)
+            terms += SYNONYMS.get(word, [])
+        # Upper case words are usually token symbols (PEPE, WETH)
+        if re.search(r"\b[A-Z0-9]{2,}\b", query):
+            terms += ["token", "pool"]
+        return terms
+
+    def score(self, query: str) -> Dict[str, float]:
+        terms = self._query_terms(query)
+        unique_terms = set(terms)
+        scores = {}
+        for name, document in self.documents.items():
+            length = sum(document.values())
+            name_words = self.names[name]
+            score = NAME_WEIGHT * len(name_words & unique_terms) / max(len(name_words), 1)
+            for term in terms:
+                frequency = document.get(term, 0)
+                if not frequency:
+                    continue
+                norm = frequency + BM25_K1 * (1 - BM25_B + BM25_B * length / self.avg_length)
+                score += self.idf[term] * frequency * (BM25_K1 + 1) / norm
+            scores[name] = score
+        return scores
+
+    def _related(self, entity: EntityInfo, scores: Dict[str, float]) -> List[str]:
+        threshold = max(scores.values()) * RELATED_RELATIVE_SCORE
+        related = []
+        for field_info in entity.fields.values():
+            if not self.index.is_entity(field_info.type_name):
+                continue
+            # Forward references are needed for nested selections, @derivedFrom
+            # collections only when the query is about them as well
+            if field_info.derived_from is None or scores.get(field_info.type_name, 0) >= threshold:
+                related.append(field_info.type_name)
+        return related
+
+    def select(self, query: str) -> SchemaSelection:
+        """
+        Returns the part of the schema relevant to a user query.
+        """
+        scores = self.score(query)
+        best = max(scores.values(), default=0)
+        if not SCHEMA_PRUNING or best <= 0:
+            return SchemaSelection(
+                sdl=self.full_sdl,
+                entities=list(self.index.entities),
+                scores=scores,
+                full_tokens=self.full_tokens,
+                pruned_tokens=self.full_tokens,
+            )
+
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        selected = [name for name in ranked if scores[name] >= best * MIN_RELATIVE_SCORE][:MAX_ENTITIES]
+        for name in list(selected):
+            for related in self._related(self.index.entities[name], scores):
+                if related not in selected:
+                    selected.append(related)
+
+        # Keep the schema order so the prompt reads like the original SDL
+        entities = [name for name in self.index.entities if name in selected]
+        sdl = "\n\n".join(self.index.entities[name].source for name in entities)
+        return SchemaSelection(
+            sdl=sdl,
+            entities=entities,
+            scores=scores,
+            full_tokens=self.full_tokens,
+            pruned_tokens=count_tokens(sdl),
+        )
+
+
+_retriever: Optional[SchemaRetriever] = None
+
+
+def select_schema(query: str) -> SchemaSelection:
+    """
+    Returns the entities of the embedded schema relevant to a user query.
+    """
+    global _retriever
+    if _retriever is None:
+        _retriever = SchemaRetriever(default_index(), schema)
+    return _retriever.select(query)
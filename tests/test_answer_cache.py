@@ -0,0 +1,29 @@
+import pytest
+
+from answer_cache import ANSWER_CACHE_THRESHOLD, AnswerCache, normalize_question, question_similarity
+
+
+@pytest.mark.parametrize("asked, cached", [
+    ("best route to swap 10 WETH to USDC", "best route to swap 10 USDC to WETH"),
+    ("swap 1 ETH for PEPE", "swap 1 PEPE for ETH"),
+    ("daily volume of WETH last 30 days", "hourly volume of WETH last 30 days"),
+])
+def test_different_questions_miss(asked, cached):
+    assert normalize_question(asked) != normalize_question(cached)
+    assert question_similarity(asked, cached) < ANSWER_CACHE_THRESHOLD
+
+
+def test_rephrased_question_hits():
+    assert normalize_question("liquidity of PEPE") == normalize_question("PEPE liquidity analysis")
+    assert question_similarity(
+        "What is the daily volume of WETH for the last 30 days", "daily volume WETH last 30 days"
+    ) >= ANSWER_CACHE_THRESHOLD
+
+
+def test_reversed_swap_is_not_served(tmp_path):
+    cache = AnswerCache(path=tmp_path / "answers.json", ttl=60)
+    cache.put("best route to swap 10 WETH to USDC", {"report": "WETH -> USDC"})
+    assert cache.lookup("best route to swap 10 USDC to WETH") is None
+    entry, score = cache.lookup("best route to swap 10 WETH to USDC please")
+    assert entry.response["report"] == "WETH -> USDC"
+    assert list(tmp_path.iterdir()) == [tmp_path / "answers.json"]
@@ -0,0 +1,337 @@
+import os
+import time
+import asyncio
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from graphql_client import get_async_client, resolve_endpoint
+from query_pagination import aiter_pages
+from v3_math import (
+    FEE_DENOMINATOR,
+    MAX_SQRT_RATIO,
+    MIN_SQRT_RATIO,
+    amount0_delta,
+    amount1_delta,
+    price_from_sqrt,
+    sqrt_ratio_at_tick,
+    swap_step,
+)
+
+
+# Seconds the ticks of a pool are reused before they are fetched again
+TICK_CACHE_TTL = int(os.getenv("TICK_CACHE_TTL", "60"))
+
+POOL_QUERY = """
+{
+  pool(id: "%s") {
+    id feeTier liquidity sqrtPrice tick
+    token0 { id symbol decimals }
+    token1 { id symbol decimals }
+  }
+}
+"""
+TICKS_QUERY = """
+{
+  ticks(where: {pool: "%s", liquidityNet_not: "0"}) { id tickIdx liquidityNet }
+}
+"""
+
+
+@dataclass
+class _Side:
+    """
+    The tick ranges a swap in one direction walks through, with the exact
+    input (fee included) and output of crossing each range completely.
+    """
+    zero_for_one: bool
+    sqrt_start: List[int]
+    sqrt_end: List[int]
+    liquidity: List[int]
+    gross_in: np.ndarray      # cumulative input before each range, object dtype
+    total_out: np.ndarray     # cumulative output before each range, object dtype
+
+
+@dataclass
+class swap_quote:
+    amount_in: float
+    amount_out: float
+    execution_price: float
+    price_impact_pct: float
+    price_after: float
+    ticks_crossed: int
+    filled: bool
+
+
+@dataclass
+class DepthProfile:
+    """
+    Active liquidity of a pool by tick range, built once from its initialized
+    ticks. Quotes use the integer math of the pool contract, so the amount out
+    matches an on chain exact input swap.
+
+    Args:
+        pool (Dict[str, Any]): Pool row with feeTier, liquidity, sqrtPrice, tick, token0 and token1
+        ticks (Iterable[Tuple[int, int]]): (tickIdx, liquidityNet) of the initialized ticks
+    """
+    pool: Dict[str, Any]
+    ticks: Iterable[Tuple[int, int]]
+    fetched_at: float = field(default_factory=time.time)
+
+    def __post_init__(self):
+        self.fee = int(self.pool["feeTier"])
+        self.sqrt_price = int(self.pool["sqrtPrice"])
+        self.tick = int(self.pool["tick"])
+        self.liquidity = int(self.pool["liquidity"])
+        self.token0 = self.pool["token0"]
+        self.token1 = self.pool["token1"]
+        self.decimals0 = int(self.token0["decimals"])
+        self.decimals1 = int(self.token1["decimals"])
+
+        ticks = sorted((int(t), int(n)) for t, n in self.ticks)
+        self.tick_index = np.array([t for t, _ in ticks], dtype=np.int64)
+        net = np.array([n for _, n in ticks], dtype=object)
+        # Liquidity of the range starting at each tick is the prefix sum of liquidityNet.
+        # Anchored on the pool liquidity so ticks missing from the subgraph do not shift the profile
+        prefix = np.cumsum(net) if len(net) else net
+        below = int(np.searchsorted(self.tick_index, self.tick, side="right"))
+        anchor = prefix[below - 1] if below else 0
+        self.range_liquidity = [self.liquidity + int(p - anchor) for p in prefix]
+        self.net = net
+        self.ticks = ticks
+        self._sides = {True: self._build_side(True), False: self._build_side(False)}
+
+    def _build_side(self, zero_for_one: bool) -> _Side:
+        below = int(np.searchsorted(self.tick_index, self.tick, side="right"))
+        if zero_for_one:
+            # Price falls, ticks at or below the current tick are crossed downwards
+            boundaries = [int(t) for t in self.tick_index[:below][::-1]]
+            limit = MIN_SQRT_RATIO + 1
+        else:
+            boundaries = [int(t) for t in self.tick_index[below:]]
+            limit = MAX_SQRT_RATIO - 1
+
+        sqrt_start, sqrt_end, liquidity = [], [], []
+        sqrt_price, active = self.sqrt_price, self.liquidity
+        for i, tick in enumerate(boundaries):
+            target = sqrt_ratio_at_tick(tick)
+            sqrt_start.append(sqrt_price)
+            sqrt_end.append(target)
+            liquidity.append(active)
+            net = int(self.net[below - 1 - i] if zero_for_one else self.net[below + i])
+            active = active - net if zero_for_one else active + net
+            sqrt_price = target
+        sqrt_start.append(sqrt_price)
+        sqrt_end.append(limit)
+        liquidity.append(active)
+
+        gross, out = [0], [0]
+        for start, end, active in zip(sqrt_start, sqrt_end, liquidity):
+            if active <= 0:
+                step_in, step_out = 0, 0
+            else:
+                _, step_in, step_out, fee_amount = swap_step(start, end, active, 1 << 255, self.fee)
+                step_in += fee_amount
+            gross.append(gross[-1] + step_in)
+            out.append(out[-1] + step_out)
+        return _Side(
+            zero_for_one=zero_for_one,
+            sqrt_start=sqrt_start,
+            sqrt_end=sqrt_end,
+            liquidity=liquidity,
+            gross_in=np.array(gross, dtype=object),
+            total_out=np.array(out, dtype=object),
+        )
+
+    def is_token0(self, token: str) -> bool:
+        """
+        True when token (address or symbol) is token0 of the pool.
+        """
+        token = token.lower()
+        if token in (self.token0["id"].lower(), self.token0["symbol"].lower()):
+            return True
+        if token in (self.token1["id"].lower(), self.token1["symbol"].lower()):
+            return False
+        raise ValueError(
+            f"{token} is not a token of pool {self.pool['id']} ({self.token0['symbol']}/{self.token1['symbol']})"
+        )
+
+    @property
+    def mid_price(self) -> float:
+        """
+        Price of token0 in token1.
+        """
+        return price_from_sqrt(self.sqrt_price, self.decimals0, self.decimals1)
+
+    def quote_raw(self, amounts_in: Iterable[int], zero_for_one: bool) -> List[Tuple[int, int, Optional[int], int, bool]]:
+        """
+        Exact input swaps of raw amounts. The range each amount ends in is found
+        for all amounts at once on the cumulative inputs, only that last range is
+        computed per amount.
+
+        Returns:
+            List[Tuple[int, int, Optional[int], int, bool]]: amount in used, amount out, sqrt price after,
+            ticks crossed and whether the amount was filled completely. The sqrt price of an unfilled
+            amount is the last initialized tick with liquidity, None when there is none
+        """
+        side = self._sides[zero_for_one]
+        amounts = np.array([int(a) for a in amounts_in], dtype=object)
+        # gross_in[k] <= amount < gross_in[k + 1] ends in range k
+        ranges = np.searchsorted(side.gross_in, amounts, side="right") - 1 if len(amounts) else []
+        last = len(side.liquidity) - 1
+        # The last initialized tick with liquidity before it, None when liquidity reaches the price limit
+        exhausted_at = None
+        if side.liquidity[last] <= 0:
+            exhausted_at = next((side.sqrt_end[j] for j in range(last - 1, -1, -1) if side.liquidity[j] > 0), None)
+
+        quotes = []
+        for amount, k in zip(amounts, ranges):
+            k = int(k)
+            if k > last:
+                # Deeper than all liquidity, the price runs to where the liquidity ends, not to the price limit
+                quotes.append((int(side.gross_in[-1]), int(side.total_out[-1]), exhausted_at, last, False))
+                continue
+            remaining = amount - side.gross_in[k]
+            sqrt_after, step_in, step_out, fee_amount = side.sqrt_start[k], 0, 0, 0
+            if remaining > 0 and side.liquidity[k] > 0:
+                sqrt_after, step_in, step_out, fee_amount = swap_step(
+                    side.sqrt_start[k], side.sqrt_end[k], side.liquidity[k], remaining, self.fee
+                )
+            quotes.append((
+                int(side.gross_in[k] + step_in + fee_amount),
+                int(side.total_out[k] + step_out),
+                sqrt_after,
+                k,
+                True,
+            ))
+        return quotes
+
+    def quote(self, amounts_in: Iterable[float], token_in: str) -> List[swap_quote]:
+        """
+        Quotes exact input swaps of amounts in human units of token_in.
+        Price impact is the shortfall of the execution price against the mid
+        price, fees included.
+        """
+        zero_for_one = self.is_token0(token_in)
+        decimals_in, decimals_out = (self.decimals0, self.decimals1) if zero_for_one else (self.decimals1, self.decimals0)
+        scale_in, scale_out = Decimal(10) ** decimals_in, Decimal(10) ** decimals_out
+        amounts_in = list(amounts_in)
+        raw = [int(Decimal(str(a)) * scale_in) for a in amounts_in]
+        mid = self.mid_price if zero_for_one else 1 / self.mid_price
+
+        quotes = []
+        for used, out, sqrt_after, crossed, filled in self.quote_raw(raw, zero_for_one):
+            amount_in = float(Decimal(used) / scale_in)
+            amount_out = float(Decimal(out) / scale_out)
+            execution = amount_out / amount_in if amount_in else mid
+            quotes.append(swap_quote(
+                amount_in=amount_in,
+                amount_out=amount_out,
+                execution_price=execution,
+                price_impact_pct=(1 - execution / mid) * 100 if mid else float("nan"),
+                price_after=price_from_sqrt(sqrt_after, self.decimals0, self.decimals1) if sqrt_after else float("nan"),
+                ticks_crossed=crossed,
+                filled=filled,
+            ))
+        return quotes
+
+    def depth(self, percent: float) -> Tuple[float, float]:
+        """
+        Liquidity within percent of the mid price, without fees: the token0 a
+        seller needs to push the price down by percent and the token1 a buyer
+        needs to push it up by percent.
+        """
+        factor = Decimal(1 + percent / 100).sqrt()
+        down = int(Decimal(self.sqrt_price) / factor)
+        up = int(Decimal(self.sqrt_price) * factor)
+
+        def side_amount(zero_for_one, target):
+            side = self._sides[zero_for_one]
+            total = 0
+            for start, end, active in zip(side.sqrt_start, side.sqrt_end, side.liquidity):
+                reached = end <= target if zero_for_one else end >= target
+                stop = target if reached else end
+                if active > 0:
+                    delta = amount0_delta if zero_for_one else amount1_delta
+                    total += delta(stop, start, active, True)
+                if reached:
+                    break
+            return total
+
+        token0 = side_amount(True, down) / 10 ** self.decimals0
+        token1 = side_amount(False, up) / 10 ** self.decimals1
+        return token0, token1
+
+    def liquidity_frame(self) -> pd.DataFrame:
+        """
+        Active liquidity of each initialized tick range and its price, for charts.
+        """
+        return pd.DataFrame({
+            "tickIdx": self.tick_index,
+            "price": [price_from_sqrt(sqrt_ratio_at_tick(int(t)), self.decimals0, self.decimals1) for t in self.tick_index],
+            "liquidityNet": [float(n) for n in self.net],
+            "activeLiquidity": [float(l) for l in self.range_liquidity],
+        })
+
+    def report(self) -> str:
+        return (
+            f"pool {self.pool['id']} {self.token0['symbol']}/{self.token1['symbol']} fee {self.fee / FEE_DENOMINATOR:.2%}, "
+            f"{len(self.ticks)} initialized ticks, price {self.mid_price:.6g} {self.token1['symbol']} per {self.token0['symbol']}"
+        )
+
+
+def quotes_frame(quotes: List[swap_quote]) -> pd.DataFrame:
+    return pd.DataFrame([q.__dict__ for q in quotes])
+
+
+_profiles: Dict[Tuple[str, str], DepthProfile] = {}
+# Lock of each profile being loaded and the number of callers using it, keyed by loop, endpoint and pool
+_profile_locks: Dict[Tuple[int, str, str], List] = {}
+
+
+async def get_depth_profile(pool_id: str, endpoint: Optional[str] = None) -> DepthProfile:
+    """
+    Returns the depth profile of a pool, fetching the pool and its initialized
+    ticks once per TICK_CACHE_TTL seconds.
+
+    Args:
+        pool_id (str): Pool address
+        endpoint (str): GraphQL endpoint url, defaults to GRAPHQL_ENDPOINT
+
+    Returns:
+        DepthProfile: The profile of the pool
+    """
+    endpoint = resolve_endpoint(endpoint)
+    key = (endpoint, pool_id.lower())
+    profile = _profiles.get(key)
+    if profile is not None and time.time() - profile.fetched_at <= TICK_CACHE_TTL:
+        return profile
+
+    # One load per pool at a time on each loop, the last caller of a key drops its lock
+    lock_key = (id(asyncio.get_running_loop()),) + key
+    entry = _profile_locks.setdefault(lock_key, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            profile = _profiles.get(key)
+            if profile is not None and time.time() - profile.fetched_at <= TICK_CACHE_TTL:
+                return profile
+
+            client = await get_async_client(endpoint)
+            pool = (await client.execute(POOL_QUERY % key[1])).get("pool")
+            if not pool:
+                raise ValueError(f"pool {pool_id} not found")
+            ticks = []
+            async for page in aiter_pages(client.execute, TICKS_QUERY % key[1], schema=client.schema):
+                ticks.extend((row["tickIdx"], row["liquidityNet"]) for row in page)
+
+            profile = await asyncio.to_thread(DepthProfile, pool, ticks)
+            _profiles[key] = profile
+            return profile
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            del _profile_locks[lock_key]
@@ -0,0 +1,319 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from graphql import (
+    parse,
+    print_ast,
+    EnumValueNode,
+    FieldNode,
+    IntValueNode,
+    ObjectFieldNode,
+    ObjectValueNode,
+    OperationDefinitionNode,
+    SelectionSetNode,
+    StringValueNode,
+)
+
+from query_cache import normalize_query
+from query_pagination import PagedQuery, replace_node, _argument, _literal, _name
+
+
+TIMESERIES_DB = Path(os.getenv("TIMESERIES_DB", ".cache/timeseries.sqlite"))
+# The open period of a series is fetched again at most this often (seconds)
+TIMESERIES_REFRESH_SECONDS = int(os.getenv("TIMESERIES_REFRESH_SECONDS", "60"))
+# Set to 0 to fetch day and hour data in full on every query
+TIMESERIES_SYNC = os.getenv("TIMESERIES_SYNC", "1").lower() not in ("0", "false", "no")
+
+# Period entities: time field and the filter naming the pool or token of the series
+SERIES_ENTITIES = {
+    "poolDayDatas": ("date", "pool"),
+    "poolHourDatas": ("periodStartUnix", "pool"),
+    "tokenDayDatas": ("date", "token"),
+    "tokenHourDatas": ("periodStartUnix", "token"),
+}
+# Rows handed to the dataset writer at a time
+READ_PAGE_SIZE = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    key TEXT PRIMARY KEY,
+    entity TEXT NOT NULL,
+    parent TEXT NOT NULL,
+    synced_from INTEGER,
+    watermark INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rows (
+    series TEXT NOT NULL,
+    period INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (series, period, id)
+) WITHOUT ROWID;
+"""
+
+
+@dataclass
+class series_request:
+    """
+    A day or hour data query reduced to its series and the range it asks for.
+    """
+    query: str
+    field: FieldNode
+    entity: str
+    time_field: str
+    parent_field: str
+    parent: str
+    key: str
+    lower: Optional[int]
+    upper: Optional[int]
+    limit: Optional[int]
+    descending: bool
+
+
+def parse_series_request(query: str, endpoint: str) -> Optional[series_request]:
+    """
+    Recognizes queries of one pool's or token's day/hour data, optionally bounded
+    in time and limited with first. Other filters, skip or variables return None,
+    those queries are fetched as they are.
+    """
+    try:
+        document = parse(query)
+    except Exception:
+        return None
+    operations = [d for d in document.definitions if isinstance(d, OperationDefinitionNode)]
+    if len(operations) != 1 or operations[0].variable_definitions or len(document.definitions) != 1:
+        return None
+    selections = operations[0].selection_set.selections
+    if len(selections) != 1 or not isinstance(selections[0], FieldNode) or selections[0].alias:
+        return None
+    field = selections[0]
+    entity = field.name.value
+    if entity not in SERIES_ENTITIES:
+        return None
+    time_field, parent_field = SERIES_ENTITIES[entity]
+
+    arguments = {a.name.value: a.value for a in field.arguments or ()}
+    if set(arguments) - {"where", "first", "orderBy", "orderDirection"}:
+        return None
+    order_by = arguments.get("orderBy")
+    if order_by is not None and (not isinstance(order_by, EnumValueNode) or order_by.value != time_field):
+        return None
+    first = arguments.get("first")
+    if first is not None and not isinstance(first, IntValueNode):
+        return None
+    direction = arguments.get("orderDirection")
+    descending = isinstance(direction, EnumValueNode) and direction.value == "desc"
+
+    where = arguments.get("where")
+    if not isinstance(where, ObjectValueNode):
+        return None
+    parent, lower, upper = None, None, None
+    for where_field in where.fields:
+        name, value = where_field.name.value, where_field.value
+        if not isinstance(value, (StringValueNode, IntValueNode)):
+            return None
+        if name == parent_field:
+            parent = value.value.lower()
+        elif name in (f"{time_field}_gte", f"{time_field}_gt"):
+            lower = int(value.value) + (1 if name.endswith("_gt") else 0)
+        elif name in (f"{time_field}_lte", f"{time_field}_lt"):
+            upper = int(value.value) - (1 if name.endswith("_lt") else 0)
+        else:
+            return None
+    if parent is None:
+        return None
+
+    # Series are kept per selection, a query asking for other fields syncs its own
+    selection = print_ast(field.selection_set) if field.selection_set else ""
+    key = hashlib.sha256(
+        "\n".join([endpoint, entity, parent, normalize_query("{ x " + selection + " }")]).encode()
+    ).hexdigest()
+    return series_request(
+        query=query,
+        field=field,
+        entity=entity,
+        time_field=time_field,
+        parent_field=parent_field,
+        parent=parent,
+        key=key,
+        lower=lower,
+        upper=upper,
+        limit=int(first.value) if first is not None else None,
+        descending=descending,
+    )
+
+
+def _fetch_query(request: series_request, since: Optional[int], first: Optional[int] = None, descending: bool = False) -> str:
+    # The query syncing a series: its pool or token, every period since `since`, with id and time selected
+    field = PagedQuery._with_selected(request.field, ["id", request.time_field])
+    where_fields = [ObjectFieldNode(name=_name(request.parent_field), value=StringValueNode(value=request.parent))]
+    if since is not None:
+        where_fields.append(ObjectFieldNode(name=_name(f"{request.time_field}_gte"), value=_literal(since)))
+    arguments = {
+        "where": ObjectValueNode(fields=tuple(where_fields)),
+        "orderBy": EnumValueNode(value=request.time_field),
+        "orderDirection": EnumValueNode(value="desc" if descending else "asc"),
+    }
+    if first is not None:
+        arguments["first"] = IntValueNode(value=str(first))
+    field = replace_node(field, arguments=tuple(_argument(n, v) for n, v in arguments.items()))
+    return print_ast(SelectionSetNode(selections=(field,)))
+
+
+@dataclass
+class sync_plan:
+    request: series_request
+    # None when the stored rows already answer the query
+    fetch_query: Optional[str]
+    # Start of the stored range once the fetch is merged, None for the full history
+    synced_from: Optional[int]
+    delta: bool
+    fetched: int = 0
+
+
+class TimeSeriesStore:
+    """
+    Day and hour data of pools and tokens kept in SQLite by series and period.
+    Closed periods never change, so a query only fetches the periods from the
+    last synced one (the still open period) onwards and reads the rest locally.
+
+    Args:
+        path (str): SQLite database file
+        refresh_seconds (int): Minimum age of a series before its open period is fetched again
+    """
+
+    def __init__(self, path: Union[str, Path] = TIMESERIES_DB, refresh_seconds: int = TIMESERIES_REFRESH_SECONDS):
+        self.path = Path(path)
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._ready:
+            with self._lock:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with closing(sqlite3.connect(self.path, timeout=30)) as conn:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.executescript(_SCHEMA)
+                self._ready = True
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _series(self, conn: sqlite3.Connection, key: str) -> Optional[tuple]:
+        return conn.execute(
+            "SELECT synced_from, watermark, updated_at FROM series WHERE key = ?", (key,)
+        ).fetchone()
+
+    def plan(self, request: series_request) -> sync_plan:
+        """
+        Decides what has to be fetched for a query: nothing, the delta since the
+        watermark, or a full range when the stored rows do not reach back far enough.
+        """
+        with closing(self._connect()) as conn:
+            series = self._series(conn, request.key)
+            if series is not None:
+                synced_from, watermark, updated_at = series
+                if synced_from is None or (request.lower is not None and synced_from <= request.lower):
+                    covered = True
+                elif request.lower is None and request.descending and request.limit is not None:
+                    count = conn.execute(
+                        "SELECT COUNT(*) FROM rows WHERE series = ? AND period <= ?",
+                        (request.key, request.upper if request.upper is not None else 2 ** 62),
+                    ).fetchone()[0]
+                    covered = count >= request.limit
+                else:
+                    covered = False
+                if covered:
+                    fresh = time.time() - updated_at < self.refresh_seconds
+                    if fresh or (request.upper is not None and request.upper < watermark):
+                        return sync_plan(request, None, synced_from, delta=True)
+                    return sync_plan(request, _fetch_query(request, watermark), synced_from, delta=True)
+
+        if request.lower is not None:
+            since = request.lower if series is None or series[0] is None else min(request.lower, series[0])
+            return sync_plan(request, _fetch_query(request, since), since, delta=False)
+        if request.descending and request.limit is not None:
+            # Only the latest periods, the start of the stored range is set from the rows
+            return sync_plan(
+                request, _fetch_query(request, None, first=request.limit, descending=True), -1, delta=False
+            )
+        return sync_plan(request, _fetch_query(request, None), None, delta=False)
+
+    def merge(self, plan: sync_plan, rows: List[Dict[str, Any]]) -> None:
+        """
+        Stores fetched rows, replacing the stored version of their periods.
+        """
+        request = plan.request
+        periods = [int(row[request.time_field]) for row in rows]
+        plan.fetched += len(rows)
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO rows (series, period, id, data) VALUES (?, ?, ?, ?)",
+                [(request.key, period, row["id"], json.dumps(row)) for period, row in zip(periods, rows)],
+            )
+
+    def finish(self, plan: sync_plan) -> None:
+        """
+        Records the synced range and watermark once all pages were merged.
+        """
+        request = plan.request
+        with closing(self._connect()) as conn, conn:
+            first, last = conn.execute(
+                "SELECT MIN(period), MAX(period) FROM rows WHERE series = ?", (request.key,)
+            ).fetchone()
+            if last is None:
+                return
+            series = self._series(conn, request.key)
+            synced_from = plan.synced_from
+            if synced_from == -1:
+                # Latest `first` periods: complete history when fewer rows exist
+                fetched_from = conn.execute(
+                    "SELECT MIN(period) FROM (SELECT period FROM rows WHERE series = ? ORDER BY period DESC LIMIT ?)",
+                    (request.key, plan.fetched),
+                ).fetchone()[0]
+                synced_from = None if plan.fetched < (request.limit or 0) else fetched_from
+                if series is not None and synced_from is not None and series[1] >= synced_from:
+                    # Contiguous with the stored range
+                    synced_from = series[0] if series[0] is None else min(series[0], synced_from)
+            conn.execute(
+                "INSERT OR REPLACE INTO series (key, entity, parent, synced_from, watermark, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (request.key, request.entity, request.parent, synced_from, last, time.time()),
+            )
+
+    def read(self, request: series_request) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yields the stored rows the query asks for, in its order and limit, a page at a time.
+        """
+        sql = "SELECT data FROM rows WHERE series = ? AND period >= ? AND period <= ? ORDER BY period {}, id {}".format(
+            *(["DESC", "DESC"] if request.descending else ["ASC", "ASC"])
+        )
+        params = [request.key, request.lower if request.lower is not None else -(2 ** 62),
+                  request.upper if request.upper is not None else 2 ** 62]
+        if request.limit is not None:
+            sql += " LIMIT ?"
+            params.append(request.limit)
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(sql, params)
+            while rows := cursor.fetchmany(READ_PAGE_SIZE):
+                yield [json.loads(data) for (data,) in rows]
+
+    def report(self, plan: sync_plan, served: int) -> str:
+        if plan.fetch_query is None:
+            how = "no fetch, stored periods are up to date"
+        elif plan.delta:
+            how = f"delta sync fetched {plan.fetched} rows since the last synced period"
+        else:
+            how = f"initial sync fetched {plan.fetched} rows"
+        return f"time series store: {how}, served {served} rows from {self.path}"
+
+
+timeseries_store = TimeSeriesStore()
@@ -0,0 +1,179 @@
+import os
+import re
+import bisect
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from entity_mirror import entity_mirror
+from answer_cache import FILLER_WORDS
+
+
+# Lower case words in a question are only taken as tokens when a token this liquid has the symbol
+RESOLVER_MIN_TVL_USD = float(os.getenv("RESOLVER_MIN_TVL_USD", "1000000"))
+# Matches returned per lookup
+RESOLVER_MAX_MATCHES = 5
+
+# Words of liquidity questions that are also token symbols, upper case too (TVL, APR, USD), $TVL still resolves
+DOMAIN_WORDS = {
+    "pool", "pools", "liquidity", "volume", "price", "swap", "route", "token", "tokens", "best", "top", "fee", "fees",
+    "tvl", "day", "week", "month", "year", "last", "between", "from", "into", "compare", "chart", "trend", "high", "low",
+    "apr", "apy", "usd", "eth", "hhi", "dex", "amm", "lp", "fdv", "mcap", "ath", "defi",
+}
+
+# $PEPE, upper case symbols and addresses
+_MENTION = re.compile(r"\$?\b(0x[0-9a-fA-F]{40}|[A-Za-z][A-Za-z0-9.+-]{1,15})\b")
+
+
+@dataclass
+class token_match:
+    address: str
+    symbol: str
+    name: str
+    decimals: int
+    tvl_usd: float
+    volume_usd: float
+    matched_on: str
+
+
+class TokenResolver:
+    """
+    In memory index of the mirrored tokens: hash lookups by address, symbol and
+    name, and a sorted key list for prefix matches. Ambiguous symbols are ranked
+    by TVL, so "USDC" resolves to the real USDC before its look-alikes.
+    """
+
+    def __init__(self):
+        self.by_address: Dict[str, token_match] = {}
+        self.by_symbol: Dict[str, List[token_match]] = {}
+        self.by_name: Dict[str, List[token_match]] = {}
+        self._keys: List[Tuple[str, str]] = []
+        self.built_at: Optional[float] = None
+        self._started = False
+        self._lock = threading.Lock()
+
+    def build(self, rows: List[tuple], built_at: Optional[float]) -> None:
+        by_address, by_symbol, by_name = {}, {}, {}
+        for address, symbol, name, decimals, tvl_usd, volume_usd in rows:
+            token = token_match(address, symbol or "", name or "", int(decimals or 0),
+                                float(tvl_usd or 0), float(volume_usd or 0), "")
+            by_address[address.lower()] = token
+            by_symbol.setdefault(token.symbol.lower(), []).append(token)
+            if token.name:
+                by_name.setdefault(token.name.lower(), []).append(token)
+        for index in (by_symbol, by_name):
+            for tokens in index.values():
+                tokens.sort(key=lambda t: t.tvl_usd, reverse=True)
+        keys = sorted([(k, "symbol") for k in by_symbol] + [(k, "name") for k in by_name])
+        with self._lock:
+            self.by_address, self.by_symbol, self.by_name, self._keys = by_address, by_symbol, by_name, keys
+            self.built_at = built_at
+
+    def refresh(self) -> bool:
+        """
+        Rebuilds the index when the mirror was refreshed since the last build.
+
+        Returns:
+            bool: True when the index holds tokens
+        """
+        refreshed_at = entity_mirror.refreshed_at()
+        if refreshed_at is not None and refreshed_at != self.built_at:
+            df = entity_mirror.query(
+                "SELECT id, symbol, name, decimals, tvl_usd, volume_usd FROM tokens", max_rows=10 ** 7
+            )
+            self.build(list(df.itertuples(index=False, name=None)), refreshed_at)
+        return bool(self.by_address)
+
+    def start(self) -> None:
+        """
+        Starts the mirror refresher and rebuilds the index on its thread after
+        every refresh, so callers never wait for a rebuild. Once per process.
+        """
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        entity_mirror.add_listener(self.refresh)
+        entity_mirror.start_refresher()
+
+    def _matched(self, tokens: List[token_match], how: str) -> List[token_match]:
+        return [token_match(**{**t.__dict__, "matched_on": how}) for t in tokens]
+
+    def resolve(self, text: str, limit: int = RESOLVER_MAX_MATCHES) -> List[token_match]:
+        """
+        Tokens matching an address, symbol, name or symbol/name prefix, exact
+        matches first and each group by TVL.
+        """
+        key = text.strip().lstrip("$").lower()
+        if not key:
+            return []
+        if key in self.by_address:
+            return self._matched([self.by_address[key]], "address")
+        matches = self._matched(self.by_symbol.get(key, []), "symbol") + self._matched(self.by_name.get(key, []), "name")
+        if len(matches) < limit:
+            seen = {m.address for m in matches}
+            prefixed = []
+            start = bisect.bisect_left(self._keys, (key, ""))
+            for k, kind in self._keys[start:]:
+                if not k.startswith(key):
+                    break
+                index = self.by_symbol if kind == "symbol" else self.by_name
+                prefixed.extend(t for t in index[k] if t.address not in seen)
+            prefixed.sort(key=lambda t: t.tvl_usd, reverse=True)
+            matches += self._matched(prefixed, "prefix")
+        unique, seen = [], set()
+        for match in matches:
+            if match.address not in seen:
+                seen.add(match.address)
+                unique.append(match)
+        return unique[:limit]
+
+    def resolve_address(self, token: str) -> str:
+        """
+        The address of the most liquid token with this symbol, addresses and unknown symbols are returned as given.
+        """
+        if token.lower().startswith("0x"):
+            return token
+        exact = self.by_symbol.get(token.strip().lstrip("$").lower())
+        return exact[0].address if exact else token
+
+    def mentions(self, question: str) -> Dict[str, List[token_match]]:
+        """
+        Tokens named in a question: addresses, $SYMBOLS and upper case symbols,
+        and lower case words that are the symbol of a liquid token. Domain words
+        like TVL or USD are skipped in either case unless written as $SYMBOL.
+        """
+        found: Dict[str, List[token_match]] = {}
+        for match in _MENTION.finditer(question):
+            word = match.group(1).rstrip(".+-")
+            marked = word.startswith("0x") or match.group(0).startswith("$")
+            explicit = marked or (word.isupper() and len(word) > 1)
+            lower = word.lower()
+            if not marked and lower in DOMAIN_WORDS:
+                continue
+            if not explicit and (lower in FILLER_WORDS or len(word) < 3):
+                continue
+            if lower in self.by_address:
+                matches = self._matched([self.by_address[lower]], "address")
+            else:
+                matches = self._matched(self.by_symbol.get(lower, [])[:3], "symbol")
+            if matches and (explicit or matches[0].tvl_usd >= RESOLVER_MIN_TVL_USD):
+                found[word] = matches
+        return found
+
+    def describe(self, question: str) -> str:
+        """
+        Resolved token mentions of a question as prompt lines, empty when none.
+        """
+        lines = []
+        for word, matches in self.mentions(question).items():
+            best = matches[0]
+            line = f"- {word}: {best.symbol} ({best.name}) {best.address}, decimals {best.decimals}, TVL ${best.tvl_usd:,.0f}"
+            if len(matches) > 1:
+                others = ", ".join(f"{m.symbol} {m.address} (TVL ${m.tvl_usd:,.0f})" for m in matches[1:])
+                line += f"; other tokens with this symbol: {others}"
+            lines.append(line)
+        return "\n".join(lines)
+
+
+token_resolver = TokenResolver()
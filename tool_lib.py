@@ -3,13 +3,11 @@ from portia import (
     Portia,
     example_tool_registry,
 )
-from agent_module import run_agent
+from typing import Callable, Optional
+
+from agent_module import run_agent, run_agent_events
 from pydantic import BaseModel, Field
 from portia.tool import Tool, ToolRunContext
-import nest_asyncio
-import asyncio
-
-nest_asyncio.apply()
 
 
 class userquerySchema(BaseModel):
@@ -28,10 +26,15 @@ class QueryRunner(Tool[str]):
     description: str = "executes user query to get data"
     args_schema: type[BaseModel] = userquerySchema
     output_schema: tuple[str, str] = ("str", "A string dump or JSON of the file content") # Changed to tuple type
+    # Receives the progress and partial report events of the agent run, e.g. AgentJob.record
+    on_event: Optional[Callable] = Field(default=None, exclude=True)
     
     def run(self, _: ToolRunContext, user_query: str) -> str:
         try:
-            response = run_agent(user_query)
+            if self.on_event is not None:
+                response = run_agent_events(user_query, self.on_event)
+            else:
+                response = run_agent(user_query)
             response_dict = {
                 'markdown_report': response.markdown_report,
                 'csv_path': response.csv_path,
@@ -40,7 +43,8 @@ class QueryRunner(Tool[str]):
                 'png_path': response.png_path,
                 'pdf_path': response.pdf_path,
                 'enso_route': response.enso_route,
-                'enso_route_file': response.enso_route_file
+                'enso_route_file': response.enso_route_file,
+                'served_from_cache': response.served_from_cache
             }
             return str(response_dict)  # Return as single-item tuple
         except Exception as e:
@@ -0,0 +1,139 @@
+"""
+Uniswap v3 integer math, ported from TickMath, SqrtPriceMath and SwapMath.
+All prices are sqrt prices in Q64.96 and all amounts raw integers, so results
+match the pool contracts to the wei.
+"""
+
+from typing import Tuple
+
+
+Q96 = 1 << 96
+MIN_TICK = -887272
+MAX_TICK = 887272
+MIN_SQRT_RATIO = 4295128739
+MAX_SQRT_RATIO = 1461446703485210103287273052203988822378723970342
+# Fees are in hundredths of a bip, feeTier 3000 is 0.3%
+FEE_DENOMINATOR = 1_000_000
+
+_TICK_RATIOS = [
+    (0x2, 0xfff97272373d413259a46990580e213a),
+    (0x4, 0xfff2e50f5f656932ef12357cf3c7fdcc),
+    (0x8, 0xffe5caca7e10e4e61c3624eaa0941cd0),
+    (0x10, 0xffcb9843d60f6159c9db58835c926644),
+    (0x20, 0xff973b41fa98c081472e6896dfb254c0),
+    (0x40, 0xff2ea16466c96a3843ec78b326b52861),
+    (0x80, 0xfe5dee046a99a2a811c461f1969c3053),
+    (0x100, 0xfcbe86c7900a88aedcffc83b479aa3a4),
+    (0x200, 0xf987a7253ac413176f2b074cf7815e54),
+    (0x400, 0xf3392b0822b70005940c7a398e4b70f3),
+    (0x800, 0xe7159475a2c29b7443b29c7fa6e889d9),
+    (0x1000, 0xd097f3bdfd2022b8845ad8f792aa5825),
+    (0x2000, 0xa9f746462d870fdf8a65dc1f90e061e5),
+    (0x4000, 0x70d869a156d2a1b890bb3df62baf32f7),
+    (0x8000, 0x31be135f97d08fd981231505542fcfa6),
+    (0x10000, 0x9aa508b5b7a84e1c677de54f3e99bc9),
+    (0x20000, 0x5d6af8dedb81196699c329225ee604),
+    (0x40000, 0x2216e584f5fa1ea926041bedfe98),
+    (0x80000, 0x48a170391f7dc42444e8fa2),
+]
+
+
+def _div_round_up(a: int, b: int) -> int:
+    return -(-a // b)
+
+
+def sqrt_ratio_at_tick(tick: int) -> int:
+    """
+    Returns sqrt(1.0001^tick) * 2^96, TickMath.getSqrtRatioAtTick.
+    """
+    abs_tick = abs(tick)
+    if abs_tick > MAX_TICK:
+        raise ValueError(f"tick {tick} out of range")
+    ratio = 0xfffcb933bd6fad37aa2d162d1a594001 if abs_tick & 0x1 else 1 << 128
+    for bit, factor in _TICK_RATIOS:
+        if abs_tick & bit:
+            ratio = (ratio * factor) >> 128
+    if tick > 0:
+        ratio = ((1 << 256) - 1) // ratio
+    return (ratio >> 32) + (0 if ratio % (1 << 32) == 0 else 1)
+
+
+def amount0_delta(sqrt_a: int, sqrt_b: int, liquidity: int, round_up: bool) -> int:
+    """
+    Token0 amount between two sqrt prices, SqrtPriceMath.getAmount0Delta.
+    """
+    if sqrt_a > sqrt_b:
+        sqrt_a, sqrt_b = sqrt_b, sqrt_a
+    numerator1 = liquidity << 96
+    numerator2 = sqrt_b - sqrt_a
+    if round_up:
+        return _div_round_up(_div_round_up(numerator1 * numerator2, sqrt_b), sqrt_a)
+    return numerator1 * numerator2 // sqrt_b // sqrt_a
+
+
+def amount1_delta(sqrt_a: int, sqrt_b: int, liquidity: int, round_up: bool) -> int:
+    """
+    Token1 amount between two sqrt prices, SqrtPriceMath.getAmount1Delta.
+    """
+    if sqrt_a > sqrt_b:
+        sqrt_a, sqrt_b = sqrt_b, sqrt_a
+    if round_up:
+        return _div_round_up(liquidity * (sqrt_b - sqrt_a), Q96)
+    return liquidity * (sqrt_b - sqrt_a) // Q96
+
+
+def next_sqrt_price_from_input(sqrt_price: int, liquidity: int, amount_in: int, zero_for_one: bool) -> int:
+    """
+    Sqrt price after adding amount_in of the input token, SqrtPriceMath.getNextSqrtPriceFromInput.
+    """
+    if amount_in == 0:
+        return sqrt_price
+    if zero_for_one:
+        numerator1 = liquidity << 96
+        return _div_round_up(numerator1 * sqrt_price, numerator1 + amount_in * sqrt_price)
+    return sqrt_price + (amount_in << 96) // liquidity
+
+
+def swap_step(
+    sqrt_price: int, sqrt_target: int, liquidity: int, amount_remaining: int, fee: int
+) -> Tuple[int, int, int, int]:
+    """
+    One exact input swap step within a tick range, SwapMath.computeSwapStep.
+
+    Returns:
+        Tuple[int, int, int, int]: sqrt price after the step, amount in, amount out, fee amount
+    """
+    zero_for_one = sqrt_price >= sqrt_target
+    remaining_less_fee = amount_remaining * (FEE_DENOMINATOR - fee) // FEE_DENOMINATOR
+    if zero_for_one:
+        amount_in = amount0_delta(sqrt_target, sqrt_price, liquidity, True)
+    else:
+        amount_in = amount1_delta(sqrt_price, sqrt_target, liquidity, True)
+
+    if remaining_less_fee >= amount_in:
+        sqrt_next = sqrt_target
+    else:
+        sqrt_next = next_sqrt_price_from_input(sqrt_price, liquidity, remaining_less_fee, zero_for_one)
+
+    reached = sqrt_next == sqrt_target
+    if zero_for_one:
+        if not reached:
+            amount_in = amount0_delta(sqrt_next, sqrt_price, liquidity, True)
+        amount_out = amount1_delta(sqrt_next, sqrt_price, liquidity, False)
+    else:
+        if not reached:
+            amount_in = amount1_delta(sqrt_price, sqrt_next, liquidity, True)
+        amount_out = amount0_delta(sqrt_price, sqrt_next, liquidity, False)
+
+    if not reached:
+        fee_amount = amount_remaining - amount_in
+    else:
+        fee_amount = _div_round_up(amount_in * fee, FEE_DENOMINATOR - fee)
+    return sqrt_next, amount_in, amount_out, fee_amount
+
+
+def price_from_sqrt(sqrt_price: int, decimals0: int, decimals1: int) -> float:
+    """
+    Price of token0 in token1 in human units.
+    """
+    return (sqrt_price / Q96) ** 2 * 10 ** (decimals0 - decimals1)